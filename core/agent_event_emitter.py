@@ -5,14 +5,19 @@
 负责将事件分发给所有已注册的事件处理器
 """
 
-from typing import List, Protocol
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple, Type
 from .events import AgentEvent
 
 class EventHandler(Protocol):
     """
     事件处理器的协议 (Protocol)
     定义了所有具体事件处理器必须实现的接口
+    
+    可选属性 subscribed_types: 处理器关心的事件类型元组;
+    未定义或为 None 时接收所有事件
     """
+    subscribed_types: Optional[Tuple[Type[AgentEvent], ...]]
+
     def handle(self, event: AgentEvent):
         """
         处理一个传入的AgentEvent
@@ -22,12 +27,18 @@ class EventHandler(Protocol):
         """
         ...
 
+    # 可选方法 handle_batch(events): 一次处理多个事件（按分发顺序）;
+    # 未实现时 dispatch_batch 逐个调用 handle
+
 class AgentEventEmitter:
     """
     事件发射器, 向所有注册的处理器分发事件
     """
     def __init__(self):
-        self._handlers: List[EventHandler] = []
+        self._handlers: Sequence[EventHandler] = []
+        self._handler_ids: set = set()
+        # 事件类型 -> 订阅该类型的处理器（按注册顺序, 首次分发该类型时建立）
+        self._by_type: Dict[type, Tuple[EventHandler, ...]] = {}
 
     def register(self, handler: EventHandler):
         """
@@ -36,8 +47,34 @@ class AgentEventEmitter:
         Args:
             handler: 实现了EventHandler协议的对象
         """
-        if handler not in self._handlers:
-            self._handlers.append(handler)
+        if id(handler) in self._handler_ids:
+            return
+        self._handler_ids.add(id(handler))
+        self._handlers = list(self._handlers)
+        self._handlers.append(handler)
+        self._by_type.clear()
+
+    def _handlers_for(self, event_type: type) -> Tuple[EventHandler, ...]:
+        """返回订阅了指定事件类型的处理器, 结果按类型缓存"""
+        handlers = self._by_type.get(event_type)
+        if handlers is None:
+            handlers = tuple(
+                handler for handler in self._handlers
+                if getattr(handler, "subscribed_types", None) is None
+                or issubclass(event_type, handler.subscribed_types)
+            )
+            self._by_type[event_type] = handlers
+        return handlers
+
+    def has_subscribers(self, event_type: type) -> bool:
+        """判断是否有处理器订阅了指定事件类型, 可在构造事件前调用以避免无用的分配"""
+        return bool(self._handlers_for(event_type))
+
+    def freeze(self):
+        """
+        处理器注册完成后调用, 将处理器列表固定为元组以加快分发时的遍历
+        """
+        self._handlers = tuple(self._handlers)
 
     def dispatch(self, event: AgentEvent):
         """
@@ -46,11 +83,47 @@ class AgentEventEmitter:
         Args:
             event: 要分发的事件对象
         """
-        for handler in self._handlers:
+        handlers = self._handlers_for(type(event))
+        i = 0
+        n = len(handlers)
+        # try 放在外层：正常路径只建立一次异常处理，出错后从下一个处理器继续
+        while i < n:
             try:
-                handler.handle(event)
+                while i < n:
+                    handlers[i].handle(event)
+                    i += 1
             except Exception as e:
                 # 避免一个处理器的失败影响其他处理器
                 # todo: 这里后续需要换成统一的logger，方便采集服务日志
-                print(f"[AgentEventEmitter] Error in handler {type(handler).__name__}: {e}")
+                print(f"[AgentEventEmitter] Error in handler {type(handlers[i]).__name__}: {e}")
+                i += 1
 
+    def dispatch_batch(self, events: List[AgentEvent]):
+        """
+        一次分发多个事件: 每个处理器只调用一次, 收到其订阅的全部事件（保持原顺序）
+        
+        Args:
+            events: 要分发的事件列表
+        """
+        if not events:
+            return
+        # 处理器 -> 该处理器订阅的事件（按处理器首次出现的顺序）
+        per_handler: Dict[int, Tuple[EventHandler, List[AgentEvent]]] = {}
+        for event in events:
+            for handler in self._handlers_for(type(event)):
+                entry = per_handler.get(id(handler))
+                if entry is None:
+                    per_handler[id(handler)] = (handler, [event])
+                else:
+                    entry[1].append(event)
+
+        for handler, handler_events in per_handler.values():
+            try:
+                handle_batch = getattr(handler, "handle_batch", None)
+                if handle_batch is not None:
+                    handle_batch(handler_events)
+                else:
+                    for event in handler_events:
+                        handler.handle(event)
+            except Exception as e:
+                print(f"[AgentEventEmitter] Error in handler {type(handler).__name__}: {e}")
@@ -4,11 +4,15 @@
 Agent执行器 - 使用标准消息格式的核心执行逻辑
 历史动作通过 messages 数组传递（而非 system_prompt），支持多模态图片嵌入
 """
-from typing import Dict, List
+from typing import Dict, List, Tuple
 import sys
 import json
+import time
+import os
+import queue
+import threading
 import traceback
-from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 # Windows兼容性：设置UTF-8编码
 try:
@@ -24,9 +28,31 @@ from utils.conversation_storage import ConversationStorage
 from utils.event_emitter import get_event_emitter as get_jsonl_emitter
 
 from .agent_event_emitter import AgentEventEmitter
+from .message_buckets import TurnBucket, classify_and_bucket
 from .event_handlers import ConsoleLogHandler, JsonlStreamHandler
 from .events import *
 from utils.windows_compat import safe_print
+from utils import json_fast
+
+
+_IMAGE_DATA_URL_PREFIX = "data:image/jpeg;base64,"
+
+
+def _to_image_data_urls(image_base64) -> List[str]:
+    """将 base64 图片（单值或列表）统一转为 data URL 列表（已是 data URL 的原样保留）"""
+    if not isinstance(image_base64, list):
+        image_base64 = [image_base64]
+    return [b64 if b64.startswith("data:") else _IMAGE_DATA_URL_PREFIX + b64 for b64 in image_base64]
+
+
+# LLM 调用线程池（所有执行器共享，线程按需创建）
+_LLM_CALL_POOL = ThreadPoolExecutor(thread_name_prefix="llm-call")
+# 只读工具并发执行线程池（最多 5 个并发）
+_TOOL_CALL_POOL = ThreadPoolExecutor(max_workers=5, thread_name_prefix="tool-call")
+# 历史动作后台压缩线程池（同一时间只压缩一次）
+_COMPRESSION_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="action-compress")
+# 写盘线程退出标记
+_SAVE_WORKER_STOP = object()
 
 
 class AgentExecutor:
@@ -57,12 +83,7 @@ class AgentExecutor:
         self.llm_client.set_tools_config(config_loader.all_tools)
         
         # 验证并调整模型
-        available_models = self.llm_client.models
-        final_model = requested_model
-        is_fallback = False
-        if requested_model not in available_models:
-            final_model = available_models[0]
-            is_fallback = True
+        final_model, is_fallback = self.llm_client.resolve_model(requested_model)
         self.model_type = final_model
         
         # 发送模型选择事件
@@ -81,6 +102,18 @@ class AgentExecutor:
             max_context_window=self.llm_client.max_context_window
         )
         
+        # 需要添加 uuid 后缀的工具: level != 0 的 llm_call_agent -> level
+        self._needs_uuid_levels: Dict[str, int] = {
+            name: cfg.get("level", 0)
+            for name, cfg in config_loader.all_tools.items()
+            if cfg.get("type") == "llm_call_agent" and cfg.get("level", 0) != 0
+        }
+        
+        # 可在同一轮内并发执行的只读工具
+        self._concurrency_safe_tools = {
+            name for name, cfg in config_loader.all_tools.items() if cfg.get("concurrency_safe")
+        }
+        
         # 初始化工具执行器
         self.tool_executor = ToolExecutor(config_loader, hierarchy_manager)
         
@@ -90,13 +123,40 @@ class AgentExecutor:
         # Agent状态
         self.agent_id = None
         self.action_history = []  # 渲染用（会压缩）
-        self.action_history_fact = []  # 完整轨迹（不压缩）
-        self.pending_tools = []  # 待执行的工具（用于恢复）
+        self.action_history_fact = []  # 完整轨迹（不压缩，内存中只保留最近部分）
+        self._fact_offset = 0  # 已写入 JSONL 并移出内存的完整轨迹条目数
+        self._fact_hot_limit = 2048  # 内存中保留的完整轨迹条目数
+        self._final_output_action = None  # 已记录的 final_output 动作（完成标记）
+        self.pending_tools: Dict[str, Dict] = {}  # 待执行的工具 id -> 工具（用于恢复，落盘时转为列表）
         self.latest_thinking = ""
+        self.knowledge_block = ""  # compress_context 保留的关键信息（不随历史压缩丢失）
         self.first_thinking_done = False
         self.thinking_interval = 10  # 每10轮工具调用触发一次thinking
         self.tool_call_counter = 0
         self.llm_turn_counter = 0  # LLM调用轮次计数器（用于消息分组）
+        # action_history 逐条 token 数缓存（用于压缩前的快速预判）
+        self._action_token_lens: List[int] = []
+        self._action_token_total = 0  # _action_token_lens 的累计值
+        self._action_token_src = None
+        self._prompt_token_cache = (None, None, 0)  # (thinking, task_input, token 数)
+        # 后台提前压缩: (Future, 压缩时的 action_history 对象, 提交压缩的快照)
+        self._pending_compression = None
+        self._last_saved_prompt = None  # 最近一次 _save_state 构建的完整系统提示词（未开启 save_system_prompt 时为 None）
+        self._static_system_prompt = None  # 主LLM调用的静态系统提示词（本次运行内固定）
+        # messages 增量构建缓存（对应 action_history 的已处理前缀）
+        self._msg_src = None
+        self._msg_built = 0
+        self._msg_special = []
+        self._msg_buckets = []
+        self._ctx_cache = {}  # 系统提示词缓存: include_action_history -> (状态键, 提示词)
+        self._last_save_key = None  # 最近一次 _save_state 的状态键（状态未变化时跳过保存）
+
+        # 后台持久化线程：_save_state 只投递快照，由该线程写盘
+        self._save_flush_interval = 0.5  # 两次写盘之间的最小间隔（秒）
+        self._pending_save = None  # 尚未投递的最新状态快照
+        self._last_flush_ts = 0.0
+        self._save_queue = queue.Queue()
+        self._save_thread = None  # 首次投递快照时启动，close() 时停止
 
     def _setup_event_emitter(self):
         """初始化事件发射器并注册处理器"""
@@ -106,11 +166,18 @@ class AgentExecutor:
         jsonl_emitter = get_jsonl_emitter()
         if jsonl_emitter.enabled:
             self.event_emitter.register(JsonlStreamHandler(enabled=True))
+        self.event_emitter.freeze()
+    
+    def _emit_cli(self, message: str, style: str = 'info'):
+        """输出一条CLI消息; 无处理器订阅时不构造事件对象"""
+        if self.event_emitter.has_subscribers(CliDisplayEvent):
+            self.event_emitter.dispatch(CliDisplayEvent(message=message, style=style))
     
     def run(self, task_id: str, user_input: str) -> Dict:
         """执行Agent任务"""
+        dispatch = self.event_emitter.dispatch
 
-        self.event_emitter.dispatch(AgentStartEvent(
+        dispatch(AgentStartEvent(
             agent_name=self.agent_name, 
             task_input=user_input
         ))        
@@ -143,13 +210,16 @@ class AgentExecutor:
         # 强制工具调用计数器
         max_tool_try = 0
 
-        # 执行循环
-        for turn in range(start_turn, self.max_turns):
-            self.event_emitter.dispatch(CliDisplayEvent(
-                message=f"\n--- 第 {turn + 1}/{self.max_turns} 轮执行 ---", 
-                style='separator'
-            ))
-            
+        # 执行循环（轮次用尽时退出）
+        max_turns_str = str(self.max_turns)
+        turn = start_turn - 1
+        while True:
+            turn += 1
+            if turn >= self.max_turns:
+                break
+            self._emit_cli("\n--- 第 %d/%s 轮执行 ---" % (turn + 1, max_turns_str), 'separator')
+
+
             try:
                 # 每轮开始前保存状态
                 self._save_state(task_id, user_input, turn)
@@ -157,21 +227,21 @@ class AgentExecutor:
                 # 检查并压缩历史动作（如果超过限制）
                 self._compress_action_history_if_needed()
 
-                # 构建系统提示词（不含历史动作，历史动作改由 messages 承载）
-                full_system_prompt = self.context_builder.build_context(
-                    task_id,
-                    self.agent_id,
-                    self.agent_name,
-                    user_input,
-                    action_history=self.action_history,
-                    include_action_history=False  # 历史动作通过 messages 传递
-                )
+                # 构建系统提示词：静态部分在本次运行内固定（命中服务商前缀缓存），
+                # 会变化的上下文放入首条 user 消息，历史动作通过 messages 传递
+                if self._static_system_prompt is None:
+                    self._static_system_prompt = self.context_builder.build_static_context(
+                        task_id, self.agent_id, self.agent_name, user_input
+                    )
+                dynamic_context = self.context_builder.build_dynamic_context(task_id, self.agent_id)
+                if self.knowledge_block:
+                    dynamic_context = f"<保留知识>\n{self.knowledge_block}\n</保留知识>\n{dynamic_context}"
                 
                 # 从 action_history 构建标准 messages 数组
-                messages = self._build_messages_from_action_history()
+                messages = self._build_messages_from_action_history(dynamic_context)
                 
                 # 调用LLM（使用标准 messages 格式）
-                llm_response = self._execute_llm_call(full_system_prompt, messages)
+                llm_response = self._execute_llm_call(self._static_system_prompt, messages)
                 
                 if llm_response.status != "success":
                     error_result = {
@@ -180,7 +250,8 @@ class AgentExecutor:
                         "error_information": llm_response.error_information
                     }
                     self.hierarchy_manager.pop_agent(self.agent_id, str(error_result))
-                    self.event_emitter.dispatch(AgentEndEvent(status='error', result=error_result))
+                    dispatch(AgentEndEvent(status='error', result=error_result))
+                    self.close()
                     return error_result
 
                 if not llm_response.tool_calls:
@@ -188,17 +259,14 @@ class AgentExecutor:
 
                     if max_tool_try < 5:
                         max_tool_try += 1
-                        self.event_emitter.dispatch(CliDisplayEvent(
-                            message=f"⚠️ LLM未调用工具，第{max_tool_try}/5次提醒", 
-                            style='warning'
-                        ))
+                        self._emit_cli("⚠️ LLM未调用工具，第%d/5次提醒" % max_tool_try, 'warning')
                         self.action_history.append({
                             "_turn": self.llm_turn_counter,
                             "tool_name": "_no_tool_call",
                             "arguments": {},
                             "result": {
                                 "status": "error",
-                                "output": f"第{max_tool_try}次：LLM未调用工具，请在下一轮中必须调用工具"
+                                "output": "第%d次：LLM未调用工具，请在下一轮中必须调用工具" % max_tool_try
                             },
                             "assistant_content": llm_response.output or ""
                         })
@@ -220,8 +288,9 @@ class AgentExecutor:
                             "error_information": "Agent拒绝调用工具"
                         }
                         self.hierarchy_manager.pop_agent(self.agent_id, str(error_result))
-                        self.event_emitter.dispatch(AgentEndEvent(status='error', result=error_result))
-                        self.event_emitter.dispatch(ThinkingFailEvent(agent_name=self.agent_name, error_message=f"[{self.agent_name}] 强制thinking: {thinking_result if thinking_result else '分析失败'}"))
+                        dispatch(AgentEndEvent(status='error', result=error_result))
+                        dispatch(ThinkingFailEvent(agent_name=self.agent_name, error_message=f"[{self.agent_name}] 强制thinking: {thinking_result if thinking_result else '分析失败'}"))
+                        self.close()
                         return error_result
                 # 重置计数器（成功调用了工具）
                 max_tool_try = 0
@@ -231,17 +300,34 @@ class AgentExecutor:
                 current_reasoning_content = llm_response.reasoning_content or ""
                 current_llm_turn = self.llm_turn_counter
 
+                # 同一轮的工具全部为只读（concurrency_safe）时并发执行，
+                # 结果仍按 tool_calls 原顺序记录；其余情况逐个同步执行
+                tool_futures = {}
+                if len(llm_response.tool_calls) > 1 and all(
+                    tc.name in self._concurrency_safe_tools for tc in llm_response.tool_calls
+                ):
+                    # 提交前整批标记为 pending 并分发开始事件（执行中崩溃时所有在途调用都可恢复）
+                    batch = [(tc, self._add_uuid_if_needed(tc.name, tc.arguments))
+                             for tc in llm_response.tool_calls]
+                    self._mark_tools_pending(batch, task_id, user_input, turn)
+                    for tc, arguments_with_uuid in batch:
+                        tool_futures[tc.id] = _TOOL_CALL_POOL.submit(
+                            self.tool_executor.execute, tc.name, arguments_with_uuid, task_id
+                        )
+                
                 # 执行所有工具调用
                 for tool_call in llm_response.tool_calls:
                     final_output_result = self._execute_tool_call(
                         tool_call, task_id, user_input, turn,
                         assistant_content=current_assistant_content,
                         reasoning_content=current_reasoning_content,
-                        llm_turn=current_llm_turn
+                        llm_turn=current_llm_turn,
+                        tool_result_future=tool_futures.get(tool_call.id)
                     )
                     if final_output_result:
-                        self.event_emitter.dispatch(AgentEndEvent(status='success', result=final_output_result))
+                        dispatch(AgentEndEvent(status='success', result=final_output_result))
                         self.hierarchy_manager.pop_agent(self.agent_id, final_output_result.get("output", ""))
+                        self.close()
                         return final_output_result
                 
                 self.llm_turn_counter += 1
@@ -251,11 +337,17 @@ class AgentExecutor:
                 counter_before = self.tool_call_counter - len(llm_response.tool_calls)
                 crossed_boundary = (counter_before // self.thinking_interval) < (self.tool_call_counter // self.thinking_interval)
                 if self.tool_call_counter > 0 and crossed_boundary:
-                    thinking_result = self._trigger_thinking(task_id, user_input, is_initial=False)
+                    # 最后一次工具调用后保存状态时若已构建了同样的完整提示词则直接复用（为 None 时按需构建）
+                    thinking_result = self._trigger_thinking(
+                        task_id, user_input, is_initial=False,
+                        system_prompt=self._last_saved_prompt
+                    )
                     if thinking_result:
                         self.latest_thinking = thinking_result
                         self.hierarchy_manager.update_thinking(self.agent_id, thinking_result)
                         self._save_state(task_id, user_input, turn)
+                        # ContextBuilder 从存储文件读取最新 thinking，需等待写盘完成
+                        self.flush()
                         self.action_history = []
                         self.llm_turn_counter = 0  # 重置轮次计数器
             
@@ -267,10 +359,9 @@ class AgentExecutor:
             "error_information": f"Max turns {self.max_turns} exceeded"
         }
         self.hierarchy_manager.pop_agent(self.agent_id, str(timeout_result))
-        self.event_emitter.dispatch(AgentEndEvent(status='error', result=timeout_result))
-        self.event_emitter.dispatch(CliDisplayEvent(
-            message="\n⚠️ 达到最大轮次限制: {self.max_turns}"
-        ))
+        dispatch(AgentEndEvent(status='error', result=timeout_result))
+        self._emit_cli("\n⚠️ 达到最大轮次限制: {self.max_turns}")
+        self.close()
         
         return timeout_result
 
@@ -282,29 +373,36 @@ class AgentExecutor:
         if loaded_data:
             self.action_history = loaded_data.get("action_history", [])
             self.action_history_fact = loaded_data.get("action_history_fact", [])
-            self.pending_tools = loaded_data.get("pending_tools", [])
+            self._fact_offset = 0
+            self.pending_tools = {t["id"]: t for t in loaded_data.get("pending_tools", [])}
             self.latest_thinking = loaded_data.get("latest_thinking", "")
+            self.knowledge_block = loaded_data.get("knowledge_block", "")
             self.first_thinking_done = loaded_data.get("first_thinking_done", False)
             self.tool_call_counter = loaded_data.get("tool_call_counter", 0)
             self.llm_turn_counter = loaded_data.get("llm_turn_counter", 0)
             start_turn = loaded_data.get("current_turn", 0) + 1
             
+            # 旧记录的图片可能是裸 base64，加载时统一转为 data URL（构建消息时不再逐轮检查）
+            for action in self.action_history:
+                if action.get("_image_base64"):
+                    action["_image_base64"] = _to_image_data_urls(action["_image_base64"])
+            
             self.event_emitter.dispatch(HistoryLoadEvent(
                 start_turn=start_turn,
                 action_history_len=len(self.action_history),
-                action_history_fact_len=len(self.action_history_fact),
+                action_history_fact_len=self._fact_offset + len(self.action_history_fact),
                 pending_tool_count=len(self.pending_tools)
             ))
             
-            # 检查是否已经完成（有final_output）
-            for action in self.action_history_fact:
+            # 检查是否已经完成（有final_output，按构造总在末尾，逆序查找）
+            for action in reversed(self.action_history_fact):
                 if action.get("tool_name") == "final_output":
-                    final_result = action.get("result", {})
-                    self.event_emitter.dispatch(CliDisplayEvent(
-                        message=f"\n✅ 任务已完成，直接返回之前的final_output结果\n   状态: {final_result.get('status')}", 
-                        style='success'
-                    ))
-                    return final_result
+                    self._final_output_action = action
+                    break
+            if self._final_output_action is not None:
+                final_result = self._final_output_action.get("result", {})
+                self._emit_cli(f"\n✅ 任务已完成，直接返回之前的final_output结果\n   状态: {final_result.get('status')}", 'success')
+                return final_result
             
             # 恢复pending工具（如果有）
             if self.pending_tools:
@@ -312,7 +410,7 @@ class AgentExecutor:
 
         return start_turn
 
-    def _build_messages_from_action_history(self) -> List[Dict]:
+    def _build_messages_from_action_history(self, dynamic_context: str = None) -> List[Dict]:
         """
         从 action_history 动态重建 OpenAI 标准格式的 messages 数组
         
@@ -321,134 +419,77 @@ class AgentExecutor:
         2. _no_tool_call → assistant 消息（纯文本）+ user 消息（提醒）
         3. 普通 action → 按 _turn 分组为 assistant(tool_calls) + tool(results) + user(images)
         
+        action_history 中 _turn 单调不减，同一轮的 action 相邻，分组按出现顺序输出。
+        增量构建：已处理的 action 对应的消息会缓存，每次只处理新追加的 action；
+        action_history 被整体替换（加载/压缩/thinking 重置）时重新构建。
+        
+        Args:
+            dynamic_context: 动态上下文（用户最新输入、调用信息、thinking），放在初始 user 消息开头
+        
         Returns:
             OpenAI 格式的 messages 列表
         """
         # 初始 user 消息
+        bootstrap = "请根据当前任务和上下文，执行下一步操作。请调用合适的工具来完成任务。不要重复已执行的动作！"
         messages = [{
             "role": "user", 
-            "content": "请根据当前任务和上下文，执行下一步操作。请调用合适的工具来完成任务。不要重复已执行的动作！"
+            "content": f"{dynamic_context}\n{bootstrap}" if dynamic_context else bootstrap
         }]
         
-        if not self.action_history:
-            return messages
+        history = self.action_history
+        if self._msg_src is not history or self._msg_built > len(history):
+            self._msg_src = history
+            self._msg_built = 0
+            self._msg_special = []  # 历史摘要 / 未调用工具产生的消息（按出现顺序）
+            self._msg_buckets = []  # 按出现顺序的 _turn 分组
         
-        # 按 _turn 分组普通 action
-        turns = OrderedDict()
+        buckets = self._msg_buckets
+        classify_and_bucket(history[self._msg_built:], self._msg_special, buckets, json_fast.dumps)
+        self._msg_built = len(history)
         
-        for action in self.action_history:
-            tool_name = action.get("tool_name", "")
-            
-            # 特殊处理：历史摘要（压缩产物）
-            if tool_name == "_historical_summary":
-                messages.append({
-                    "role": "user",
-                    "content": f"[Previous actions summary]\n{action['result']['output']}"
-                })
-                continue
-            
-            # 特殊处理：LLM 未调用工具
-            if tool_name == "_no_tool_call":
-                assistant_content = action.get("assistant_content", "")
-                if assistant_content:
-                    messages.append({"role": "assistant", "content": assistant_content})
-                messages.append({
-                    "role": "user",
-                    "content": action["result"].get("output", "请调用工具")
-                })
-                continue
-            
-            # 普通 action - 按 _turn 分组
-            turn = action.get("_turn", 0)  # 向后兼容：旧记录默认 turn=0
-            
-            if turn not in turns:
-                turns[turn] = {
-                    "assistant_content": action.get("assistant_content", ""),
-                    "reasoning_content": action.get("reasoning_content", ""),
-                    "tool_calls": [],
-                    "tool_results": [],
-                    "images": []
-                }
-            
-            # 构建 tool_call 条目
-            tool_call_id = action.get("tool_call_id", f"call_{turn}_{len(turns[turn]['tool_calls'])}")
-            turns[turn]["tool_calls"].append({
-                "id": tool_call_id,
-                "type": "function",
-                "function": {
-                    "name": action["tool_name"],
-                    "arguments": json.dumps(action["arguments"], ensure_ascii=False)
-                }
-            })
-            
-            # 构建 tool result 消息
-            has_image = action.get("_has_image", False)
-            has_base64 = bool(action.get("_image_base64"))
-            
-            if has_image and has_base64:
-                # 有图片且有 base64 数据 → tool result 简短说明，图片在后续 user 消息中嵌入
-                result_content = "Image loaded successfully. See below."
-            else:
-                # 无图片 或 有图片标记但 base64 丢失（Ctrl+C 恢复场景）→ 正常 JSON 结果
-                # 排除 _image_base64 等内部字段
-                result_clean = {k: v for k, v in action.get("result", {}).items() 
-                               if not k.startswith("_")}
-                result_content = json.dumps(result_clean, ensure_ascii=False)
-            
-            turns[turn]["tool_results"].append({
-                "role": "tool",
-                "tool_call_id": tool_call_id,
-                "content": result_content
-            })
-            
-            # 收集图片数据（方案二：后续 user 消息嵌入）
-            # 只有同时有 _has_image 标记和实际 base64 数据时才嵌入图片
-            if has_image and has_base64:
-                query = action.get("arguments", {}).get("query", "请分析这些图片")
-                img_data = action["_image_base64"]
-                # 兼容列表和单值
-                if isinstance(img_data, list):
-                    base64_list = img_data
-                else:
-                    base64_list = [img_data]
-                turns[turn]["images"].append({
-                    "base64_list": base64_list,
-                    "query": query
-                })
-        
-        # 从分组数据构建 messages
-        for turn_num in sorted(turns.keys()):
-            turn_data = turns[turn_num]
-            
-            # assistant 消息（包含 content、tool_calls、reasoning_content）
-            assistant_msg = {
-                "role": "assistant",
-                "content": turn_data["assistant_content"] or None,
-                "tool_calls": turn_data["tool_calls"]
-            }
-            # 如果有 reasoning_content，添加到 assistant 消息中
-            # LiteLLM 会将其传递给支持 thinking 的模型（如 Anthropic Claude）
-            if turn_data.get("reasoning_content"):
-                assistant_msg["reasoning_content"] = turn_data["reasoning_content"]
-            messages.append(assistant_msg)
-            
-            # tool result 消息（每个 tool_call 对应一个）
-            messages.extend(turn_data["tool_results"])
-            
-            # 图片消息（方案二：跟在 tool result 后面的 user 消息，多张图合并到一条消息）
-            for img_group in turn_data["images"]:
-                content_parts = []
-                for b64 in img_group["base64_list"]:
-                    image_url = b64 if b64.startswith("data:") else f"data:image/jpeg;base64,{b64}"
-                    content_parts.append({"type": "image_url", "image_url": {"url": image_url}})
-                content_parts.append({
-                    "type": "text",
-                    "text": f"上面是 image_read 获取的 {len(img_group['base64_list'])} 张图片。Agent 的问题是: {img_group['query']}"
-                })
-                messages.append({"role": "user", "content": content_parts})
+        messages.extend(self._msg_special)
+        
+        # 从分组数据构建 messages（每轮只生成一次）
+        for bucket in buckets:
+            if bucket.messages is None:
+                bucket.messages = self._build_turn_messages(bucket)
+            messages.extend(bucket.messages)
         
         return messages
 
+    def _build_turn_messages(self, turn_data: TurnBucket) -> List[Dict]:
+        """将一轮的分组数据转换为 assistant + tool + user(images) 消息"""
+        turn_msgs = []
+        
+        # assistant 消息（包含 content、tool_calls、reasoning_content）
+        assistant_msg = {
+            "role": "assistant",
+            "content": turn_data.assistant_content or None,
+            "tool_calls": turn_data.tool_calls
+        }
+        # 如果有 reasoning_content，添加到 assistant 消息中
+        # LiteLLM 会将其传递给支持 thinking 的模型（如 Anthropic Claude）
+        if turn_data.reasoning_content:
+            assistant_msg["reasoning_content"] = turn_data.reasoning_content
+        turn_msgs.append(assistant_msg)
+        
+        # tool result 消息（每个 tool_call 对应一个）
+        turn_msgs.extend(turn_data.tool_results)
+        
+        # 图片消息（方案二：跟在 tool result 后面的 user 消息，多张图合并到一条消息）
+        for img_group in turn_data.images:
+            content_parts = []
+            for image_url in img_group["base64_list"]:
+                # 入库 / 加载时已统一为 data URL
+                content_parts.append({"type": "image_url", "image_url": {"url": image_url}})
+            content_parts.append({
+                "type": "text",
+                "text": f"上面是 image_read 获取的 {len(img_group['base64_list'])} 张图片。Agent 的问题是: {img_group['query']}"
+            })
+            turn_msgs.append({"role": "user", "content": content_parts})
+        
+        return turn_msgs
+
     def _execute_llm_call(self, system_prompt: str, messages: List[Dict] = None):
         """
         执行LLM调用并分发事件
@@ -468,13 +509,16 @@ class AgentExecutor:
         ))
         
         # 调用LLM（重试机制已在 llm_client 内部实现）
-        llm_response = self.llm_client.chat(
+        # 在共享线程池中执行，主线程仅等待结果，写盘线程等可在等待期间推进
+        future = _LLM_CALL_POOL.submit(
+            self.llm_client.chat,
             history=messages,
             model=self.model_type,
             system_prompt=system_prompt,
             tool_list=self.available_tools,
             tool_choice="required"  # 强制工具调用
         )
+        llm_response = future.result()
         
         self.event_emitter.dispatch(LlmCallEndEvent(
             llm_output=llm_response.output, 
@@ -484,7 +528,7 @@ class AgentExecutor:
 
     def _execute_tool_call(self, tool_call: Dict, task_id: str, user_input: str, turn: int,
                           assistant_content: str = "", reasoning_content: str = "",
-                          llm_turn: int = 0) -> Dict:
+                          llm_turn: int = 0, tool_result_future=None) -> Dict:
         """
         执行单个工具调用并分发事件
         
@@ -496,38 +540,26 @@ class AgentExecutor:
             assistant_content: 该轮 LLM 响应的文本内容（同轮所有 tool_call 共享）
             reasoning_content: 该轮 LLM 响应的推理/思考内容（同轮所有 tool_call 共享）
             llm_turn: LLM 调用轮次（用于消息分组）
+            tool_result_future: 已提交到线程池的工具执行（并发批次，提交前已标记 pending），为 None 时同步执行
         """
-        # ✅ 在保存 pending 之前，为 level != 0 的工具添加 uuid
-        arguments_with_uuid = self._add_uuid_if_needed(tool_call.name, tool_call.arguments)
-        
-        # ✅ 先标记为pending（保存带 uuid 的参数）
-        # 发送工具调用开始事件
-        self.event_emitter.dispatch(ToolCallStartEvent(
-            tool_name=tool_call.name, 
-            arguments=arguments_with_uuid
-        ))
-
-        pending_tool = {
-            "id": tool_call.id,
-            "name": tool_call.name,
-            "arguments": arguments_with_uuid,
-            "status": "pending"
-        }
-        self.pending_tools.append(pending_tool)
-        self._save_state(task_id, user_input, turn)  # 保存pending状态
-
-        # 执行工具（使用带 uuid 的参数）
-        tool_result = self.tool_executor.execute(
-            tool_call.name,
-            arguments_with_uuid,
-            task_id
-        )
+        dispatch = self.event_emitter.dispatch
+        if tool_result_future is not None:
+            # 并发批次：开始事件与 pending 记录已在提交前整批完成
+            arguments_with_uuid = self.pending_tools[tool_call.id]["arguments"]
+            tool_result = tool_result_future.result()
+        else:
+            # ✅ 在保存 pending 之前，为 level != 0 的工具添加 uuid
+            arguments_with_uuid = self._add_uuid_if_needed(tool_call.name, tool_call.arguments)
+            # ✅ 先标记为pending（保存带 uuid 的参数）
+            self._mark_tools_pending([(tool_call, arguments_with_uuid)], task_id, user_input, turn)
+            # 执行工具（使用带 uuid 的参数）
+            tool_result = self._run_tool(tool_call.name, arguments_with_uuid, task_id)
 
         # ✅ 执行后从pending移除
-        self.pending_tools = [t for t in self.pending_tools if t["id"] != tool_call.id]
+        self.pending_tools.pop(tool_call.id, None)
         
         # 发送工具结果事件
-        self.event_emitter.dispatch(ToolCallEndEvent(
+        dispatch(ToolCallEndEvent(
             tool_name=tool_call.name, 
             status=tool_result.get('status', 'unknown'), 
             result=tool_result
@@ -555,7 +587,7 @@ class AgentExecutor:
             output_str = tool_result.get("output", "")
             if isinstance(output_str, str) and ("_image_base64_list" in output_str or "_image_base64" in output_str):
                 try:
-                    inner_result = json.loads(output_str)
+                    inner_result = json_fast.loads(output_str)
                     # 新格式：_image_base64_list（数组）
                     image_base64_list = inner_result.get("_image_base64_list")
                     # 兼容旧格式：_image_base64（单值）→ 转为列表
@@ -568,7 +600,7 @@ class AgentExecutor:
                     inner_result.pop("_image_base64_list", None)
                     inner_result.pop("_image_base64", None)
                     inner_result.pop("_multimodal", None)
-                    tool_result["output"] = json.dumps(inner_result, indent=2, ensure_ascii=False)
+                    tool_result["output"] = json_fast.dumps(inner_result, indent=True)
                     action_record["result"] = tool_result
                 except (json.JSONDecodeError, TypeError):
                     pass
@@ -589,15 +621,22 @@ class AgentExecutor:
             # 只有当主模型支持多模态时，才将图片嵌入 messages
             if image_base64_list and self.llm_client.multimodal:
                 action_record["_has_image"] = True
-                action_record["_image_base64"] = image_base64_list  # 现在是列表
+                # 入库时统一转为 data URL（只拼接一次），之后构建消息直接引用同一字符串
+                action_record["_image_base64"] = _to_image_data_urls(image_base64_list)
         
         # 添加到完整轨迹（永不压缩，但不存储 base64 以节省空间）
-        fact_record = {k: v for k, v in action_record.items() if k != "_image_base64"}
-        fact_record["_image_base64"] = None  # fact 中不保留 base64，仅记录 _has_image 标志
+        # 无图片时两份历史共享同一对象，保存时渲染历史只写引用
+        if action_record["_image_base64"] is None:
+            fact_record = action_record
+        else:
+            # fact 中不保留 base64，仅记录 _has_image 标志（浅拷贝，其余字段共享引用）
+            fact_record = dict(action_record, _image_base64=None)
         self.action_history_fact.append(fact_record)
 
         # 添加到渲染历史（会被压缩，保留 base64 用于 messages 重建）
         self.action_history.append(action_record)
+        if tool_call.name == "final_output":
+            self._final_output_action = action_record
 
         self.hierarchy_manager.add_action(self.agent_id, {
             "tool_name": tool_call.name,
@@ -616,14 +655,66 @@ class AgentExecutor:
             return tool_result
         return None
 
+    def _run_tool(self, tool_name: str, arguments: Dict, task_id: str) -> Dict:
+        """执行工具：compress_context 需要操作本 Agent 的历史，在执行器内处理，其余交给 ToolExecutor"""
+        if tool_name == "compress_context":
+            return self._compress_context(arguments)
+        return self.tool_executor.execute(tool_name, arguments, task_id)
+
+    def _compress_context(self, arguments: Dict) -> Dict:
+        """
+        compress_context 工具：立即压缩 action_history（未超限也压缩）
+        
+        knowledge 参数写入 knowledge_block，之后每轮放在首条 user 消息开头，不随压缩丢失
+        """
+        knowledge = (arguments or {}).get("knowledge")
+        if knowledge:
+            self.knowledge_block = str(knowledge).strip()
+        
+        original_len = len(self.action_history)
+        if original_len < 2:
+            return {"status": "success", "output": "历史动作较少，无需压缩"}
+        
+        from services.action_compressor import ActionCompressor
+
+        if not hasattr(self, 'action_compressor'):
+            self.action_compressor = ActionCompressor(self.llm_client)
+        
+        # 主动压缩后，尚未合并的后台压缩结果基于旧历史，直接丢弃
+        self._pending_compression = None
+        try:
+            compressed, duration_ms = self._timed_compress(
+                self.action_history, self.latest_thinking, self.current_task_input, force=True
+            )
+        except Exception as e:
+            return {"status": "error", "output": "", "error_information": f"压缩失败: {e}"}
+        if compressed is self.action_history:
+            return {"status": "success", "output": "历史动作无需压缩"}
+        
+        self._replace_compressed_history(original_len, compressed, duration_ms)
+        return {
+            "status": "success",
+            "output": f"历史动作已压缩: {original_len}条 → {len(compressed)}条"
+                      + ("，已保留指定的关键信息" if knowledge else "")
+        }
+
     def _handle_execution_error(self, e: Exception):
         """统一处理执行过程中的异常"""
+        # 没有处理器订阅错误事件时，跳过堆栈格式化和消息拼接
+        if self.event_emitter.has_subscribers(ErrorEvent):
+            self.event_emitter.dispatch(ErrorEvent(error_display=self._format_error_display(e)))
+        # 确保已排队的状态写盘后再退出（用于 /resume 恢复），并停止写盘线程
+        self.close()
+        # 直接退出程序
+        sys.exit(1)
+
+    def _format_error_display(self, e: Exception) -> str:
+        """构建友好的错误提示消息"""
         # 获取详细错误信息
         error_type = type(e).__name__
         error_msg = str(e)
-        error_traceback = traceback.format_exc()
+        error_traceback = "".join(traceback.TracebackException.from_exception(e).format())
         
-        # 构建友好的错误提示消息
         error_display = f"""
 ❌ 执行过程中发生错误，任务已中断
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
@@ -646,10 +737,33 @@ class AgentExecutor:
    2. 重新启动 CLI 并输入 /resume 命令恢复任务
 ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━
 """
-        # 通过事件发送错误
-        self.event_emitter.dispatch(ErrorEvent(error_display=error_display))
-        # 直接退出程序
-        sys.exit(1)
+        return error_display
+
+    def _mark_tools_pending(self, tool_calls: List[Tuple], task_id: str, user_input: str, turn: int):
+        """
+        分发工具调用开始事件，并将工具标记为 pending 后立即写盘（崩溃恢复的关键点）
+        
+        Args:
+            tool_calls: [(工具调用对象, 带 uuid 的参数)]
+        """
+        events = []
+        for tool_call, arguments_with_uuid in tool_calls:
+            events.append(ToolCallStartEvent(
+                tool_name=tool_call.name, 
+                arguments=arguments_with_uuid
+            ))
+            self.pending_tools[tool_call.id] = {
+                "id": tool_call.id,
+                "name": tool_call.name,
+                "arguments": arguments_with_uuid,
+                "status": "pending"
+            }
+        if len(events) == 1:
+            self.event_emitter.dispatch(events[0])
+        else:
+            self.event_emitter.dispatch_batch(events)
+        self._save_state(task_id, user_input, turn)  # 保存pending状态
+        self._flush_save(force=True)  # pending 状态是崩溃恢复的关键点，立即写盘
 
     def _add_uuid_if_needed(
             self, 
@@ -667,36 +781,26 @@ class AgentExecutor:
             处理后的参数（如果需要添加 uuid，返回新字典；否则返回原字典）
         """
         try:
-            # 获取工具配置
-            tool_config = self.config_loader.get_tool_config(tool_name)
-            tool_level = tool_config.get("level", 0)
-            tool_type = tool_config.get("type", "")
-            
             # 只对 level != 0 的 llm_call_agent 添加 uuid
-            if tool_type == "llm_call_agent" and tool_level != 0 and "task_input" in arguments:
-                import uuid
+            tool_level = self._needs_uuid_levels.get(tool_name)
+            if tool_level and "task_input" in arguments:
                 # 创建新字典（避免修改原始参数）
                 new_arguments = arguments.copy()
                 original_input = arguments["task_input"]
-                random_suffix = f" [call-{uuid.uuid4().hex[:8]}]"
+                random_suffix = " [call-" + os.urandom(4).hex() + "]"
                 new_arguments["task_input"] = original_input + random_suffix
-                self.event_emitter.dispatch(CliDisplayEvent(
-                    message=f"   🔖 为 level {tool_level} 工具添加 uuid 后缀", 
-                    style='info'
-                ))
+                self._emit_cli("   🔖 为 level %s 工具添加 uuid 后缀" % tool_level)
                 return new_arguments
             
             # 其他情况返回原参数
             return arguments
         
         except Exception as e:
-            self.event_emitter.dispatch(CliDisplayEvent(
-                message=f"⚠️ 添加 uuid 时出错: {e}", 
-                style='warning'
-            ))
+            self._emit_cli(f"⚠️ 添加 uuid 时出错: {e}", 'warning')
             return arguments
     
-    def _trigger_thinking(self, task_id: str, task_input: str, is_initial: bool = False, is_forced: bool = False) -> str:
+    def _trigger_thinking(self, task_id: str, task_input: str, is_initial: bool = False, is_forced: bool = False,
+                          system_prompt: str = None) -> str:
         """
         触发Thinking Agent进行分析
         
@@ -705,12 +809,14 @@ class AgentExecutor:
             task_input: 任务输入
             is_initial: 是否是首次thinking
             is_forced: 是否因为多次未调用工具而被强制触发thinking
+            system_prompt: 已构建好的完整系统提示词（含历史动作），为 None 时重新构建
             
         Returns:
             分析结果
         """
+        dispatch = self.event_emitter.dispatch
         # 发送Thinking开始事件
-        self.event_emitter.dispatch(ThinkingStartEvent(
+        dispatch(ThinkingStartEvent(
             agent_name=self.agent_name, 
             is_initial=is_initial, 
             is_forced=is_forced
@@ -721,14 +827,13 @@ class AgentExecutor:
             thinking_agent = ThinkingAgent()
 
             # 构建完整的系统提示词（包含历史动作XML，供 thinking agent 分析）
-            full_system_prompt = self.context_builder.build_context(
-                task_id,
-                self.agent_id,
-                self.agent_name,
-                task_input,
-                action_history=self.action_history,
-                include_action_history=True  # thinking agent 需要看到历史动作
-            )
+            full_system_prompt = system_prompt
+            if full_system_prompt is None:
+                full_system_prompt = self._build_context_cached(
+                    task_id,
+                    task_input,
+                    include_action_history=True  # thinking agent 需要看到历史动作
+                )
             result = thinking_agent.analyze_first_thinking(
                 task_description=task_input,
                 agent_system_prompt=full_system_prompt,
@@ -738,7 +843,7 @@ class AgentExecutor:
                 multimodal=self.llm_client.multimodal  # 传递多模态标志
             )
             # 发送 thinking 事件（完整内容）
-            self.event_emitter.dispatch(ThinkingEndEvent(
+            dispatch(ThinkingEndEvent(
                 agent_name=self.agent_name, 
                 result=result,
                 is_initial=is_initial,
@@ -748,14 +853,20 @@ class AgentExecutor:
         except Exception as e:
             error_msg = str(e)
             # 发送Thinking失败事件
-            self.event_emitter.dispatch(ThinkingFailEvent(
+            dispatch(ThinkingFailEvent(
                 agent_name=self.agent_name, 
                 error_message=error_msg
             ))
             raise Exception(str(e))
 
     def _compress_action_history_if_needed(self):
-        """检查并压缩历史动作（如果超过上下文窗口限制）"""
+        """
+        检查并压缩历史动作（如果超过上下文窗口限制）
+        
+        接近上限（预算的 compress_trigger_ratio，默认 80%）时在后台线程对当前快照提前压缩，压缩期间主循环照常追加动作，
+        完成后在下一轮开始时合并（摘要 + 快照之后新追加的动作）；
+        真正超限时若后台压缩未完成则等待其结果，没有后台任务则同步压缩。
+        """
         if not self.action_history:
             return
         
@@ -766,76 +877,231 @@ class AgentExecutor:
             if not hasattr(self, 'action_compressor'):
                 self.action_compressor = ActionCompressor(self.llm_client)
             
+            # 后台压缩已完成则先合并
+            pending = self._pending_compression
+            if pending is not None and pending[0].done():
+                self._apply_background_compression()
+            
+            # 快速预判：逐条缓存的 token 估算明显未超限时跳过压缩器（留 5% 余量）
+            max_window = self.llm_client.max_context_window
+            estimate = self._estimate_context_tokens()
+            budget = max_window - 20000 if len(self.action_history) > 1 else max_window // 2
+            if estimate <= budget * 0.95:
+                # 接近上限：后台提前压缩，不阻塞本轮
+                if (estimate > budget * self.llm_client.compress_trigger_ratio
+                        and self._pending_compression is None and len(self.action_history) > 1):
+                    snapshot = list(self.action_history)
+                    future = _COMPRESSION_POOL.submit(
+                        self._timed_compress,
+                        snapshot,
+                        self.latest_thinking,
+                        self.current_task_input,
+                        force=True
+                    )
+                    self._pending_compression = (future, self.action_history, snapshot)
+                return
+            
+            # 已超限：优先等待后台压缩结果，合并后仍超限再同步压缩
+            if self._pending_compression is not None:
+                self._emit_cli("⏳ 等待后台历史压缩完成...")
+                if self._apply_background_compression():
+                    estimate = self._estimate_context_tokens()
+                    if estimate <= budget * 0.95:
+                        return
+            
             # 使用新的压缩策略（传入 thinking 和 task_input）
             original_len = len(self.action_history)
-            compressed = self.action_compressor.compress_if_needed(
-                self.action_history,
-                self.llm_client.max_context_window,
-                thinking=self.latest_thinking,
-                task_input=self.current_task_input
+            compressed, duration_ms = self._timed_compress(
+                self.action_history, self.latest_thinking, self.current_task_input
             )
 
-            # 如果发生了压缩，替换
-            if len(compressed) < original_len:
-                self.event_emitter.dispatch(CliDisplayEvent(
-                    message=f"✅ 历史动作已压缩: {original_len}条 → {len(compressed)}条", 
-                    style='success'
-                ))
-                self.action_history = compressed
+            # 如果发生了压缩，替换（未压缩时返回原列表）
+            if compressed is not self.action_history:
+                self._replace_compressed_history(original_len, compressed, duration_ms)
         except Exception as e:
-            self.event_emitter.dispatch(CliDisplayEvent(
-                message=f"⚠️ 压缩失败: {e}", 
-                style='warning'
-            ))
-            traceback.print_exc()
+            # 只报告异常类型和出错位置（最内层栈帧），不格式化完整堆栈
+            tb = e.__traceback__
+            while tb is not None and tb.tb_next is not None:
+                tb = tb.tb_next
+            location = f" ({os.path.basename(tb.tb_frame.f_code.co_filename)}:{tb.tb_lineno})" if tb else ""
+            self._emit_cli(f"⚠️ 压缩失败: {type(e).__name__}: {e}{location}", 'warning')
+    
+    def _apply_background_compression(self) -> bool:
+        """
+        等待并合并后台压缩结果
+        
+        Returns:
+            是否替换了 action_history（压缩期间历史被整体替换时丢弃结果）
+        """
+        future, source, snapshot = self._pending_compression
+        self._pending_compression = None
+        try:
+            compressed, duration_ms = future.result()
+        except Exception as e:
+            self._emit_cli(f"⚠️ 后台压缩失败: {e}", 'warning')
+            return False
+        
+        history = self.action_history
+        snapshot_len = len(snapshot)
+        if history is not source or len(history) < snapshot_len or compressed is snapshot:
+            return False
+        
+        self._replace_compressed_history(len(history), compressed + history[snapshot_len:], duration_ms)
+        return True
+    
+    def _timed_compress(self, history: List[Dict], thinking: str, task_input: str,
+                        force: bool = False) -> Tuple[List[Dict], float]:
+        """调用压缩器并计时，返回 (压缩结果, 耗时毫秒)；可在后台线程执行"""
+        start = time.perf_counter()
+        compressed = self.action_compressor.compress_if_needed(
+            history,
+            self.llm_client.max_context_window,
+            thinking=thinking,
+            task_input=task_input,
+            force=force
+        )
+        return compressed, (time.perf_counter() - start) * 1000
+    
+    def _replace_compressed_history(self, original_len: int, compressed: List[Dict], duration_ms: float = 0.0):
+        """用压缩后的历史替换 action_history，并分发压缩指标事件"""
+        if not self.event_emitter.has_subscribers(CompressionEvent):
+            self.action_history = compressed
+            return
+        before_tokens = self._estimate_context_tokens()
+        self.action_history = compressed
+        self.event_emitter.dispatch(CompressionEvent(
+            mode=self.action_compressor.last_compress_mode or "",
+            before_count=original_len,
+            after_count=len(compressed),
+            before_tokens=before_tokens,
+            after_tokens=self._estimate_context_tokens(),
+            duration_ms=duration_ms
+        ))
+    
+    def _estimate_history_tokens(self) -> int:
+        """估算 action_history 的 token 总数, 仅对新追加的条目计数（累计值增量维护）"""
+        history = self.action_history
+        lens = self._action_token_lens
+        # 列表被整体替换（加载/压缩）或被截短时重新统计
+        if self._action_token_src is not history or len(lens) > len(history):
+            lens = self._action_token_lens = []
+            self._action_token_total = 0
+            self._action_token_src = history
+        if len(lens) < len(history):
+            count_action_tokens = self.action_compressor.count_action_tokens
+            new_lens = [count_action_tokens(action) for action in history[len(lens):]]
+            lens.extend(new_lens)
+            self._action_token_total += sum(new_lens)
+        return self._action_token_total
+    
+    def _estimate_context_tokens(self) -> int:
+        """估算压缩判断所需的 token 总数（历史动作 + thinking + 任务输入，后两者不变时不重复计数）"""
+        thinking, task_input, prompt_tokens = self._prompt_token_cache
+        if thinking is not self.latest_thinking or task_input is not self.current_task_input:
+            thinking, task_input = self.latest_thinking, self.current_task_input
+            prompt_tokens = self.action_compressor.count_tokens((thinking or "") + (task_input or ""))
+            self._prompt_token_cache = (thinking, task_input, prompt_tokens)
+        return self._estimate_history_tokens() + prompt_tokens
     
     def _recover_pending_tools(self, task_id: str):
-        """恢复pending状态的工具调用"""
-        for pending_tool in self.pending_tools:
-            tool_name, tool_args = pending_tool['name'], pending_tool['arguments']
-            try:
-                self.event_emitter.dispatch(CliDisplayEvent(
-                    message=f"   🔄 恢复执行: {tool_name}\n   📋 参数: {tool_args}", 
-                    style='info'
-                ))
-                
-                # 重新执行工具
-                tool_result = self.tool_executor.execute(
-                    tool_name,
-                    tool_args,
-                    task_id
+        """恢复pending状态的工具调用（过程中的CLI消息收集后一次性分发）"""
+        events = []
+        pending_list = list(self.pending_tools.values())
+        # 与主循环相同：pending 工具全部为只读（concurrency_safe）时才并发提交，结果仍按原顺序记录；
+        # 只要有一个非只读工具就全部逐个执行（避免只读工具先于其前面的写操作执行）
+        tool_futures = {}
+        if len(pending_list) > 1 and all(
+            p['name'] in self._concurrency_safe_tools for p in pending_list
+        ):
+            for pending_tool in pending_list:
+                tool_futures[pending_tool['id']] = _TOOL_CALL_POOL.submit(
+                    self.tool_executor.execute, pending_tool['name'], pending_tool['arguments'], task_id
                 )
-                
-                # 记录结果
-                action_record = {
-                    "tool_name": tool_name,
-                    "arguments": tool_args,
-                    "result": tool_result
-                }
-                
-                self.action_history_fact.append(action_record)
-                self.action_history.append(action_record)
-                
-                # 从pending移除
-                self.pending_tools.remove(pending_tool)
-                
-                self.event_emitter.dispatch(CliDisplayEvent(
-                    message=f"   ✅ 恢复完成: {tool_name}", 
-                    style='success'
-                ))
-                
-                # 如果是final_output，直接返回
-                if tool_name == "final_output":
-                    return tool_result
-            except Exception as e:
-                self.event_emitter.dispatch(CliDisplayEvent(
-                    message=f"   ❌ 恢复失败: {tool_name} - {e}", 
-                    style='error'
-                ))
-        # 清空pending列表
-        self.pending_tools = []
+        try:
+            for pending_tool in pending_list:
+                tool_name, tool_args = pending_tool['name'], pending_tool['arguments']
+                try:
+                    events.append(CliDisplayEvent(message="   🔄 恢复执行: %s\n   📋 参数: %s" % (tool_name, tool_args), style='info'))
+                    
+                    # 重新执行工具（已并发提交的直接等待结果）
+                    future = tool_futures.get(pending_tool['id'])
+                    if future is not None:
+                        tool_result = future.result()
+                    else:
+                        tool_result = self._run_tool(tool_name, tool_args, task_id)
+                    
+                    # 记录结果
+                    # 恢复的调用单独成一轮，并沿用原 tool_call_id，保证消息重建时分组正确
+                    action_record = {
+                        "_turn": self.llm_turn_counter,
+                        "tool_call_id": pending_tool["id"],
+                        "tool_name": tool_name,
+                        "arguments": tool_args,
+                        "result": tool_result
+                    }
+                    self.llm_turn_counter += 1
+                    
+                    self.action_history_fact.append(action_record)
+                    self.action_history.append(action_record)
+                    if tool_name == "final_output":
+                        self._final_output_action = action_record
+                    
+                    # 从pending移除
+                    self.pending_tools.pop(pending_tool["id"], None)
+                    
+                    events.append(CliDisplayEvent(message="   ✅ 恢复完成: %s" % tool_name, style='success'))
+                    
+                    # 如果是final_output，直接返回
+                    if tool_name == "final_output":
+                        return tool_result
+                except Exception as e:
+                    events.append(CliDisplayEvent(message=f"   ❌ 恢复失败: {tool_name} - {e}", style='error'))
+            # 清空pending列表
+            self.pending_tools = {}
+        finally:
+            if self.event_emitter.has_subscribers(CliDisplayEvent):
+                self.event_emitter.dispatch_batch(events)
     
-    def _save_state(self, task_id: str, user_input: str, current_turn: int):
+    def _build_context_cached(self, task_id: str, task_input: str, include_action_history: bool) -> str:
+        """
+        构建系统提示词（按状态缓存，避免重复构建）
+        
+        缓存键包含 action_history 的长度与末尾元素、工具调用计数、最新 thinking 和共享上下文版本，
+        任一变化都会触发重新构建；每种 include_action_history 只保留最近一份。
+        
+        Args:
+            task_id: 任务ID
+            task_input: 任务输入
+            include_action_history: 是否在系统提示词中包含历史动作
+            
+        Returns:
+            系统提示词
+        """
+        key = (
+            self.agent_id,
+            include_action_history,
+            self.action_history[-1] if self.action_history else None,  # 持有引用，避免 id 复用误命中
+            len(self.action_history),
+            self.tool_call_counter,
+            hash(self.latest_thinking),
+            self.hierarchy_manager.get_version()
+        )
+        entry = self._ctx_cache.get(include_action_history)
+        if entry is not None and entry[0] == key:
+            cached = entry[1]
+        else:
+            cached = self.context_builder.build_context(
+                task_id,
+                self.agent_id,
+                self.agent_name,
+                task_input,
+                action_history=self.action_history,
+                include_action_history=include_action_history
+            )
+            self._ctx_cache[include_action_history] = (key, cached)
+        return cached
+
+    def _save_state(self, task_id: str, user_input: str, current_turn: int, system_prompt: str = None):
         """
         保存当前状态
         
@@ -843,33 +1109,127 @@ class AgentExecutor:
             task_id: 任务ID
             user_input: 用户输入
             current_turn: 当前轮次
+            system_prompt: 已构建好的完整系统提示词（含历史动作），为 None 时按需构建
         """
-        # 构建完整的系统提示词（包含历史动作XML，用于调试/参考）
-        full_system_prompt = self.context_builder.build_context(
-            task_id,
-            self.agent_id,
-            self.agent_name,
-            user_input,
-            action_history=self.action_history,
-            include_action_history=True  # 保存时包含完整上下文
+        # 状态与上次保存完全相同（同一轮次内重复保存且期间状态无变化）时跳过；
+        # current_turn 决定 /resume 时的起始轮次，必须计入键（轮次变化时总会保存）
+        # 记录的都是本轮会变化的字段；action 列表只追加或整体替换，用长度与末尾元素判断
+        save_key = (
+            task_id, current_turn, system_prompt,
+            id(self.action_history), len(self.action_history),
+            self.action_history[-1] if self.action_history else None,
+            self._fact_offset + len(self.action_history_fact),
+            tuple(self.pending_tools), self.latest_thinking, self.knowledge_block, self.first_thinking_done,
+            self.tool_call_counter, self.llm_turn_counter
         )
+        if save_key == self._last_save_key:
+            return
+        self._last_save_key = save_key
+
+        # 构建完整的系统提示词（包含历史动作XML，仅用于调试参考，需要渲染全部历史，默认不构建）
+        full_system_prompt = system_prompt
+        if full_system_prompt is None and self.llm_client.save_system_prompt:
+            full_system_prompt = self._build_context_cached(
+                task_id,
+                user_input,
+                include_action_history=True  # 保存时包含完整上下文
+            )
+
+        self._last_saved_prompt = full_system_prompt
 
-        # 保存状态
-        self.conversation_storage.save_actions(
+        self._evict_persisted_fact(task_id)
+
+        # 记录状态快照（列表做浅拷贝，避免主循环后续修改影响写盘内容）
+        self._pending_save = dict(
             task_id=task_id,
             agent_id=self.agent_id,
             agent_name=self.agent_name,
             task_input=user_input,
-            action_history=self.action_history,  # 渲染用（会压缩，含 base64）
-            action_history_fact=self.action_history_fact,  # 完整轨迹（不含 base64）
-            pending_tools=self.pending_tools,
+            action_history=list(self.action_history),  # 渲染用（会压缩，含 base64）
+            action_history_fact=list(self.action_history_fact),  # 完整轨迹（不含 base64）
+            action_history_fact_offset=self._fact_offset,
+            pending_tools=list(self.pending_tools.values()),
             current_turn=current_turn,
             latest_thinking=self.latest_thinking,
             first_thinking_done=self.first_thinking_done,
             tool_call_counter=self.tool_call_counter,
             llm_turn_counter=self.llm_turn_counter,
-            system_prompt=full_system_prompt
+            knowledge_block=self.knowledge_block,
+            system_prompt=full_system_prompt or ""
         )
+        self._flush_save()
+
+    def _evict_persisted_fact(self, task_id: str):
+        """
+        完整轨迹只在内存中保留最近 _fact_hot_limit 条，更早的条目已追加写入 JSONL 后从内存移除
+        （超出 256 条以上才批量移除，避免每轮移动列表）
+        """
+        excess = len(self.action_history_fact) - self._fact_hot_limit
+        if excess < 256:
+            return
+        persisted = self.conversation_storage.get_fact_persisted(task_id, self.agent_id) - self._fact_offset
+        evict = min(excess, persisted)
+        if evict > 0:
+            del self.action_history_fact[:evict]
+            self._fact_offset += evict
+
+    def _flush_save(self, force: bool = False):
+        """
+        将最新的状态快照投递给写盘线程（全量覆盖写，中间快照可直接丢弃）
+        
+        Args:
+            force: 是否忽略写盘间隔立即投递
+        """
+        if self._pending_save is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush_ts <= self._save_flush_interval:
+            return
+        if self._save_thread is None:
+            self._save_thread = threading.Thread(target=self._save_worker, daemon=True)
+            self._save_thread.start()
+        self._save_queue.put_nowait(self._pending_save)
+        self._pending_save = None
+        self._last_flush_ts = now
+
+    def _save_worker(self):
+        """后台写盘线程：批量取出快照，每个 task_id 只写入最新的一份；取到退出标记时写完本批后退出"""
+        stop = False
+        while not stop:
+            snapshots = [self._save_queue.get()]
+            while True:
+                try:
+                    snapshots.append(self._save_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            # 合并：同一 task_id 只保留最后一份快照（全量覆盖写）
+            latest = {}
+            for snapshot in snapshots:
+                if snapshot is _SAVE_WORKER_STOP:
+                    stop = True
+                else:
+                    latest[snapshot["task_id"]] = snapshot
+
+            try:
+                for snapshot in latest.values():
+                    self.conversation_storage.save_actions(**snapshot)
+            finally:
+                for _ in snapshots:
+                    self._save_queue.task_done()
+
+    def flush(self):
+        """投递尚未写盘的状态快照，并阻塞等待所有快照写盘完成"""
+        self._flush_save(force=True)
+        self._save_queue.join()
+
+    def close(self):
+        """写完所有快照后停止写盘线程（run 结束时调用；之后再次保存会重新启动线程）"""
+        self.flush()
+        if self._save_thread is not None:
+            self._save_queue.put_nowait(_SAVE_WORKER_STOP)
+            self._save_thread.join()
+            self._save_thread = None
 
 
 if __name__ == "__main__":
@@ -7,6 +7,8 @@ from utils.windows_compat import safe_print
 
 from typing import Dict, List, Optional
 import json
+from utils.conversation_storage import expand_action_history
+from utils import json_fast
 
 
 class ContextBuilder:
@@ -30,6 +32,13 @@ class ContextBuilder:
         self.llm_client = llm_client
         self.max_context_window = max_context_window
         
+        # 构建缓存：通用提示词与 skills 在运行期间不变；共享上下文部分按版本失效；
+        # 单条动作的渲染结果按动作对象缓存（动作记录写入后不再修改）
+        self._general_prompt_cache: Dict[str, str] = {}
+        self._skills_xml: Optional[str] = None
+        self._hierarchy_parts_cache: Dict[str, tuple] = {}
+        self._action_xml_cache: Dict[int, tuple] = {}
+        
         # 初始化 Skill 加载器
         try:
             from utils.skill_loader import get_skill_loader
@@ -63,10 +72,6 @@ class ContextBuilder:
         Returns:
             完整的XML结构化上下文字符串（包含通用提示词）
         """
-        context_data = self.hierarchy_manager.get_context()
-        current = context_data.get("current", {})
-        history = context_data.get("history", [])
-        
         # 使用传入的action_history
         if action_history is not None:
             self.current_action_history = action_history
@@ -74,19 +79,13 @@ class ContextBuilder:
         # 1️⃣ 读取通用系统提示词（general_prompts.yaml，包含<智能体经验>）
         general_system_prompt = self._load_general_system_prompt(agent_name)
         
-        # 2️⃣ 构建各个动态部分
-        user_latest_input = self._build_user_latest_input(current)
-        user_agent_history = self._build_user_agent_history(task_id, current)
-        structured_call_info = self._build_structured_call_info(current, agent_id)
+        # 2️⃣ 构建各个动态部分（共享上下文未变化时复用上次结果）
+        current, user_latest_input, user_agent_history, structured_call_info = \
+            self._get_hierarchy_parts(task_id, agent_id)
         current_thinking = self._build_current_thinking(task_id, agent_id, current)
         
         # 2.5️⃣ 构建可用 skills 列表（如果有）
-        available_skills_xml = ""
-        if self.skill_loader:
-            try:
-                available_skills_xml = self.skill_loader.build_available_skills_xml()
-            except Exception:
-                pass
+        available_skills_xml = self._get_available_skills_xml()
         
         # 3️⃣ 组装完整上下文（通用部分在最前面）
         full_context = f"""{general_system_prompt}
@@ -131,9 +130,117 @@ class ContextBuilder:
         
         return full_context
     
+    def build_static_context(self, task_id: str, agent_id: str, agent_name: str, task_input: str) -> str:
+        """
+        构建主LLM调用的静态系统提示词（同一次运行内保持不变，便于服务商前缀缓存）
+        
+        只包含运行期间不变的部分：通用提示词、用户-智能体历史交互、智能体名称、任务和可用 skills。
+        会变化的部分由 build_dynamic_context 构建，通过 messages 传递。
+        
+        Args:
+            task_id: 任务ID
+            agent_id: 当前Agent ID
+            agent_name: 当前Agent名称
+            task_input: 当前Agent的任务输入
+            
+        Returns:
+            静态系统提示词
+        """
+        general_system_prompt = self._load_general_system_prompt(agent_name)
+        _, _, user_agent_history, _ = self._get_hierarchy_parts(task_id, agent_id)
+        available_skills_xml = self._get_available_skills_xml()
+        
+        static_context = f"""{general_system_prompt}
+
+<用户-智能体历史交互>
+{user_agent_history}
+</用户-智能体历史交互>
+
+<当前运行智能体名称>
+{agent_name}
+</当前运行智能体名称>
+
+<当前智能体任务>
+{task_input}
+</当前智能体任务>
+"""
+        if available_skills_xml:
+            static_context += f"\n{available_skills_xml}\n"
+        
+        return static_context
+    
+    def build_dynamic_context(self, task_id: str, agent_id: str) -> str:
+        """
+        构建主LLM调用的动态上下文（用户最新输入、结构化调用信息、当前进度思考）
+        
+        Args:
+            task_id: 任务ID（用于读取thinking）
+            agent_id: 当前Agent ID
+            
+        Returns:
+            动态上下文XML字符串
+        """
+        current, user_latest_input, _, structured_call_info = self._get_hierarchy_parts(task_id, agent_id)
+        current_thinking = self._build_current_thinking(task_id, agent_id, current)
+        
+        return f"""<用户最新输入>
+{user_latest_input}
+</用户最新输入>
+
+<结构化调用信息>
+{structured_call_info}
+</结构化调用信息>
+
+<当前进度思考>
+{current_thinking}
+</当前进度思考>
+"""
+    
+    def _get_hierarchy_parts(self, task_id: str, agent_id: str) -> tuple:
+        """
+        获取依赖共享上下文的各部分，共享上下文版本未变化时直接复用
+        
+        Args:
+            task_id: 任务ID
+            agent_id: 当前Agent ID
+            
+        Returns:
+            (current, 用户最新输入, 用户-智能体历史交互, 结构化调用信息)
+        """
+        get_version = getattr(self.hierarchy_manager, "get_version", None)
+        version = get_version() if get_version else None
+        if version is not None:
+            cached = self._hierarchy_parts_cache.get(agent_id)
+            if cached is not None and cached[0] == version:
+                return cached[1]
+        
+        current = self.hierarchy_manager.get_context().get("current", {})
+        parts = (
+            current,
+            self._build_user_latest_input(current),
+            self._build_user_agent_history(task_id, current),
+            self._build_structured_call_info(current, agent_id),
+        )
+        # 使用构建前的版本作为键：构建过程中写入的压缩结果会在下次调用时触发重建
+        if version is not None:
+            self._hierarchy_parts_cache[agent_id] = (version, parts)
+        return parts
+    
+    def _get_available_skills_xml(self) -> str:
+        """构建可用 skills 列表（skills 元数据在运行期间不变，只构建一次）"""
+        if self._skills_xml is None:
+            available_skills_xml = ""
+            if self.skill_loader:
+                try:
+                    available_skills_xml = self.skill_loader.build_available_skills_xml()
+                except Exception:
+                    pass
+            self._skills_xml = available_skills_xml
+        return self._skills_xml
+    
     def _load_general_system_prompt(self, agent_name: str) -> str:
         """
-        读取并格式化通用系统提示词（包含<智能体经验>）
+        读取并格式化通用系统提示词（包含<智能体经验>），按 agent_name 缓存
         
         Args:
             agent_name: Agent名称
@@ -141,6 +248,13 @@ class ContextBuilder:
         Returns:
             格式化后的通用系统提示词（XML格式）
         """
+        cached = self._general_prompt_cache.get(agent_name)
+        if cached is None:
+            cached = self._general_prompt_cache[agent_name] = self._read_general_system_prompt(agent_name)
+        return cached
+    
+    def _read_general_system_prompt(self, agent_name: str) -> str:
+        """读取 general_prompts.yaml 并格式化"""
         # 读取general_prompts.yaml
         import yaml
         from pathlib import Path
@@ -642,52 +756,61 @@ Agent调用树数据：
                 if filepath.exists():
                     with open(filepath, 'r', encoding='utf-8') as f:
                         data = json.load(f)
-                        action_history = data.get("action_history", [])
+                        action_history = expand_action_history(data, filepath)
             except Exception as e:
                 safe_print(f"⚠️ 读取action_history失败: {e}")
         
         if not action_history:
             return "(无历史动作)"
         
-        # 构建XML格式的动作历史
+        # 构建XML格式的动作历史（复用已渲染过的动作，只缓存本次仍存在的动作）
         actions_xml = []
+        prev_cache = self._action_xml_cache
+        xml_cache = {}
         for action in action_history:
-            tool_name = action.get("tool_name", "")
-            
-            # 检查是否是历史总结
-            if tool_name == "_historical_summary":
-                # 渲染为<已压缩信息>
-                summary_text = action.get("result", {}).get("output", "")
-                actions_xml.append(f"<已压缩信息>\n{summary_text}\n</已压缩信息>")
+            cached = prev_cache.get(id(action))
+            if cached is not None and cached[0] is action:
+                xml_cache[id(action)] = cached
+                actions_xml.append(cached[1])
                 continue
-            
-            # 普通action
-            arguments = action.get("arguments", {})
-            result = action.get("result", {})
-            
-            # 构建单个动作的XML
-            # action_xml = f"<action>\n"
-            # action_xml += f"  <tool_name>{tool_name}</tool_name>\n"
-            action_xml = f"action:\n"
-            action_xml += f"  tool_name:{tool_name}\n"            
-            # 添加参数
-            for param_name, param_value in arguments.items():
-                # 转义XML特殊字符
-                param_value_str = str(param_value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                #action_xml += f"  <tool_use:{param_name}>{param_value_str}</tool_use:{param_name}>\n"
-                action_xml += f"  {param_name}:{param_value_str}\n"
-            
-            # 添加结果（JSON格式）
-            try:
-                result_json = json.dumps(result, ensure_ascii=False, indent=2)
-                action_xml += f"  <result>\n{result_json}\n  </result>\n"
-            except:
-                action_xml += f"  <result>{str(result)}</result>\n"
-            
-            # action_xml += "</action>"
+            action_xml = self._render_action_xml(action)
+            xml_cache[id(action)] = (action, action_xml)
             actions_xml.append(action_xml)
+        self._action_xml_cache = xml_cache
         
         return "\n\n".join(actions_xml)
+    
+    def _render_action_xml(self, action: Dict) -> str:
+        """渲染单条动作记录"""
+        tool_name = action.get("tool_name", "")
+        
+        # 检查是否是历史总结
+        if tool_name == "_historical_summary":
+            # 渲染为<已压缩信息>
+            summary_text = action.get("result", {}).get("output", "")
+            return f"<已压缩信息>\n{summary_text}\n</已压缩信息>"
+        
+        # 普通action
+        arguments = action.get("arguments", {})
+        result = action.get("result", {})
+        
+        # 构建单个动作的文本（片段收集后一次拼接）
+        # 原 XML 格式: <action><tool_name>..</tool_name><tool_use:参数名>..</tool_use:参数名>..</action>
+        parts = [f"action:\n  tool_name:{tool_name}\n"]
+        # 添加参数
+        for param_name, param_value in arguments.items():
+            # 转义XML特殊字符（不含特殊字符时 replace 直接返回原字符串，不产生新对象）
+            param_value_str = str(param_value).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            parts.append(f"  {param_name}:{param_value_str}\n")
+        
+        # 添加结果（JSON格式）
+        try:
+            result_json = json_fast.dumps(result, indent=True)
+            parts.append(f"  <result>\n{result_json}\n  </result>\n")
+        except:
+            parts.append(f"  <result>{str(result)}</result>\n")
+        
+        return "".join(parts)
 
 
 if __name__ == "__main__":
@@ -5,22 +5,169 @@
 """
 
 from gc import is_finalized
-import json
+import time
+import queue
+import atexit
+import threading
+from typing import List
 from .events import *
 from utils.windows_compat import safe_print
 from utils.event_emitter import get_event_emitter as get_jsonl_emitter
+from utils import json_fast
+
+
+def _head(value, n: int = 100) -> str:
+    """
+    取前 n 个字符用于预览：不超长的字符串原样返回；
+    dict/list 序列化为 JSON 后按字节截取，避免完整 str(dict) 后再截断
+    """
+    if not isinstance(value, str):
+        if isinstance(value, (dict, list)):
+            try:
+                # UTF-8 单字符最多 4 字节，截取 4n 字节足够得到 n 个字符（被截断的末尾字符丢弃）
+                value = json_fast.dumps_bytes(value)[:n * 4].decode('utf-8', 'ignore')
+            except (TypeError, ValueError):
+                value = str(value)
+        else:
+            value = str(value)
+    return value if len(value) <= n else value[:n]
+
+
+class _ConsoleWriter:
+    """
+    后台控制台输出线程.
+    按 50ms / 8KB 批量合并后写出, 避免执行线程逐行等待输出;
+    所有 ConsoleLogHandler 共用一个实例, 保证多个 Agent 的输出顺序.
+    """
+    FLUSH_INTERVAL = 0.05
+    FLUSH_SIZE = 8192
+
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    def write(self, text: str):
+        """排队一行输出"""
+        if self._thread is None:
+            self._start()
+        self._queue.put(text)
+
+    def flush(self):
+        """阻塞等待已排队的输出全部写出"""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def _start(self):
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._drain, name="console-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            batch, size = [], 0
+            deadline = time.monotonic() + self.FLUSH_INTERVAL
+            while True:
+                if isinstance(item, threading.Event):
+                    # flush 请求：先写出已合并的内容再通知
+                    self._write_batch(batch)
+                    batch, size = [], 0
+                    item.set()
+                else:
+                    batch.append(item)
+                    size += len(item)
+                    if size >= self.FLUSH_SIZE:
+                        break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            self._write_batch(batch)
+
+    @staticmethod
+    def _write_batch(batch):
+        if not batch:
+            return
+        try:
+            safe_print("\n".join(batch))
+        except Exception:
+            pass
+
+
+_console_writer = _ConsoleWriter()
+
+# Agent 启动/完成时的分隔横幅
+_BANNER_TOP = "\n" + "=" * 80
+_BANNER_BOTTOM = "=" * 80 + "\n"
+
 
 class ConsoleLogHandler:
     """
     控制台日志处理器.
     消费AgentEvent, 并以用户友好的格式打印到控制台.
     """
+    subscribed_types = (
+        AgentStartEvent, AgentEndEvent, ModelSelectionEvent, HistoryLoadEvent,
+        LlmCallStartEvent, LlmCallEndEvent, ToolCallStartEvent, ToolCallEndEvent,
+        ThinkingStartEvent, ThinkingEndEvent, ThinkingFailEvent,
+        CompressionEvent, ErrorEvent, CliDisplayEvent,
+    )
+
+    # 之后会有其他直接输出（工具执行、LLM 调用、退出）的事件：处理后等待输出写完，保持顺序
+    flush_types = (
+        AgentEndEvent, LlmCallStartEvent, ToolCallStartEvent, ThinkingStartEvent, ErrorEvent,
+    )
+
+    def __init__(self):
+        # 事件类 -> (打印方法, 处理后是否等待输出写完)，只解析一次，分发时不再做类型检查
+        self._dispatch = {
+            event_cls: self._resolve_print_method(event_cls)
+            for event_cls in self.subscribed_types
+        }
+
+    def _resolve_print_method(self, event_cls: type):
+        """按 event_type 查找打印方法（'.' 替换为 '_' 以匹配方法名），并确定是否需要等待写出"""
+        method = getattr(self, f"_print_{event_cls.event_type.replace('.', '_')}", self._print_default)
+        return method, issubclass(event_cls, self.flush_types)
+
     def handle(self, event: AgentEvent):
         """根据事件类型, 调用不同的打印方法"""
-        # 将 event_type 中的 '.' 替换为 '_', 以匹配方法名
-        method_name = f"_print_{event.event_type.replace('.', '_')}"
-        handler_method = getattr(self, method_name, self._print_default)
+        entry = self._dispatch.get(type(event))
+        if entry is None:
+            # 未预解析的事件类型（如子类）解析后缓存
+            entry = self._dispatch[type(event)] = self._resolve_print_method(type(event))
+        handler_method, need_flush = entry
         handler_method(event)
+        if need_flush:
+            _console_writer.flush()
+
+    def handle_batch(self, events: List[AgentEvent]):
+        """批量处理事件: 依次写入输出队列，最后最多等待一次写出"""
+        dispatch = self._dispatch
+        any_flush = False
+        for event in events:
+            entry = dispatch.get(type(event))
+            if entry is None:
+                entry = dispatch[type(event)] = self._resolve_print_method(type(event))
+            handler_method, need_flush = entry
+            handler_method(event)
+            any_flush = any_flush or need_flush
+        if any_flush:
+            _console_writer.flush()
+
+    @staticmethod
+    def _print(text: str):
+        """交给后台输出线程批量写出"""
+        _console_writer.write(text)
 
     def _print_default(self, event: AgentEvent):
         """默认不打印任何内容"""
@@ -28,70 +175,76 @@ class ConsoleLogHandler:
 
     # Agent Lifecycle
     def _print_agent_start(self, event: AgentStartEvent):
-        safe_print(f"\n{ '='*80}")
-        safe_print(f"🤖 启动Agent: {event.agent_name}")
-        safe_print(f"📝 任务: {event.task_input[:100]}...")
-        safe_print(f"{ '='*80}\n")
+        self._print(_BANNER_TOP)
+        self._print(f"🤖 启动Agent: {event.agent_name}")
+        self._print(f"📝 任务: {_head(event.task_input)}...")
+        self._print(_BANNER_BOTTOM)
     
     def _print_agent_end(self, event: AgentEndEvent):
         if event.status == "success":
             final_result = event.result.get('result', {})
-            safe_print(f"\n{ '='*80}")
-            safe_print(f"✅ Agent完成: {event.result.get('tool_name', 'unknown')}")
-            safe_print(f"📊 状态: {final_result.get('status', 'unknown')}")
-            safe_print(f"{ '='*80}\n")
+            self._print(_BANNER_TOP)
+            self._print(f"✅ Agent完成: {event.result.get('tool_name', 'unknown')}")
+            self._print(f"📊 状态: {final_result.get('status', 'unknown')}")
+            self._print(_BANNER_BOTTOM)
             
     # Prepare Phase
     def _print_prepare_model_select(self, event: ModelSelectionEvent):
         if event.is_fallback:
-            safe_print(f"⚠️请求的模型 '{event.requested_model}' 不在可用列表中")
-            safe_print(f"✅使用回退模型: {event.final_model}")
+            self._print(f"⚠️请求的模型 '{event.requested_model}' 不在可用列表中")
+            self._print(f"✅使用回退模型: {event.final_model}")
         else:
-            safe_print(f"✅使用请求的模型: {event.final_model}")
+            self._print(f"✅使用请求的模型: {event.final_model}")
 
     def _print_prepare_history_load(self, event: HistoryLoadEvent):
-        safe_print(f"📂 已加载对话历史，从第 {event.start_turn + 1} 轮继续")
-        safe_print(f"   渲染历史: {event.action_history_len}条, 完整轨迹: {event.action_history_fact_len}条")
+        self._print(f"📂 已加载对话历史，从第 {event.start_turn + 1} 轮继续")
+        self._print(f"   渲染历史: {event.action_history_len}条, 完整轨迹: {event.action_history_fact_len}条")
         if event.pending_tool_count > 0:
-            safe_print(f"🔄 发现{event.pending_tool_count}个pending工具，恢复执行...")
+            self._print(f"🔄 发现{event.pending_tool_count}个pending工具，恢复执行...")
 
     # Run Phase
     def _print_run_llm_start(self, event: LlmCallStartEvent):
-        safe_print(f"🤖 调用LLM: {event.model}")
-        safe_print(f"   📝 System Prompt长度: {len(event.system_prompt)} 字符")
+        self._print(f"🤖 调用LLM: {event.model}")
+        self._print(f"   📝 System Prompt长度: {len(event.system_prompt)} 字符")
 
     def _print_run_llm_end(self, event: LlmCallEndEvent):
-        safe_print(f"📥 LLM输出: {event.llm_output[:100]}...")
-        safe_print(f"🔧 工具调用数量: {len(event.tool_calls)}")
+        self._print(f"📥 LLM输出: {_head(event.llm_output)}...")
+        self._print(f"🔧 工具调用数量: {len(event.tool_calls)}")
         
     def _print_run_tool_start(self, event: ToolCallStartEvent):
-        safe_print(f"\n🔧 执行工具: {event.tool_name}")
-        safe_print(f"📋 参数: {event.arguments}")
+        self._print(f"\n🔧 执行工具: {event.tool_name}")
+        self._print(f"📋 参数: {event.arguments}")
         
     def _print_run_tool_end(self, event: ToolCallEndEvent):
-        safe_print(f"✅ 结果: {event.status}")
+        self._print(f"✅ 结果: {event.status}")
     
     def _print_run_thinking_start(self, event: ThinkingStartEvent):
         if event.is_forced:
-            safe_print("❌ 5次提醒后仍未调用工具，触发thinking分析")
+            self._print("❌ 5次提醒后仍未调用工具，触发thinking分析")
         else:
             if event.is_initial:
-                safe_print(f"[{event.agent_name}] 开始行动前进行初始规划...")
+                self._print(f"[{event.agent_name}] 开始行动前进行初始规划...")
             else:
-                safe_print(f"[{event.agent_name}] Thinking分析已更新")
+                self._print(f"[{event.agent_name}] Thinking分析已更新")
 
     def _print_run_thinking_end(self, event: ThinkingEndEvent):
-        safe_print(f"[{event.agent_name}] Thinking分析已更新: {event.result}")
+        self._print(f"[{event.agent_name}] Thinking分析已更新: {event.result}")
         
     def _print_run_thinking_fail(self, event: ThinkingFailEvent):
-        safe_print(f"⚠️ Thinking触发失败: {event.error_message}")
+        self._print(f"⚠️ Thinking触发失败: {event.error_message}")
 
     # System
     def _print_system_error(self, event: ErrorEvent):
-        safe_print(event.error_display)
+        self._print(event.error_display)
+
+    # History
+    def _print_run_history_compress(self, event: CompressionEvent):
+        self._print(str(event))
+        if event.mode == "reset":
+            self._print("♻️ 历史摘要过长，已整体重建（前缀缓存将重新建立）")
 
     def _print_system_cli_display(self, event: CliDisplayEvent):
-        safe_print(event.message)
+        self._print(event.message)
 
 
 class JsonlStreamHandler:
@@ -99,31 +252,56 @@ class JsonlStreamHandler:
     JSONL流处理器.
     消费核心生命周期事件, 并将其转换为用于插件集成的JSONL格式.
     """
+    subscribed_types = (
+        ToolCallStartEvent, ToolCallEndEvent, ThinkingEndEvent, ThinkingFailEvent, CompressionEvent,
+    )
+
     def __init__(self, enabled: bool):
         self.jsonl_emitter = get_jsonl_emitter()
         self.jsonl_emitter.enabled = enabled
+        # 事件类 -> 流式输出方法，只解析一次
+        self._dispatch = {
+            event_cls: self._resolve_stream_method(event_cls.event_type)
+            for event_cls in self.subscribed_types
+        }
+
+    def _resolve_stream_method(self, event_type: str):
+        """按 event_type 查找流式输出方法（纯展示或内部系统事件不处理）"""
+        if event_type.startswith('system.'):
+            return self._stream_default
+        return getattr(self, f"_stream_{event_type.replace('.', '_')}", self._stream_default)
 
     def handle(self, event: AgentEvent):
-        if not self.jsonl_emitter.enabled or event.event_type.startswith('system.'):
-            # 不处理纯展示或内部系统事件
+        if not self.jsonl_emitter.enabled:
             return
 
-        # 直接将事件对象序列化为JSON
-        # 这比之前手动格式化字符串更健壮、更具扩展性
-        method_name = f"_stream_{event.event_type.replace('.', '_')}"
-        handler_method = getattr(self, method_name, self._stream_default)
+        handler_method = self._dispatch.get(type(event))
+        if handler_method is None:
+            handler_method = self._dispatch[type(event)] = self._resolve_stream_method(event.event_type)
         handler_method(event)
+
+    def handle_batch(self, events: List[AgentEvent]):
+        """批量处理事件（只检查一次开关）"""
+        if not self.jsonl_emitter.enabled:
+            return
+
+        dispatch = self._dispatch
+        for event in events:
+            handler_method = dispatch.get(type(event))
+            if handler_method is None:
+                handler_method = dispatch[type(event)] = self._resolve_stream_method(event.event_type)
+            handler_method(event)
     
     def _stream_default(self, event: AgentEvent):
         """默认不处理任何事件"""
         pass
 
     def _stream_run_tool_start(self, event: ToolCallStartEvent):
-        params_str = json.dumps(event.arguments, ensure_ascii=False, indent=2)
+        params_str = json_fast.dumps(event.arguments, indent=True)
         self.jsonl_emitter.token(f"调用工具: {event.tool_name}\n参数: {params_str}")
 
     def _stream_run_tool_end(self, event: ToolCallEndEvent):
-        output_preview = str(event.result.get('output', ''))[:100]
+        output_preview = _head(event.result.get('output', ''))
         self.jsonl_emitter.token(f"工具 {event.tool_name} 完成: {event.status} - {output_preview}...")
 
     def _stream_run_thinking_end(self, event: ThinkingEndEvent):
@@ -135,5 +313,8 @@ class JsonlStreamHandler:
     def _stream_run_thinking_fail(self, event: ThinkingFailEvent):
         self.jsonl_emitter.warn(event.error_message)
 
+    def _stream_run_history_compress(self, event: CompressionEvent):
+        self.jsonl_emitter.notice(str(event))
+
     def _stream_system_error(self, event: ErrorEvent):
         self.jsonl_emitter.error(event.error_display)
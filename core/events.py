@@ -6,8 +6,12 @@
 
 from dataclasses import dataclass, field
 from typing import Dict, Any, List, Literal, ClassVar
+import sys
 import time
 
+# Python 3.10+ 使用 slots 数据类：去掉实例 __dict__，降低事件构造与内存开销
+_EVENT_DATACLASS_OPTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
 # =================================================================================
 # 规范：
 # event_type 格式: "phase.domain.action"
@@ -16,13 +20,13 @@ import time
 # - action: start, end, fail, select, load, etc.
 # =================================================================================
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class AgentEvent:
-    """所有事件的基类"""
-    event_type: str
+    """所有事件的基类（event_type 由各子类以类属性给出，不占实例存储）"""
+    event_type: ClassVar[str] = ""
 
 # region 1. Prepare Phase Events
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ModelSelectionEvent(AgentEvent):
     """模型选择事件"""
     event_type: ClassVar[str] = "prepare.model.select" # Class variable
@@ -33,7 +37,7 @@ class ModelSelectionEvent(AgentEvent):
     # Default arguments last
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class HistoryLoadEvent(AgentEvent):
     """加载历史记录事件"""
     event_type: ClassVar[str] = "prepare.history.load"
@@ -49,7 +53,7 @@ class HistoryLoadEvent(AgentEvent):
 # region 2. Run Phase Events
 
 # Thinking Events
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ThinkingStartEvent(AgentEvent):
     """Thinking过程开始事件"""
     event_type: ClassVar[str] = "run.thinking.start"
@@ -60,7 +64,7 @@ class ThinkingStartEvent(AgentEvent):
     timestamp: float = field(default_factory=time.time)
 
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ThinkingEndEvent(AgentEvent):
     """Thinking过程成功结束事件"""
     event_type: ClassVar[str] = "run.thinking.end"
@@ -72,7 +76,7 @@ class ThinkingEndEvent(AgentEvent):
     is_forced: bool = False 
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ThinkingFailEvent(AgentEvent):
     """Thinking过程失败事件"""
     event_type: ClassVar[str] = "run.thinking.fail"
@@ -83,7 +87,7 @@ class ThinkingFailEvent(AgentEvent):
     timestamp: float = field(default_factory=time.time)
 
 # LLM Call Events
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class LlmCallStartEvent(AgentEvent):
     """LLM调用开始"""
     event_type: ClassVar[str] = "run.llm.start"
@@ -93,7 +97,7 @@ class LlmCallStartEvent(AgentEvent):
     # Default arguments last
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class LlmCallEndEvent(AgentEvent):
     """LLM调用结束"""
     event_type: ClassVar[str] = "run.llm.end"
@@ -104,7 +108,7 @@ class LlmCallEndEvent(AgentEvent):
     timestamp: float = field(default_factory=time.time)
 
 # Tool Call Events
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ToolCallStartEvent(AgentEvent):
     """工具调用开始"""
     event_type: ClassVar[str] = "run.tool.start"
@@ -114,7 +118,7 @@ class ToolCallStartEvent(AgentEvent):
     # Default arguments last
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ToolCallEndEvent(AgentEvent):
     """工具调用结束"""
     event_type: ClassVar[str] = "run.tool.end"
@@ -124,12 +128,41 @@ class ToolCallEndEvent(AgentEvent):
     result: Dict[str, Any]
     # Default arguments last
     timestamp: float = field(default_factory=time.time)
+
+# History Events
+@dataclass(**_EVENT_DATACLASS_OPTS)
+class CompressionEvent(AgentEvent):
+    """历史动作压缩完成（结构化指标，展示文本在输出时才生成）"""
+    event_type: ClassVar[str] = "run.history.compress"
+    
+    mode: str  # 压缩方式: edit / full / append / reset
+    before_count: int
+    after_count: int
+    before_tokens: int
+    after_tokens: int
+    duration_ms: float
+    # Default arguments last
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def reduction(self) -> float:
+        """token 缩减比例（0~1）"""
+        return 1 - self.after_tokens / self.before_tokens if self.before_tokens else 0.0
+
+    def __str__(self) -> str:
+        if self.mode == "edit":
+            head = "✅ 历史动作已压缩: 移除较早的工具结果（%d条）" % self.before_count
+        else:
+            head = "✅ 历史动作已压缩: %d条 → %d条" % (self.before_count, self.after_count)
+        return "%s, %d → %d tokens (-%.0f%%), 耗时 %.0fms" % (
+            head, self.before_tokens, self.after_tokens, self.reduction * 100, self.duration_ms
+        )
 # endregion
 
 # region 3. General Events (Can occur in any phase)
 
 # Agent Lifecycle
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class AgentStartEvent(AgentEvent):
     """Agent任务开始"""
     event_type: ClassVar[str] = "agent.start"
@@ -139,7 +172,7 @@ class AgentStartEvent(AgentEvent):
     # Default arguments last
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class AgentEndEvent(AgentEvent):
     """Agent任务结束（无论成功、失败或超时）"""
     event_type: ClassVar[str] = "agent.end"
@@ -150,7 +183,7 @@ class AgentEndEvent(AgentEvent):
     timestamp: float = field(default_factory=time.time)
 
 # System & Display Events
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class ErrorEvent(AgentEvent):
     """发生导致执行中断的严重错误"""
     event_type: ClassVar[str] = "system.error"
@@ -159,7 +192,7 @@ class ErrorEvent(AgentEvent):
     # Default arguments last
     timestamp: float = field(default_factory=time.time)
 
-@dataclass
+@dataclass(**_EVENT_DATACLASS_OPTS)
 class CliDisplayEvent(AgentEvent):
     """向CLI输出一条格式化消息"""
     event_type: ClassVar[str] = "system.cli_display"
@@ -26,6 +26,7 @@ class HierarchyManager:
         """
         self.task_id = task_id
         self.lock = threading.Lock()
+        self._version = 0  # 本进程内共享上下文的写入次数（供上下文构造器判断缓存是否失效）
         
         # 文件路径 - 使用用户主目录（跨平台）
         conversations_dir = Path.home() / "mla_v3" / "conversations"
@@ -119,6 +120,23 @@ class HierarchyManager:
                 json.dump(context, f, indent=2, ensure_ascii=False)
         except Exception as e:
             safe_print(f"⚠️ 保存共享上下文失败: {e}")
+        finally:
+            self._version += 1
+    
+    def get_version(self) -> tuple:
+        """
+        获取共享上下文的版本标识
+        
+        由本进程写入计数和文件修改时间组成，其他进程写入共享上下文时同样会改变
+        
+        Returns:
+            (写入计数, 文件修改时间ns)
+        """
+        try:
+            mtime_ns = os.stat(self.context_file).st_mtime_ns
+        except OSError:
+            mtime_ns = 0
+        return (self._version, mtime_ns)
     
     def start_new_instruction(self, instruction: str) -> str:
         """
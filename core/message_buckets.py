@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+messages 重建的动作分类与 _turn 分组
+从 AgentExecutor._build_messages_from_action_history 中拆出，便于单独编译为扩展模块
+"""
+
+from typing import Callable, Dict, List
+
+HISTORICAL_SUMMARY = "_historical_summary"
+NO_TOOL_CALL = "_no_tool_call"
+
+
+class TurnBucket:
+    """messages 重建时同一 _turn 的分组数据"""
+    __slots__ = ("turn", "assistant_content", "reasoning_content",
+                 "tool_calls", "tool_results", "images", "messages")
+
+    def __init__(self, turn: int, assistant_content: str, reasoning_content: str):
+        self.turn = turn
+        self.assistant_content = assistant_content
+        self.reasoning_content = reasoning_content
+        self.tool_calls = []
+        self.tool_results = []
+        self.images = []
+        self.messages = None  # 已生成的消息（分组变化时置空）
+
+
+def _bucket_summary(action: Dict, tool_name: str, special: List[Dict],
+                    buckets: List[TurnBucket], dumps: Callable[[object], str]) -> None:
+    """历史摘要（压缩产物）→ user 消息"""
+    special.append({
+        "role": "user",
+        "content": f"[Previous actions summary]\n{action['result']['output']}"
+    })
+
+
+def _bucket_no_tool_call(action: Dict, tool_name: str, special: List[Dict],
+                         buckets: List[TurnBucket], dumps: Callable[[object], str]) -> None:
+    """LLM 未调用工具 → assistant 消息（纯文本）+ user 消息（提醒）"""
+    assistant_content = action.get("assistant_content", "")
+    if assistant_content:
+        special.append({"role": "assistant", "content": assistant_content})
+    special.append({
+        "role": "user",
+        "content": action["result"].get("output", "请调用工具")
+    })
+
+
+def _bucket_tool_action(action: Dict, tool_name: str, special: List[Dict],
+                        buckets: List[TurnBucket], dumps: Callable[[object], str]) -> None:
+    """普通 action → 按 _turn 分组（同一轮的 action 在历史中相邻，只需比较最后一组）"""
+    turn = action.get("_turn", 0)  # 向后兼容：旧记录默认 turn=0
+
+    if buckets and buckets[-1].turn == turn:
+        bucket = buckets[-1]
+        bucket.messages = None  # 分组有变化，需要重新生成该轮消息
+    else:
+        bucket = TurnBucket(
+            turn,
+            action.get("assistant_content", ""),
+            action.get("reasoning_content", "")
+        )
+        buckets.append(bucket)
+
+    # 构建 tool_call 条目
+    tool_call_id = action.get("tool_call_id")
+    if tool_call_id is None:
+        # 旧记录没有 tool_call_id，按位置生成
+        tool_call_id = f"call_{turn}_{len(bucket.tool_calls)}"
+    bucket.tool_calls.append({
+        "id": tool_call_id,
+        "type": "function",
+        "function": {
+            "name": tool_name,
+            "arguments": dumps(action["arguments"])
+        }
+    })
+
+    # 构建 tool result 消息
+    # 只有同时有 _has_image 标记和实际 base64 数据时才嵌入图片
+    img_data = action.get("_image_base64") if action.get("_has_image", False) else None
+
+    if img_data:
+        # 有图片且有 base64 数据 → tool result 简短说明，图片在后续 user 消息中嵌入
+        result_content = "Image loaded successfully. See below."
+    else:
+        # 无图片 或 有图片标记但 base64 丢失（Ctrl+C 恢复场景）→ 正常 JSON 结果
+        # 排除 _image_base64 等内部字段
+        result_clean = {k: v for k, v in action.get("result", {}).items()
+                        if not k.startswith("_")}
+        result_content = dumps(result_clean)
+
+    bucket.tool_results.append({
+        "role": "tool",
+        "tool_call_id": tool_call_id,
+        "content": result_content
+    })
+
+    # 收集图片数据（方案二：后续 user 消息嵌入）
+    if img_data:
+        query = action.get("arguments", {}).get("query", "请分析这些图片")
+        bucket.images.append({
+            # 兼容列表和单值
+            "base64_list": img_data if isinstance(img_data, list) else [img_data],
+            "query": query
+        })
+
+
+# 特殊 tool_name 的处理函数表，其余 action 走 _bucket_tool_action
+_SPECIAL_ACTION_HANDLERS = {
+    HISTORICAL_SUMMARY: _bucket_summary,
+    NO_TOOL_CALL: _bucket_no_tool_call,
+}
+
+
+def classify_and_bucket(actions: List[Dict], special: List[Dict], buckets: List[TurnBucket],
+                        dumps: Callable[[object], str]) -> None:
+    """
+    对新追加的 action 分类并写入分组（原地追加到 special / buckets）
+
+    Args:
+        actions: 待处理的 action 列表（_turn 单调不减，同一轮的 action 相邻）
+        special: 历史摘要 / 未调用工具产生的消息（按出现顺序）
+        buckets: 按出现顺序的 _turn 分组
+        dumps: JSON 序列化函数
+    """
+    get_handler = _SPECIAL_ACTION_HANDLERS.get
+    for action in actions:
+        tool_name = action.get("tool_name", "")
+        get_handler(tool_name, _bucket_tool_action)(action, tool_name, special, buckets, dumps)
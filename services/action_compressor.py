@@ -3,11 +3,19 @@ from utils.windows_compat import safe_print
 # -*- coding: utf-8 -*-
 """
 历史动作压缩服务
-策略：总结历史XML + 保留最新action + 压缩最新action的大字段
+策略：先移除较早动作的工具结果（不调用LLM）；仍超出目标时总结历史XML + 保留最新action + 压缩最新action的大字段
 """
 
-import json
-from typing import List, Dict
+import os
+import re
+import bisect
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Tuple
+
+from utils import json_fast
 
 try:
     import tiktoken
@@ -16,12 +24,56 @@ except ImportError:
     HAS_TIKTOKEN = False
 
 
+def _stringify(value) -> str:
+    """
+    参数值转文本：字符串原样返回，数值/布尔用 repr，dict/list 等序列化为紧凑 JSON
+    （Python 的 str(dict) 格式既慢又不是合法 JSON，token 数也更多）
+    """
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, bool)):
+        return repr(value)
+    try:
+        return json_fast.dumps(value)
+    except (TypeError, ValueError):
+        return str(value)  # 无法序列化的对象退回 str
+
+
+# 分段压缩时各段互相独立，并发调用压缩模型（共享线程池）
+_CHUNK_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="compress-chunk")
+
+# 压缩模型调用结果缓存（纯文本请求，按提示词哈希精确匹配；各 Agent 的压缩器共享，LRU）
+_COMPRESS_RESULT_CACHE: "OrderedDict[bytes, object]" = OrderedDict()
+_COMPRESS_RESULT_CACHE_SIZE = 256
+_COMPRESS_RESULT_LOCK = threading.Lock()
+
+# 无 tiktoken 时的估算：中文字符按正则在 C 层统计，避免逐字符的 Python 循环
+_CJK_RE = re.compile('[\u4e00-\u9fff]')
+
+# 从拼接的 XML 文本中取出单条 action 块（仅在未提供逐条 XML 时使用）
+_ACTION_BLOCK_RE = re.compile(r'<action>.*?</action>', re.DOTALL)
+
+
 class ActionCompressor:
     """历史动作压缩器"""
     
     # action_history 中的内部元数据字段（不参与 XML 转换和 token 统计）
     _INTERNAL_FIELDS = {"_turn", "tool_call_id", "assistant_content", "reasoning_content", "_has_image", "_image_base64"}
     
+    # 追加式摘要的长度上限，超过后整体重建摘要
+    MAX_APPEND_SUMMARY_TOKENS = 15000
+    
+    # 结果精简：保留完整结果的最近工具调用数，以及精简后需要达到的窗口占比（否则改用LLM总结）
+    KEEP_TOOL_USES = 3
+    COMPRESSION_TARGET_RATIO = 0.375
+    
+    # 首尾保留法编码窗口：按每个 token 至多覆盖的字符数估算（远大于实际平均值）
+    _FALLBACK_CHARS_PER_TOKEN = 16
+    
+    # token 计数缓存条数（LRU）与单条 action XML 缓存条数（超出后清空）
+    TOKEN_CACHE_SIZE = 512
+    ACTION_XML_CACHE_SIZE = 4096
+    
     def __init__(self, llm_client):
         """
         初始化
@@ -31,6 +83,16 @@ class ActionCompressor:
         """
         self.llm_client = llm_client
         self.compressor_multimodal = getattr(llm_client, 'compressor_multimodal', False)
+        self.debug_traceback = getattr(llm_client, 'debug_traceback', False)
+        self.last_compress_mode = None  # 最近一次压缩方式: edit / full / append / reset
+        
+        # 同一文本在门限判断、压缩前后校验中会被重复统计，按文本哈希缓存结果
+        # （主循环与后台压缩线程共用，LRU 操作加锁）
+        self._token_cache: "OrderedDict[int, int]" = OrderedDict()
+        self._token_cache_lock = threading.Lock()
+        # 单条 action 的 XML 文本与 token 数缓存: id(action) -> [action, xml, token 数]
+        # （action 记录写入后不再修改；token 数首次统计时填入，不受文本 LRU 容量限制）
+        self._action_xml_cache: Dict[int, list] = {}
         
         # 初始化tiktoken
         if HAS_TIKTOKEN:
@@ -39,13 +101,33 @@ class ActionCompressor:
             self.encoding = None
     
     def count_tokens(self, text: str) -> int:
-        """统计token数"""
+        """统计token数（结果按文本哈希缓存）"""
+        key = hash(text)
+        with self._token_cache_lock:
+            cached = self._token_cache.get(key)
+            if cached is not None:
+                self._token_cache.move_to_end(key)
+                return cached
+        
         if self.encoding:
-            return len(self.encoding.encode(text))
+            count = len(self.encoding.encode(text))
         else:
-            chinese_chars = sum(1 for c in text if '\u4e00' <= c <= '\u9fff')
+            chinese_chars = len(_CJK_RE.findall(text))
             other_chars = len(text) - chinese_chars
-            return int(chinese_chars / 1.5 + other_chars / 4)
+            count = int(chinese_chars / 1.5 + other_chars / 4)
+        
+        with self._token_cache_lock:
+            self._token_cache[key] = count
+            if len(self._token_cache) > self.TOKEN_CACHE_SIZE:
+                self._token_cache.popitem(last=False)
+        return count
+    
+    def count_action_tokens(self, action: Dict) -> int:
+        """统计单条action转换为XML后的token数（按 action 对象缓存）"""
+        entry = self._action_cache_entry(action)
+        if entry[2] is None:
+            entry[2] = self.count_tokens(entry[1])
+        return entry[2]
     
     def compress_if_needed(
         self,
@@ -53,7 +135,8 @@ class ActionCompressor:
         max_context_window: int,
         thinking: str = "",
         task_input: str = "",
-        save_callback=None  # 添加保存回调，确保压缩后立即保存
+        save_callback=None,  # 添加保存回调，确保压缩后立即保存
+        force: bool = False
     ) -> List[Dict]:
         """
         检查并压缩历史动作
@@ -68,6 +151,7 @@ class ActionCompressor:
             max_context_window: 最大窗口大小
             thinking: 当前的 thinking 内容（包含 todolist 和计划）
             task_input: 任务需求描述
+            force: 未超限时也执行压缩（后台提前压缩时使用）
             
         Returns:
             压缩后的action_history
@@ -85,27 +169,66 @@ class ActionCompressor:
         historical_actions = action_history[:-1]
         
         # 计算整体token数
-        total_text = self._actions_to_xml(action_history)
-        total_tokens = self.count_tokens(total_text+thinking+task_input)
+        total_tokens = self._count_history_tokens(action_history, thinking, task_input)
         
         # 如果不超限，不压缩
         if total_tokens <= max_context_window - 20000:
-            return action_history
+            if not force:
+                return action_history
+            safe_print(f"🔄 历史动作接近上限，提前压缩: {total_tokens} tokens")
+        else:
+            safe_print(f"🔄 历史动作需要压缩: {total_tokens} tokens > {max_context_window - 20000}")
         
-        safe_print(f"🔄 历史动作需要压缩: {total_tokens} tokens > {max_context_window - 20000}")
+        # 第一阶段：移除较早动作的工具结果，达到目标占比则不再调用LLM
+        compacted = self.edit_compact(action_history)
+        if compacted is not action_history:
+            compacted_tokens = self._count_history_tokens(compacted, thinking, task_input)
+            if compacted_tokens <= max_context_window * self.COMPRESSION_TARGET_RATIO:
+                safe_print(f"✂️ 已移除较早的工具结果: {total_tokens} → {compacted_tokens} tokens")
+                self.last_compress_mode = "edit"
+                self._prune_action_xml_cache(compacted)
+                return compacted
         
-        # 压缩策略：
+        # 第二阶段压缩策略：
         # 1. 历史 → 基于 thinking 和 task_input 智能总结为5k tokens
         # 2. 最新 → 压缩为max_window的50%
         
-        summary_action = self._summarize_historical_xml(
-            self._actions_to_xml(historical_actions),
-            target_tokens=5000,  # 历史总结固定5k tokens
-            thinking=thinking,
-            task_input=task_input,
-            max_context_window=max_context_window,
-            actions=historical_actions  # 传递原始 actions（用于提取图片）
-        )
+        # 已有历史摘要时只追加新动作的摘要（保持摘要前缀不变，利于服务商前缀缓存）；
+        # 摘要过长时才整体重建
+        old_summary = historical_actions[0] if historical_actions[0].get("tool_name") == "_historical_summary" else None
+        old_output = old_summary["result"].get("output", "") if old_summary else ""
+        if old_summary and self.count_tokens(old_output) <= self.MAX_APPEND_SUMMARY_TOKENS:
+            self.last_compress_mode = "append"
+            version = old_summary["result"].get("_summary_version", 1) + 1
+            summary_action = {
+                "tool_name": "_historical_summary",
+                "arguments": {},
+                "result": {
+                    "status": "success",
+                    "output": self.compress_append_only(
+                        old_output,
+                        historical_actions[1:],
+                        thinking=thinking,
+                        task_input=task_input,
+                        max_context_window=max_context_window,
+                        version=version
+                    ),
+                    "_is_summary": True,
+                    "_summary_version": version
+                }
+            }
+        else:
+            self.last_compress_mode = "reset" if old_summary else "full"
+            summary_action = self._summarize_historical_xml(
+                self._actions_to_xml(historical_actions),
+                target_tokens=5000,  # 历史总结固定5k tokens
+                thinking=thinking,
+                task_input=task_input,
+                max_context_window=max_context_window,
+                actions=historical_actions  # 传递原始 actions（用于提取图片）
+            )
+            summary_action["result"]["output"] = f"[summary v1]\n{summary_action['result']['output']}"
+            summary_action["result"]["_summary_version"] = 1
         
         # 压缩最新action的大字段（50% of max_window）
         compressed_recent = self._compress_action_fields(
@@ -119,37 +242,166 @@ class ActionCompressor:
         result = [summary_action, compressed_recent]
         
         # 验证压缩效果
-        result_xml = self._actions_to_xml(result)
-        result_tokens = self.count_tokens(result_xml)
+        result_tokens = self._count_history_tokens(result)
         safe_print(f"✅ 压缩完成: {total_tokens} tokens → {result_tokens} tokens (压缩比: {result_tokens/total_tokens*100:.1f}%)")
         
+        self._prune_action_xml_cache(result)
         return result
     
-    def _actions_to_xml(self, actions: List[Dict]) -> str:
-        """将actions转换为XML格式文本（跳过内部元数据字段）"""
-        xml_parts = []
-        for action in actions:
-            tool_name = action.get("tool_name", "")
-            arguments = action.get("arguments", {})
-            result = action.get("result", {})
-            
-            action_xml = f"<action>\n  <tool_name>{tool_name}</tool_name>\n"
-            
-            # 参数（跳过内部字段）
-            for k, v in arguments.items():
-                if k in self._INTERNAL_FIELDS:
-                    continue
-                v_str = str(v).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
-                action_xml += f"  <tool_use:{k}>{v_str}</tool_use:{k}>\n"
+    def edit_compact(
+        self,
+        action_history: List[Dict],
+        keep_tool_uses: int = KEEP_TOOL_USES,
+        drop_reasoning: bool = True
+    ) -> List[Dict]:
+        """
+        结果精简：较早的工具调用只保留 tool_name 和 arguments，result 替换为状态标记（不调用LLM）
+        
+        最近 keep_tool_uses 次工具调用、历史摘要和未调用工具的提醒原样保留；
+        被精简的动作同时去掉图片数据，drop_reasoning 时去掉 reasoning_content。
+        
+        Args:
+            action_history: 动作历史
+            keep_tool_uses: 保留完整结果的最近工具调用数
+            drop_reasoning: 是否去掉被精简动作的 reasoning_content
             
-            # 结果（排除以 _ 开头的内部字段，特别是 _image_base64）
-            result_clean = {k: v for k, v in result.items() if not k.startswith("_")}
-            result_json = json.dumps(result_clean, ensure_ascii=False, indent=2)
-            action_xml += f"  <result>\n{result_json}\n  </result>\n</action>"
+        Returns:
+            精简后的 action_history（新列表，条数不变；没有可精简的动作时返回原列表）
+        """
+        compacted = list(action_history)
+        changed = False
+        kept = 0
+        for i in range(len(compacted) - 1, -1, -1):
+            action = compacted[i]
+            if action.get("tool_name", "").startswith("_"):
+                continue
+            if kept < keep_tool_uses:
+                kept += 1
+                continue
+            result = action.get("result")
+            if not isinstance(result, dict):
+                result = {}
+            if result.get("elided"):
+                continue
+            elided = dict(action)
+            elided["result"] = {"status": result.get("status"), "elided": True}
+            elided.pop("_image_base64", None)
+            elided.pop("_has_image", None)
+            if drop_reasoning:
+                elided.pop("reasoning_content", None)
+            compacted[i] = elided
+            changed = True
+        return compacted if changed else action_history
+    
+    def compress_append_only(
+        self,
+        old_summary: str,
+        new_actions: List[Dict],
+        thinking: str = "",
+        task_input: str = "",
+        max_context_window: int = None,
+        version: int = 2
+    ) -> str:
+        """
+        只总结新增的动作，并追加到已有摘要末尾（已有摘要文本保持不变）
+        
+        Args:
+            old_summary: 已有的历史摘要文本
+            new_actions: 上次压缩之后新增的动作
+            thinking: 当前的 thinking 内容
+            task_input: 任务需求描述
+            max_context_window: 最大上下文窗口
+            version: 本次追加的摘要版本号
             
-            xml_parts.append(action_xml)
+        Returns:
+            old_summary + 新增摘要
+        """
+        if not new_actions:
+            return old_summary
+        delta_action = self._summarize_historical_xml(
+            self._actions_to_xml(new_actions),
+            target_tokens=2000,  # 增量摘要只覆盖新增动作
+            thinking=thinking,
+            task_input=task_input,
+            max_context_window=max_context_window,
+            actions=new_actions
+        )
+        return f"{old_summary}\n\n[summary v{version}]\n{delta_action['result']['output']}"
+    
+    def _actions_to_xml(self, actions: List[Dict]) -> str:
+        """将actions转换为XML格式文本（跳过内部元数据字段）"""
+        cache = self._action_xml_cache
+        if len(cache) > self.ACTION_XML_CACHE_SIZE:
+            self._action_xml_cache = {}
+        return "\n\n".join([self._action_to_xml(action) for action in actions])
+    
+    def _prune_action_xml_cache(self, kept_actions: List[Dict]):
+        """
+        压缩替换历史后丢弃已被替换动作的 XML 缓存，只保留仍在历史中的条目
+        （整体替换字典，与并发读取的主循环互不影响；压缩期间新追加的动作之后按需重建）
+        """
+        cache = self._action_xml_cache
+        kept = {}
+        for action in kept_actions:
+            entry = cache.get(id(action))
+            if entry is not None and entry[0] is action:
+                kept[id(action)] = entry
+        self._action_xml_cache = kept
+    
+    def _actions_xml_with_tokens(self, actions: List[Dict]) -> Tuple[List[str], List[int]]:
+        """
+        逐条返回 action 的 XML 文本与 token 数（一次遍历，均复用逐条缓存），
+        供总结时估算数据量和分段使用，不再对拼接后的整段 XML 重新编码
+        """
+        entries = [self._action_cache_entry(action) for action in actions]
+        count_tokens = self.count_tokens
+        for entry in entries:
+            if entry[2] is None:
+                entry[2] = count_tokens(entry[1])
+        return [entry[1] for entry in entries], [entry[2] for entry in entries]
+    
+    def _action_to_xml(self, action: Dict) -> str:
+        """单条action转换为XML格式文本（按 action 对象缓存）"""
+        return self._action_cache_entry(action)[1]
+    
+    def _action_cache_entry(self, action: Dict) -> list:
+        """返回 action 的缓存条目 [action, xml, token 数]，未缓存时生成 XML"""
+        cached = self._action_xml_cache.get(id(action))
+        if cached is not None and cached[0] is action:
+            return cached
+        
+        tool_name = action.get("tool_name", "")
+        arguments = action.get("arguments", {})
+        result = action.get("result", {})
+        
+        parts = [f"<action>\n  <tool_name>{tool_name}</tool_name>\n"]
+        
+        # 参数（跳过内部字段）
+        for k, v in arguments.items():
+            if k in self._INTERNAL_FIELDS:
+                continue
+            v_str = _stringify(v).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+            parts.append(f"  <tool_use:{k}>{v_str}</tool_use:{k}>\n")
         
-        return "\n\n".join(xml_parts)
+        # 结果（排除以 _ 开头的内部字段，特别是 _image_base64）
+        result_clean = {k: v for k, v in result.items() if not k.startswith("_")}
+        result_json = json_fast.dumps(result_clean)
+        parts.append(f"  <result>\n{result_json}\n  </result>\n</action>")
+        
+        entry = [action, "".join(parts), None]
+        self._action_xml_cache[id(action)] = entry
+        return entry
+    
+    def _count_history_tokens(self, actions: List[Dict], thinking: str = "", task_input: str = "") -> int:
+        """
+        统计历史动作 + thinking + 任务输入的 token 数
+        
+        逐条累加（每条的 XML 与 token 数都按 action 缓存，新增动作只需统计新的部分），
+        每条额外计 1 个 token 近似分隔符
+        """
+        count_action_tokens = self.count_action_tokens
+        return (sum(count_action_tokens(action) for action in actions) + len(actions)
+                + self.count_tokens(thinking + task_input))
     
     def _extract_images_from_actions(self, actions: List[Dict]) -> List[Dict]:
         """
@@ -173,6 +425,54 @@ class ActionCompressor:
                     images.append({"base64": img_data, "tool_name": tool_name})
         return images
     
+    def _compressor_chat(self, prompt: str, system_prompt: str, history: List = None):
+        """
+        调用压缩模型（不使用工具）
+        
+        纯文本请求（未传 history）按 (模型, 系统提示词, 提示词) 的哈希缓存成功结果，
+        同一内容在相同任务上下文下再次压缩时直接复用；带图片的请求不缓存
+        """
+        model = self.llm_client.compressor_models[0]
+        key = None
+        if history is None:
+            history = [{"role": "user", "content": prompt}]
+            key = hashlib.blake2b(
+                "\0".join((model, system_prompt, prompt)).encode("utf-8"), digest_size=16
+            ).digest()
+            with _COMPRESS_RESULT_LOCK:
+                cached = _COMPRESS_RESULT_CACHE.get(key)
+                if cached is not None:
+                    _COMPRESS_RESULT_CACHE.move_to_end(key)
+                    safe_print("      ♻️ 命中压缩结果缓存")
+                    return cached
+        
+        response = self.llm_client.chat(
+            history=history,
+            model=model,
+            system_prompt=system_prompt,
+            tool_list=[],  # 空列表表示不使用工具
+            tool_choice="none"  # 明确表示不调用工具（压缩任务）
+        )
+        
+        if key is not None and response.status == "success":
+            with _COMPRESS_RESULT_LOCK:
+                _COMPRESS_RESULT_CACHE[key] = response
+                if len(_COMPRESS_RESULT_CACHE) > _COMPRESS_RESULT_CACHE_SIZE:
+                    _COMPRESS_RESULT_CACHE.popitem(last=False)
+        return response
+    
+    @staticmethod
+    def _build_context_info(thinking: str, task_input: str, field_context: str = "") -> str:
+        """构建压缩提示词中的上下文信息（任务需求、当前进度、字段来源）"""
+        parts = []
+        if task_input:
+            parts.append(f"\n<任务需求>\n{task_input}\n</任务需求>\n")
+        if thinking:
+            parts.append(f"\n<当前进度与计划>\n{thinking}\n</当前进度与计划>\n")
+        if field_context:
+            parts.append(f"\n<字段来源>\n这是最新动作中 {field_context} 的内容\n</字段来源>\n")
+        return "".join(parts)
+    
     def _summarize_historical_xml(
         self, 
         xml_text: str, 
@@ -206,17 +506,19 @@ class ActionCompressor:
             images = self._extract_images_from_actions(actions) if self.compressor_multimodal and actions else []
             
             # 检查数据量，决定是否需要分段压缩
-            xml_tokens = self.count_tokens(xml_text)
+            # 有原始 actions 时直接累加逐条缓存的 token 数（每条另计 1 个近似分隔符），并按条分段
+            blocks = block_tokens = None
+            if actions is not None:
+                blocks, block_tokens = self._actions_xml_with_tokens(actions)
+                xml_tokens = sum(block_tokens) + len(block_tokens)
+            else:
+                xml_tokens = self.count_tokens(xml_text)
             
             # 获取压缩模型的上下文限制（从参数或LLM客户端获取）
             compressor_context_limit = max_context_window or self.llm_client.max_context_window
             
-            # 构建上下文信息
-            context_info = ""
-            if task_input:
-                context_info += f"\n<任务需求>\n{task_input}\n</任务需求>\n"
-            if thinking:
-                context_info += f"\n<当前进度与计划>\n{thinking}\n</当前进度与计划>\n"
+            # 构建上下文信息（分段压缩时传给各段复用）
+            context_info = self._build_context_info(thinking, task_input)
             
             context_tokens = self.count_tokens(context_info)
             
@@ -226,15 +528,20 @@ class ActionCompressor:
             
             if xml_tokens > available_tokens:
                 safe_print(f"   📦 数据量过大({xml_tokens} tokens)，启用分段压缩")
-                return self._chunked_summarize(xml_text, target_tokens, thinking, task_input, available_tokens)
+                return self._chunked_summarize(
+                    xml_text, target_tokens, thinking, task_input, available_tokens,
+                    blocks=blocks, block_tokens=block_tokens, context_info=context_info
+                )
             
             # 数据量合适，直接压缩
             return self._single_summarize(xml_text, target_tokens, thinking, task_input, context_info, images=images)
         
         except Exception as e:
-            safe_print(f"⚠️ 总结失败: {e}")
-            import traceback
-            traceback.print_exc()
+            safe_print(f"⚠️ 总结失败: {type(e).__name__}: {e}")
+            if self.debug_traceback:
+                # 完整堆栈格式化与输出开销较大，仅调试时打印
+                import traceback
+                traceback.print_exc()
             return {
                 "tool_name": "_historical_summary",
                 "arguments": {},
@@ -301,14 +608,12 @@ class ActionCompressor:
                 })
             history = [{"role": "user", "content": content_parts}]
         else:
-            history = [{"role": "user", "content": prompt}]
+            history = None  # 纯文本请求，可复用缓存结果
         
-        response = self.llm_client.chat(
-            history=history,
-            model=self.llm_client.compressor_models[0],
-            system_prompt=f"你是整体上下文构造专家。目标：将内容压缩到{target_tokens} tokens以内。",
-            tool_list=[],
-            tool_choice="none"
+        response = self._compressor_chat(
+            prompt,
+            f"你是整体上下文构造专家。目标：将内容压缩到{target_tokens} tokens以内。",
+            history=history
         )
         
         summary = response.output if response.status == "success" else "[总结失败]"
@@ -329,7 +634,10 @@ class ActionCompressor:
         target_tokens: int,
         thinking: str,
         task_input: str,
-        chunk_size_tokens: int
+        chunk_size_tokens: int,
+        blocks: List[str] = None,
+        block_tokens: List[int] = None,
+        context_info: str = None
     ) -> Dict:
         """
         分段压缩（数据量过大时使用）
@@ -340,52 +648,53 @@ class ActionCompressor:
             thinking: thinking内容
             task_input: 任务输入
             chunk_size_tokens: 每段的最大token数
+            blocks: 逐条 action 的 XML（可选，已有时不再分割 xml_text）
+            block_tokens: blocks 对应的 token 数
+            context_info: 已构建的上下文信息（可选）
         
         Returns:
             压缩后的summary action
         """
-        from services.llm_client import ChatMessage
+        if blocks is not None:
+            action_blocks = blocks
+        else:
+            # 按action分割xml_text（单次扫描取出各 <action> 块，不生成中间列表）
+            action_blocks = [match.group() for match in _ACTION_BLOCK_RE.finditer(xml_text)]
         
-        # 按action分割xml_text
-        # 简单方法：按 </action> 分割
-        action_blocks = xml_text.split('</action>')
-        action_blocks = [block + '</action>' for block in action_blocks if block.strip()]
+        # 未传入 token 数时：有 tiktoken 则批量编码（多线程、释放 GIL），否则逐块估算
+        if block_tokens is None:
+            if self.encoding:
+                block_tokens = [len(t) for t in self.encoding.encode_batch(action_blocks, num_threads=os.cpu_count() or 1)]
+            else:
+                block_tokens = [self.count_tokens(block) for block in action_blocks]
         
-        # 将actions分组到chunks中
+        # 将actions分组到chunks中（按下标记录每段范围，每段只拼接一次）
         chunks = []
-        current_chunk = []
+        chunk_start = 0
         current_chunk_tokens = 0
-        
-        for action_block in action_blocks:
-            action_tokens = self.count_tokens(action_block)
-            
-            if current_chunk_tokens + action_tokens > chunk_size_tokens and current_chunk:
+        for i, action_tokens in enumerate(block_tokens):
+            if current_chunk_tokens + action_tokens > chunk_size_tokens and i > chunk_start:
                 # 当前chunk已满，开始新chunk
-                chunks.append('\n\n'.join(current_chunk))
-                current_chunk = [action_block]
+                chunks.append('\n\n'.join(action_blocks[chunk_start:i]))
+                chunk_start = i
                 current_chunk_tokens = action_tokens
             else:
-                current_chunk.append(action_block)
                 current_chunk_tokens += action_tokens
         
         # 添加最后一个chunk
-        if current_chunk:
-            chunks.append('\n\n'.join(current_chunk))
+        if chunk_start < len(action_blocks):
+            chunks.append('\n\n'.join(action_blocks[chunk_start:]))
         
         safe_print(f"      分成 {len(chunks)} 段进行压缩")
         
-        # 构建上下文信息
-        context_info = ""
-        if task_input:
-            context_info += f"\n<任务需求>\n{task_input}\n</任务需求>\n"
-        if thinking:
-            context_info += f"\n<当前进度与计划>\n{thinking}\n</当前进度与计划>\n"
+        # 构建上下文信息（调用方已构建时直接复用）
+        if context_info is None:
+            context_info = self._build_context_info(thinking, task_input)
         
-        # 对每个chunk进行压缩
-        chunk_summaries = []
+        # 对每个chunk进行压缩（各段并发，结果按原顺序合并）
         target_per_chunk = target_tokens // len(chunks)
         
-        for i, chunk in enumerate(chunks):
+        def summarize_chunk(i: int, chunk: str) -> str:
             safe_print(f"      压缩第 {i+1}/{len(chunks)} 段...")
             
             prompt = f"""你是智能历史信息压缩助手。这是分段压缩任务的第 {i+1}/{len(chunks)} 段。
@@ -411,26 +720,22 @@ class ActionCompressor:
 
 请直接输出本段的压缩总结（中文）："""
             
-            history = [ChatMessage(role="user", content=prompt)]
-            
             try:
-                response = self.llm_client.chat(
-                    history=history,
-                    model=self.llm_client.compressor_models[0],
-                    system_prompt=f"你是内容压缩专家。目标：将本段压缩到{target_per_chunk} tokens以内。",
-                    tool_list=[],  # 空列表表示不使用工具
-                    tool_choice="none"  # 明确表示不调用工具（压缩任务）
+                response = self._compressor_chat(
+                    prompt,
+                    f"你是内容压缩专家。目标：将本段压缩到{target_per_chunk} tokens以内。"
                 )
                 
                 if response.status == "success":
-                    chunk_summaries.append(f"[段{i+1}] {response.output}")
                     safe_print(f"         ✅ 第{i+1}段压缩成功")
-                else:
-                    chunk_summaries.append(f"[段{i+1}] [压缩失败]")
-                    safe_print(f"         ⚠️ 第{i+1}段压缩失败: {response.output}")
+                    return f"[段{i+1}] {response.output}"
+                safe_print(f"         ⚠️ 第{i+1}段压缩失败: {response.output}")
+                return f"[段{i+1}] [压缩失败]"
             except Exception as e:
-                chunk_summaries.append(f"[段{i+1}] [压缩异常]")
                 safe_print(f"         ❌ 第{i+1}段压缩异常: {e}")
+                return f"[段{i+1}] [压缩异常]"
+        
+        chunk_summaries = list(_CHUNK_POOL.map(summarize_chunk, range(len(chunks)), chunks))
         
         # 合并所有段的总结
         final_summary = "\n\n".join(chunk_summaries)
@@ -468,16 +773,30 @@ class ActionCompressor:
             max_context_window: 最大上下文窗口（传递给字段压缩方法）
             
         Returns:
-            压缩后的action
+            压缩后的action（没有字段需要压缩时返回原对象）
         """
+        # token 数不超过 UTF-8 字节数（单字符至多 4 字节），估算值也不超过字符数，
+        # 因此字符数 * 4 不超过上限的字段无需统计 token
+        max_chars = max_field_tokens // 4
+        
+        def is_small(text) -> bool:
+            # 非字符串（如 result.output 为 None）不做压缩
+            return not isinstance(text, str) or len(text) <= max_chars
+        
+        arguments = action.get("arguments")
+        result = action.get("result")
+        output = result.get("output") if isinstance(result, dict) else None
+        if (not arguments or all(is_small(_stringify(v)) for v in arguments.values())) and is_small(output):
+            return action
+        
         compressed_action = action.copy()
         
         # 压缩arguments中的大字段
         if "arguments" in compressed_action:
             compressed_args = {}
             for k, v in compressed_action["arguments"].items():
-                v_str = str(v)
-                v_tokens = self.count_tokens(v_str)
+                v_str = _stringify(v)
+                v_tokens = 0 if is_small(v_str) else self.count_tokens(v_str)
                 
                 if v_tokens > max_field_tokens:
                     safe_print(f"   🤖 LLM压缩arguments.{k}: {v_tokens} tokens → {max_field_tokens} tokens")
@@ -498,9 +817,11 @@ class ActionCompressor:
         # 压缩result.output
         if "result" in compressed_action and "output" in compressed_action["result"]:
             output = compressed_action["result"]["output"]
-            output_tokens = self.count_tokens(output)
+            output_tokens = 0 if is_small(output) else self.count_tokens(output)
             
             if output_tokens > max_field_tokens:
+                # result 为浅拷贝共享对象，写入前复制，避免改动完整轨迹中的原始结果
+                compressed_action["result"] = dict(compressed_action["result"])
                 safe_print(f"   🤖 LLM压缩result.output: {output_tokens} tokens → {max_field_tokens} tokens")
                 # 构建字段上下文（包含工具参数信息）
                 args_summary = ", ".join([f"{k}={v}" for k, v in compressed_action.get("arguments", {}).items()])
@@ -548,8 +869,6 @@ class ActionCompressor:
             压缩后的文本
         """
         try:
-            from services.llm_client import ChatMessage
-            
             # 根据工具类型定制提示词
             if "parse" in tool_name.lower() or "read" in tool_name.lower():
                 content_type = "文档内容"
@@ -564,14 +883,8 @@ class ActionCompressor:
                 content_type = "内容"
                 focus = "保留最重要的核心信息"
             
-            # 构建上下文信息
-            context_info = ""
-            if task_input:
-                context_info += f"\n<任务需求>\n{task_input}\n</任务需求>\n"
-            if thinking:
-                context_info += f"\n<当前进度与计划>\n{thinking}\n</当前进度与计划>\n"
-            if field_context:
-                context_info += f"\n<字段来源>\n这是最新动作中 {field_context} 的内容\n</字段来源>\n"
+            # 构建上下文信息（分段压缩时传给各段复用）
+            context_info = self._build_context_info(thinking, task_input, field_context)
             
             # 检查字段大小，决定是否需要分段压缩
             text_tokens = self.count_tokens(text)
@@ -587,7 +900,8 @@ class ActionCompressor:
                 safe_print(f"      📦 字段过大({text_tokens} tokens)，启用分段压缩")
                 return self._chunked_compress_field(
                     text, target_tokens, tool_name, content_type, focus,
-                    thinking, task_input, field_context, available_tokens
+                    thinking, task_input, field_context, available_tokens,
+                    context_info=context_info
                 )
             
             # 文本大小合适，直接压缩
@@ -620,14 +934,9 @@ class ActionCompressor:
 
 请直接输出压缩后的内容（不要额外说明）："""
             
-            history = [ChatMessage(role="user", content=prompt)]
-            
-            response = self.llm_client.chat(
-                history=history,
-                model=self.llm_client.compressor_models[0],
-                system_prompt=f"你是智能内容压缩助手。目标：将{content_type}压缩到{target_tokens} tokens，同时保留核心信息。",
-                tool_list=[],  # 空列表表示不使用工具
-                tool_choice="none"  # 明确表示不调用工具（压缩任务）
+            response = self._compressor_chat(
+                prompt,
+                f"你是智能内容压缩助手。目标：将{content_type}压缩到{target_tokens} tokens，同时保留核心信息。"
             )
             
             compressed = response.output if response.status == "success" else text[:1000] + "\n[压缩失败，仅保留前1000字符]"
@@ -653,7 +962,8 @@ class ActionCompressor:
         thinking: str,
         task_input: str,
         field_context: str,
-        chunk_size_tokens: int
+        chunk_size_tokens: int,
+        context_info: str = None
     ) -> str:
         """
         分段压缩字段内容
@@ -668,63 +978,80 @@ class ActionCompressor:
             task_input: 任务输入
             field_context: 字段上下文
             chunk_size_tokens: 每段的最大token数
+            context_info: 已构建的上下文信息（可选）
             
         Returns:
             压缩后的文本
         """
-        from services.llm_client import ChatMessage
-        
-        # 按段落或固定字符数分割文本
-        # 简单策略：按\n\n分割段落，如果段落太大则按字符数分割
+        # 按段落或固定长度分割文本
+        # 简单策略：按\n\n分割段落，如果段落太大则强制分割
         paragraphs = text.split('\n\n')
         
+        # 有 tiktoken 时整段文本只编码一次，用各 token 的字符偏移得到每个段落的 token 数，
+        # 不再逐段落编码（也避免大量段落文本挤占 count_tokens 的 LRU 缓存）
+        offsets = None
+        if self.encoding:
+            offsets = self.encoding.decode_with_offsets(self.encoding.encode(text))[1]
+        
+        # 相邻段落在 text 中连续，每段直接按字符范围切片，不再拼接段落
         chunks = []
-        current_chunk = []
+        chunk_start = chunk_end = None  # 当前chunk在 text 中的字符范围（None 表示为空）
         current_chunk_tokens = 0
+        para_start = 0  # 当前段落在 text 中的起始字符位置
         
         for para in paragraphs:
-            para_tokens = self.count_tokens(para)
+            para_end = para_start + len(para)
+            if offsets is not None:
+                first = bisect.bisect_left(offsets, para_start)
+                last = bisect.bisect_left(offsets, para_end)
+                para_tokens = last - first
+            else:
+                para_tokens = self.count_tokens(para)
             
             # 如果单个段落就超过chunk大小，需要强制分割
             if para_tokens > chunk_size_tokens:
-                if current_chunk:
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = []
+                if chunk_start is not None:
+                    chunks.append(text[chunk_start:chunk_end])
+                    chunk_start = None
                     current_chunk_tokens = 0
                 
-                # 按字符数强制分割大段落
-                chars_per_chunk = int(chunk_size_tokens * 3)  # 粗略估计
-                for i in range(0, len(para), chars_per_chunk):
-                    chunk_text = para[i:i+chars_per_chunk]
-                    chunks.append(chunk_text)
+                if offsets is not None:
+                    # 按 token 边界分割大段落
+                    for i in range(first, last, chunk_size_tokens):
+                        start = max(offsets[i], para_start)
+                        end = offsets[i + chunk_size_tokens] if i + chunk_size_tokens < last else para_end
+                        chunks.append(text[start:end])
+                else:
+                    # 按字符数强制分割大段落
+                    chars_per_chunk = int(chunk_size_tokens * 3)  # 粗略估计
+                    for i in range(0, len(para), chars_per_chunk):
+                        chunk_text = para[i:i+chars_per_chunk]
+                        chunks.append(chunk_text)
             else:
-                if current_chunk_tokens + para_tokens > chunk_size_tokens and current_chunk:
-                    chunks.append('\n\n'.join(current_chunk))
-                    current_chunk = [para]
+                if current_chunk_tokens + para_tokens > chunk_size_tokens and chunk_start is not None:
+                    chunks.append(text[chunk_start:chunk_end])
+                    chunk_start = para_start
                     current_chunk_tokens = para_tokens
                 else:
-                    current_chunk.append(para)
+                    if chunk_start is None:
+                        chunk_start = para_start
                     current_chunk_tokens += para_tokens
+                chunk_end = para_end
+            para_start = para_end + 2  # 跳过分隔符 \n\n
         
-        if current_chunk:
-            chunks.append('\n\n'.join(current_chunk))
+        if chunk_start is not None:
+            chunks.append(text[chunk_start:chunk_end])
         
         safe_print(f"         分成 {len(chunks)} 段进行字段压缩")
         
-        # 构建上下文信息
-        context_info = ""
-        if task_input:
-            context_info += f"\n<任务需求>\n{task_input}\n</任务需求>\n"
-        if thinking:
-            context_info += f"\n<当前进度与计划>\n{thinking}\n</当前进度与计划>\n"
-        if field_context:
-            context_info += f"\n<字段来源>\n这是最新动作中 {field_context} 的内容\n</字段来源>\n"
+        # 构建上下文信息（调用方已构建时直接复用）
+        if context_info is None:
+            context_info = self._build_context_info(thinking, task_input, field_context)
         
-        # 压缩每个chunk
-        chunk_results = []
+        # 压缩每个chunk（各段并发，结果按原顺序合并）
         target_per_chunk = target_tokens // len(chunks)
         
-        for i, chunk in enumerate(chunks):
+        def compress_chunk(i: int, chunk: str) -> str:
             safe_print(f"         压缩字段第 {i+1}/{len(chunks)} 段...")
             
             prompt = f"""你是智能内容压缩助手。这是分段压缩的第 {i+1}/{len(chunks)} 段{content_type}。
@@ -743,26 +1070,22 @@ class ActionCompressor:
 
 请直接输出本段的压缩结果："""
             
-            history = [ChatMessage(role="user", content=prompt)]
-            
             try:
-                response = self.llm_client.chat(
-                    history=history,
-                    model=self.llm_client.compressor_models[0],
-                    system_prompt=f"压缩专家。目标：将本段压缩到{target_per_chunk} tokens。",
-                    tool_list=[],  # 空列表表示不使用工具
-                    tool_choice="none"  # 明确表示不调用工具（压缩任务）
+                response = self._compressor_chat(
+                    prompt,
+                    f"压缩专家。目标：将本段压缩到{target_per_chunk} tokens。"
                 )
                 
                 if response.status == "success":
-                    chunk_results.append(response.output)
                     safe_print(f"            ✅ 第{i+1}段压缩成功")
-                else:
-                    chunk_results.append(chunk[:500] + "\n[本段压缩失败]")
-                    safe_print(f"            ⚠️ 第{i+1}段压缩失败")
+                    return response.output
+                safe_print(f"            ⚠️ 第{i+1}段压缩失败")
+                return chunk[:500] + "\n[本段压缩失败]"
             except Exception as e:
-                chunk_results.append(chunk[:500] + "\n[本段压缩异常]")
                 safe_print(f"            ❌ 第{i+1}段压缩异常: {e}")
+                return chunk[:500] + "\n[本段压缩异常]"
+        
+        chunk_results = list(_CHUNK_POOL.map(compress_chunk, range(len(chunks)), chunks))
         
         # 合并结果
         final_result = '\n\n---\n\n'.join(chunk_results)
@@ -776,14 +1099,17 @@ class ActionCompressor:
         备用压缩方案（首尾保留法）- 当LLM压缩失败时使用
         """
         if self.encoding:
-            tokens = self.encoding.encode(text)
             head_count = int(max_tokens * 0.1)
             tail_count = int(max_tokens * 0.1)
-            head_tokens = tokens[:head_count]
-            tail_tokens = tokens[-tail_count:]
+            # 总 token 数通常刚由调用方统计过（命中缓存）；首尾只编码足够长的字符窗口，不再整体编码
+            total_tokens = self.count_tokens(text)
+            window = (head_count + tail_count) * self._FALLBACK_CHARS_PER_TOKEN
+            head_tokens = self.encoding.encode(text[:window])[:head_count]
+            tail_tokens = self.encoding.encode(text[max(len(text) - window, 0):])
+            tail_tokens = tail_tokens[max(len(tail_tokens) - tail_count, 0):]
             head_text = self.encoding.decode(head_tokens)
             tail_text = self.encoding.decode(tail_tokens)
-            omitted = len(tokens) - head_count - tail_count
+            omitted = total_tokens - head_count - tail_count
             return f"{head_text}\n\n[中间省略约{omitted}个tokens]\n\n{tail_text}"
         else:
             # 简单字符截取
@@ -10,7 +10,7 @@ import yaml
 import time
 import json
 import concurrent.futures
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 from pathlib import Path
 from litellm import completion  # 直接导入completion函数
@@ -94,10 +94,15 @@ class SimpleLLMClient:
         # 如果没有配置 thinking_models，回退到 models
         if not self.thinking_models:
             self.thinking_models = list(self.models)
+        self._models_set = set(self.models)  # 可用模型集合（resolve_model 查找用）
 
         # 多模态配置
         self.multimodal = self.config.get("multimodal", False)
         self.compressor_multimodal = self.config.get("compressor_multimodal", False)
+        self.prompt_caching = self.config.get("prompt_caching", True)  # 是否启用服务商前缀缓存
+        self.compress_trigger_ratio = self.config.get("compress_trigger_ratio", 0.8)  # 历史动作达到压缩预算的该比例时后台提前压缩
+        self.save_system_prompt = self.config.get("save_system_prompt", False)  # 保存状态时是否写入完整系统提示词（调试用）
+        self.debug_traceback = self.config.get("debug_traceback", False)  # 压缩失败时打印完整异常堆栈（调试用）
         
         if not self.api_key:
             raise ValueError("未配置API密钥")
@@ -157,6 +162,17 @@ class SimpleLLMClient:
             else:
                 safe_print(f"⚠️ 不支持的模型配置格式，跳过: {model_item}")
     
+    def resolve_model(self, requested_model: str) -> Tuple[str, bool]:
+        """
+        将请求的模型解析为实际使用的模型，不可用时回退到第一个可用模型
+        
+        Returns:
+            (最终模型, 是否回退)
+        """
+        if requested_model in self._models_set:
+            return requested_model, False
+        return self.models[0], True
+    
     def chat(
         self,
         history: List,
@@ -344,6 +360,13 @@ class SimpleLLMClient:
                 "stream_timeout": self.stream_timeout,  # 两个流式数据块（chunk）之间的最大间隔时间（秒）
             }
             
+            # 前缀缓存：由 LiteLLM 按服务商在 system 消息和最后一条消息处注入 cache_control
+            if self.prompt_caching:
+                kwargs["cache_control_injection_points"] = [
+                    {"location": "message", "role": "system"},
+                    {"location": "message", "index": -1},
+                ]
+            
             # 只在 base_url 非空时添加 api_base
             if model_base_url:
                 kwargs["api_base"] = model_base_url
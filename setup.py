@@ -22,6 +22,20 @@ if requirements_file.exists():
 else:
     requirements = []
 
+# 可选: 安装了 Cython 时将事件分发、messages 分组等热路径编译为扩展模块
+# 编译失败或未安装 Cython 时回退为纯 Python 模块
+try:
+    from Cython.Build import cythonize
+    ext_modules = cythonize(
+        ["core/agent_event_emitter.py", "core/message_buckets.py"],
+        compiler_directives={"language_level": "3"},
+        quiet=True,
+    )
+    for ext in ext_modules:
+        ext.optional = True
+except ImportError:
+    ext_modules = []
+
 setup(
     name="mla-agent",
     version="3.0.0",
@@ -42,6 +56,7 @@ setup(
             'tool_server_lite/requirements.txt',
         ],
     },
+    ext_modules=ext_modules,
     install_requires=requirements,
     python_requires='>=3.9',
     entry_points={
@@ -96,6 +96,7 @@ def main():
     parser.add_argument('--config-file', type=str, help='使用自定义配置文件路径')
     parser.add_argument('--force-new', action='store_true', help='强制清空所有状态，开始新任务')
     parser.add_argument('--auto-mode', type=str, choices=['true', 'false'], help='工具执行模式：true=自动执行，false=需要确认')
+    parser.add_argument('--rebuild-skills-manifest', action='store_true', help='重新解析 skills_library 中所有 SKILL.md 并重建清单缓存')
     
     args = parser.parse_args()
     
@@ -164,6 +165,12 @@ def main():
         set_config(args.config_set[0], args.config_set[1])
         return 0
     
+    if args.rebuild_skills_manifest:
+        from utils.skill_loader import get_skill_loader
+        skills = get_skill_loader().rebuild_manifest()
+        print(f"✅ 已重建 skills 清单: {len(skills)} 个 skill")
+        return 0
+    
     # 初始化事件发射器
     from utils.event_emitter import init_event_emitter
     emitter = init_event_emitter(enabled=args.jsonl)
@@ -207,6 +214,13 @@ def main():
         print(f"📝 用户输入: {args.user_input}")
         print("="*100 + "\n")
     
+    # 后台预热 skill 元数据（与下面的配置加载、Agent 初始化重叠）
+    try:
+        from utils.skill_loader import get_skill_loader
+        get_skill_loader().warm_up()
+    except Exception:
+        pass
+    
     try:
         # 初始化配置加载器
         if args.jsonl:
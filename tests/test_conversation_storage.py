@@ -0,0 +1,48 @@
+import pytest
+
+from utils.conversation_storage import ConversationStorage
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    """在临时 HOME 下创建存储器（不写入真实的 ~/mla_v3）"""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    return ConversationStorage()
+
+
+def _save(storage, action_history, action_history_fact):
+    storage.save_actions(
+        task_id="task",
+        agent_id="agent_1",
+        agent_name="test_agent",
+        task_input="测试任务",
+        action_history=action_history,
+        current_turn=len(action_history),
+        action_history_fact=action_history_fact,
+    )
+
+
+def test_no_tool_call_entry_not_written_to_fact(storage):
+    """只存在于 action_history 的条目（_no_tool_call）不能占用完整轨迹的位置"""
+    no_tool_call = {
+        "_turn": 0,
+        "tool_name": "_no_tool_call",
+        "arguments": {},
+        "result": {"status": "error", "output": "请调用工具"},
+    }
+    action = {
+        "_turn": 1,
+        "tool_call_id": "call_1",
+        "tool_name": "file_read",
+        "arguments": {"path": "a.txt"},
+        "result": {"status": "success", "output": "内容"},
+    }
+
+    _save(storage, [no_tool_call], [])
+    _save(storage, [no_tool_call, action], [action])
+
+    data = storage.load_actions("task", "agent_1")
+    assert data["action_history_fact"] == [action]
+    assert data["action_history"] == [no_tool_call, action]
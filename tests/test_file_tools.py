@@ -10,68 +10,101 @@ from tool_server_lite.tools.file_tools import (
     FileDeleteTool,
 )
 
+try:
+    import pyfakefs  # noqa: F401
+    HAS_PYFAKEFS = True
+except ImportError:
+    HAS_PYFAKEFS = False
+
 pytestmark = pytest.mark.unit
 
 @pytest.fixture
-def workspace(tmp_path):
-    """Fixture to provide a temporary workspace path."""
+def workspace(request, tmp_path):
+    """Fixture to provide a temporary workspace path.
+
+    安装了 pyfakefs 时使用内存文件系统（不产生真实磁盘 I/O），否则退回 tmp_path
+    """
+    if HAS_PYFAKEFS:
+        fs = request.getfixturevalue("fs")
+        fs.create_dir("/ws")
+        return "/ws"
     return str(tmp_path)
 
+@pytest.fixture
+def ws(workspace):
+    """workspace 对应的 Path 对象（测试中构造文件路径用，避免重复 Path(workspace)）"""
+    return Path(workspace)
+
+@pytest.fixture(scope="module")
+def shared_workspace(tmp_path_factory):
+    """模块级只读工作区：预置读取类测试共用的文件，只创建一次（测试中不得修改）"""
+    root = tmp_path_factory.mktemp("ws")
+    files = {
+        "test.txt": b"Hello World",
+        "lines.txt": b"line1\nline2\nline3\nline4\nline5\n",
+        "empty.txt": b"",
+        "test.png": b'\x89PNG\r\n\x1a\n\x00\x00',
+        "f1.txt": b"C1",
+        "f2.txt": b"C2",
+        "exists.txt": b"ok",
+    }
+    for name, data in files.items():
+        (root / name).write_bytes(data)
+    return str(root)
+
+@pytest.fixture(scope="class")
+def dirlist_ws(tmp_path_factory):
+    """列目录测试共用的只读目录树（每个测试类只创建一次，测试中不得修改）"""
+    root = tmp_path_factory.mktemp("dl")
+    (root / "a.txt").touch()
+    (root / "b_dir").mkdir()
+    (root / "file.txt").touch()
+    (root / "empty_dir").mkdir()
+    (root / "parent").mkdir()
+    (root / "parent/child.txt").touch()
+    return str(root)
+
 class TestFileReadTool:
-    def test_read_single_file_success(self, workspace):
-        file_path = Path(workspace) / "test.txt"
-        file_path.write_text("Hello World", encoding="utf-8")
-        
+    def test_read_single_file_success(self, shared_workspace):
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": "test.txt"})
+        result = tool.execute(shared_workspace, {"path": "test.txt"})
         
         assert result["status"] == "success"
         assert "Hello World" in result["output"]
 
-    def test_read_single_file_not_found(self, workspace):
+    def test_read_single_file_not_found(self, shared_workspace):
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": "nonexistent.txt"})
+        result = tool.execute(shared_workspace, {"path": "nonexistent.txt"})
         
         assert result["status"] == "error"
         assert "File not found" in result["error"]
 
-    def test_read_multiple_files_success(self, workspace):
-        (Path(workspace) / "f1.txt").write_text("C1", encoding="utf-8")
-        (Path(workspace) / "f2.txt").write_text("C2", encoding="utf-8")
-
+    def test_read_multiple_files_success(self, shared_workspace):
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": ["f1.txt", "f2.txt"]})
+        result = tool.execute(shared_workspace, {"path": ["f1.txt", "f2.txt"]})
 
         assert result["status"] == "success"
         assert "\"success_count\": 2" in result["output"]
 
-    def test_read_empty_file(self, workspace):
+    def test_read_empty_file(self, shared_workspace):
         """测试读取空文件"""
-        (Path(workspace) / "empty.txt").touch()
-
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": "empty.txt"})
+        result = tool.execute(shared_workspace, {"path": "empty.txt"})
 
         assert result["status"] == "success"
 
-    def test_read_binary_file_error(self, workspace):
+    def test_read_binary_file_error(self, shared_workspace):
         """测试读取二进制文件应返回错误"""
-        binary_file = Path(workspace) / "test.png"
-        binary_file.write_bytes(b'\x89PNG\r\n\x1a\n\x00\x00')
-
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": "test.png"})
+        result = tool.execute(shared_workspace, {"path": "test.png"})
 
         assert result["status"] == "error"
         assert "binary" in result["error"].lower()
 
-    def test_read_with_line_range(self, workspace):
+    def test_read_with_line_range(self, shared_workspace):
         """测试按行范围读取"""
-        content = "line1\nline2\nline3\nline4\nline5\n"
-        (Path(workspace) / "lines.txt").write_text(content, encoding="utf-8")
-
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": "lines.txt", "start_line": 2, "end_line": 4})
+        result = tool.execute(shared_workspace, {"path": "lines.txt", "start_line": 2, "end_line": 4})
 
         assert result["status"] == "success"
         output = json.loads(result["output"])
@@ -79,9 +112,9 @@ class TestFileReadTool:
         assert output[0]["line"] == 2
         assert output[0]["content"] == "line2"
 
-    def test_read_without_line_numbers(self, workspace):
+    def test_read_without_line_numbers(self, workspace, ws):
         """测试不显示行号"""
-        (Path(workspace) / "test.txt").write_text("content", encoding="utf-8")
+        (ws / "test.txt").write_text("content", encoding="utf-8")
 
         tool = FileReadTool()
         result = tool.execute(workspace, {"path": "test.txt", "show_line_numbers": False})
@@ -89,17 +122,17 @@ class TestFileReadTool:
         assert result["status"] == "success"
         assert result["output"] == "content"
 
-    def test_read_missing_path_parameter(self, workspace):
+    def test_read_missing_path_parameter(self, shared_workspace):
         """测试缺少 path 参数"""
         tool = FileReadTool()
-        result = tool.execute(workspace, {})
+        result = tool.execute(shared_workspace, {})
 
         assert result["status"] == "error"
         assert "path" in result["error"].lower()
 
-    def test_read_with_file_path_alias(self, workspace):
+    def test_read_with_file_path_alias(self, workspace, ws):
         """测试使用 file_path 参数别名"""
-        (Path(workspace) / "test.txt").write_text("alias test", encoding="utf-8")
+        (ws / "test.txt").write_text("alias test", encoding="utf-8")
 
         tool = FileReadTool()
         result = tool.execute(workspace, {"file_path": "test.txt"})
@@ -107,12 +140,10 @@ class TestFileReadTool:
         assert result["status"] == "success"
         assert "alias test" in result["output"]
 
-    def test_read_multiple_files_partial_error(self, workspace):
+    def test_read_multiple_files_partial_error(self, shared_workspace):
         """测试多文件读取部分失败"""
-        (Path(workspace) / "exists.txt").write_text("ok", encoding="utf-8")
-
         tool = FileReadTool()
-        result = tool.execute(workspace, {"path": ["exists.txt", "not_exists.txt"]})
+        result = tool.execute(shared_workspace, {"path": ["exists.txt", "not_exists.txt"]})
 
         assert result["status"] == "success"
         output = json.loads(result["output"])
@@ -120,20 +151,20 @@ class TestFileReadTool:
         assert output["error_count"] == 1
 
 class TestFileWriteTool:
-    def test_write_file_success(self, workspace):
+    def test_write_file_success(self, workspace, ws):
         tool = FileWriteTool()
         result = tool.execute(workspace, {"path": "new.txt", "content": "New Content"})
 
         assert result["status"] == "success"
-        assert (Path(workspace) / "new.txt").read_text(encoding="utf-8") == "New Content"
+        assert (ws / "new.txt").read_text(encoding="utf-8") == "New Content"
 
-    def test_write_creates_parent_dirs(self, workspace):
+    def test_write_creates_parent_dirs(self, workspace, ws):
         """测试写入时自动创建父目录"""
         tool = FileWriteTool()
         result = tool.execute(workspace, {"path": "a/b/c/deep.txt", "content": "deep"})
 
         assert result["status"] == "success"
-        assert (Path(workspace) / "a/b/c/deep.txt").read_text(encoding="utf-8") == "deep"
+        assert (ws / "a/b/c/deep.txt").read_text(encoding="utf-8") == "deep"
 
     def test_write_reference_bib_forbidden(self, workspace):
         """测试禁止写入 reference.bib"""
@@ -156,8 +187,8 @@ class TestFileWriteTool:
         assert result["status"] == "error"
         assert "not found" in result["error"].lower()
 
-    def test_append_file_success(self, workspace):
-        p = Path(workspace) / "log.txt"
+    def test_append_file_success(self, workspace, ws):
+        p = ws / "log.txt"
         p.write_text("Line1\n", encoding="utf-8")
         
         tool = FileWriteTool()
@@ -166,8 +197,8 @@ class TestFileWriteTool:
         assert result["status"] == "success"
         assert p.read_text(encoding="utf-8") == "Line1\nLine2"
 
-    def test_replace_lines_success(self, workspace):
-        p = Path(workspace) / "code.py"
+    def test_replace_lines_success(self, workspace, ws):
+        p = ws / "code.py"
         p.write_text("lines = [\n    'one',\n    'two',\n    'three'\n]\n", encoding="utf-8")
         
         tool = FileWriteTool()
@@ -191,92 +222,82 @@ class TestFileWriteTool:
         assert p.read_text(encoding="utf-8") == expected
 
 class TestDirListTool:
-    def test_list_dir_success(self, workspace):
-        (Path(workspace) / "a.txt").touch()
-        (Path(workspace) / "b_dir").mkdir()
-
+    def test_list_dir_success(self, dirlist_ws):
         tool = DirListTool()
-        result = tool.execute(workspace, {"path": "."})
+        result = tool.execute(dirlist_ws, {"path": "."})
 
         assert result["status"] == "success"
         assert "[file] a.txt" in result["output"]
         assert "[dir] b_dir" in result["output"]
 
-    def test_list_dir_not_found(self, workspace):
+    def test_list_dir_not_found(self, dirlist_ws):
         """测试目录不存在"""
         tool = DirListTool()
-        result = tool.execute(workspace, {"path": "nonexistent_dir"})
+        result = tool.execute(dirlist_ws, {"path": "nonexistent_dir"})
 
         assert result["status"] == "error"
         assert "not found" in result["error"].lower()
 
-    def test_list_not_a_directory(self, workspace):
+    def test_list_not_a_directory(self, dirlist_ws):
         """测试路径不是目录"""
-        (Path(workspace) / "file.txt").touch()
-
         tool = DirListTool()
-        result = tool.execute(workspace, {"path": "file.txt"})
+        result = tool.execute(dirlist_ws, {"path": "file.txt"})
 
         assert result["status"] == "error"
         assert "not a directory" in result["error"].lower()
 
-    def test_list_empty_directory(self, workspace):
+    def test_list_empty_directory(self, dirlist_ws):
         """测试空目录"""
-        (Path(workspace) / "empty_dir").mkdir()
-
         tool = DirListTool()
-        result = tool.execute(workspace, {"path": "empty_dir"})
+        result = tool.execute(dirlist_ws, {"path": "empty_dir"})
 
         assert result["status"] == "success"
         assert "empty" in result["output"].lower()
 
-    def test_list_recursive_success(self, workspace):
-        (Path(workspace) / "parent").mkdir()
-        (Path(workspace) / "parent/child.txt").touch()
-        
+    def test_list_recursive_success(self, dirlist_ws):
         tool = DirListTool()
-        result = tool.execute(workspace, {"path": ".", "recursive": True})
+        result = tool.execute(dirlist_ws, {"path": ".", "recursive": True})
         
         assert result["status"] == "success"
         assert "[dir] parent" in result["output"]
         assert "  [file] child.txt" in result["output"]
 
 class TestDirCreateTool:
-    def test_create_dir_success(self, workspace):
+    def test_create_dir_success(self, workspace, ws):
         tool = DirCreateTool()
         result = tool.execute(workspace, {"path": "new_folder/sub_folder"})
         
         assert result["status"] == "success"
-        assert (Path(workspace) / "new_folder/sub_folder").is_dir()
+        assert (ws / "new_folder/sub_folder").is_dir()
 
 class TestFileMoveTool:
-    def test_move_file_success(self, workspace):
-        src = Path(workspace) / "src.txt"
+    def test_move_file_success(self, workspace, ws):
+        src = ws / "src.txt"
         src.touch()
-        (Path(workspace) / "dest").mkdir()
+        (ws / "dest").mkdir()
         
         tool = FileMoveTool()
         result = tool.execute(workspace, {"source": ["src.txt"], "destination": "dest/"})
         
         assert result["status"] == "success"
         assert not src.exists()
-        assert (Path(workspace) / "dest/src.txt").exists()
+        assert (ws / "dest/src.txt").exists()
 
-    def test_copy_file_success(self, workspace):
-        src = Path(workspace) / "src.txt"
+    def test_copy_file_success(self, workspace, ws):
+        src = ws / "src.txt"
         src.touch()
-        (Path(workspace) / "dest").mkdir()
+        (ws / "dest").mkdir()
         
         tool = FileMoveTool()
         result = tool.execute(workspace, {"source": ["src.txt"], "destination": "dest/", "copy": True})
         
         assert result["status"] == "success"
         assert src.exists()
-        assert (Path(workspace) / "dest/src.txt").exists()
+        assert (ws / "dest/src.txt").exists()
 
 class TestFileDeleteTool:
-    def test_delete_file_success(self, workspace):
-        f = Path(workspace) / "todel.txt"
+    def test_delete_file_success(self, workspace, ws):
+        f = ws / "todel.txt"
         f.touch()
 
         tool = FileDeleteTool()
@@ -285,8 +306,8 @@ class TestFileDeleteTool:
         assert result["status"] == "success"
         assert not f.exists()
 
-    def test_delete_dir_success(self, workspace):
-        d = Path(workspace) / "deldir"
+    def test_delete_dir_success(self, workspace, ws):
+        d = ws / "deldir"
         d.mkdir()
         (d / "f.txt").touch()
 
@@ -182,7 +182,7 @@ class LLMClientLite:
         
         # 读取并编码图片
         with open(img_path, "rb") as image_file:
-            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+            image_data = base64.b64encode(image_file.read()).decode('ascii')
         
         # 判断图片格式
         suffix = img_path.suffix.lower()
@@ -306,7 +306,7 @@ class LLMClientLite:
                         
                         # 读取并编码图片
                         with open(img_path, "rb") as image_file:
-                            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+                            image_data = base64.b64encode(image_file.read()).decode('ascii')
                         
                         # 判断图片格式
                         suffix = img_path.suffix.lower()
@@ -388,7 +388,7 @@ class LLMClientLite:
                         
                         # 读取并编码图片
                         with open(img_path, "rb") as image_file:
-                            image_data = base64.b64encode(image_file.read()).decode('utf-8')
+                            image_data = base64.b64encode(image_file.read()).decode('ascii')
                         
                         # 判断图片格式
                         suffix = img_path.suffix.lower()
@@ -85,6 +85,7 @@ from tools.human_tools import (
     create_tool_confirmation, get_tool_confirmation_status, respond_tool_confirmation,
     get_tool_confirmation_for_workspace, list_tool_confirmations
 )
+from tools.web_tools import close_crawler
 
 app = FastAPI(
     title="Tool Server Lite",
@@ -145,6 +146,12 @@ TOOLS = {
 }
 
 
+@app.on_event("shutdown")
+async def shutdown_shared_crawler():
+    """服务关闭时释放 crawl_page / google_scholar_search 共享的浏览器"""
+    await close_crawler()
+
+
 # ===== 请求模型 =====
 class ToolExecuteRequest(BaseModel):
     """工具执行请求"""
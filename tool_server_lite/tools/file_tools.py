@@ -7,9 +7,14 @@
 from pathlib import Path
 from typing import Dict, Any, Optional
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 import chardet
 
 
+# 多文件读取共享线程池
+_READ_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="file-read")
+
+
 class BaseTool:
     """工具基类"""
     
@@ -210,73 +215,24 @@ class FileReadTool(BaseTool):
         encoding = parameters.get("encoding")
         show_line_numbers = parameters.get("show_line_numbers", True)
         
+        # 各文件相互独立，并发读取（I/O 期间释放 GIL）；结果按传入顺序汇总
+        def read_one(path):
+            return self._read_file_entry(task_id, path, encoding, start_line, end_line, show_line_numbers)
+        
+        if len(paths) > 1:
+            entries = list(_READ_POOL.map(read_one, paths))
+        else:
+            entries = [read_one(path) for path in paths]
+        
         results = {}
         errors = []
         success_count = 0
-        
-        for path in paths:
-            try:
-                abs_path = get_abs_path(task_id, path)
-                
-                # 检查文件是否存在
-                if not abs_path.exists():
-                    errors.append(f"File not found: {path}")
-                    results[path] = {
-                        "status": "error",
-                        "error": f"File not found: {path}"
-                    }
-                    continue
-                
-                # 检查是否为二进制文件
-                if is_binary_file(abs_path):
-                    errors.append(f"Cannot read binary file: {path}")
-                    results[path] = {
-                        "status": "error",
-                        "error": f"Binary file, use other tools"
-                    }
-                    continue
-                
-                # 自动检测编码
-                file_encoding = encoding or detect_encoding(abs_path)
-                
-                # 读取文件
-                try:
-                    with open(abs_path, 'r', encoding=file_encoding) as f:
-                        lines = f.readlines()
-                except UnicodeDecodeError:
-                    with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        lines = f.readlines()
-                
-                # 处理行范围
-                start_idx = (start_line - 1) if start_line else 0
-                end_idx = end_line if end_line else len(lines)
-                selected_lines = lines[start_idx:end_idx]
-                
-                # 格式化内容
-                if show_line_numbers:
-                    output_lines = []
-                    for i, line in enumerate(selected_lines, start=start_idx + 1):
-                        output_lines.append({
-                            "line": i,
-                            "content": line.rstrip('\n\r')
-                        })
-                    content = output_lines  # 保持为列表，稍后统一序列化
-                else:
-                    content = ''.join(selected_lines)
-                
-                results[path] = {
-                    "status": "success",
-                    "content": content,
-                    "total_lines": len(lines)
-                }
+        for path, (entry, error) in zip(paths, entries):
+            results[path] = entry
+            if error is None:
                 success_count += 1
-                
-            except Exception as e:
-                errors.append(f"{path}: {str(e)}")
-                results[path] = {
-                    "status": "error",
-                    "error": str(e)
-                }
+            else:
+                errors.append(error)
         
         # 构建输出
         output_data = {
@@ -295,6 +251,66 @@ class FileReadTool(BaseTool):
             "error": "\n".join(errors) if errors else ""
         }
 
+    
+    def _read_file_entry(self, task_id: str, path: str, encoding: Optional[str], start_line, end_line,
+                         show_line_numbers: bool) -> tuple:
+        """多文件模式下读取单个文件，返回 (结果条目, 错误信息或 None)"""
+        try:
+            abs_path = get_abs_path(task_id, path)
+            
+            # 检查文件是否存在
+            if not abs_path.exists():
+                return {
+                    "status": "error",
+                    "error": f"File not found: {path}"
+                }, f"File not found: {path}"
+            
+            # 检查是否为二进制文件
+            if is_binary_file(abs_path):
+                return {
+                    "status": "error",
+                    "error": f"Binary file, use other tools"
+                }, f"Cannot read binary file: {path}"
+            
+            # 自动检测编码
+            file_encoding = encoding or detect_encoding(abs_path)
+            
+            # 读取文件
+            try:
+                with open(abs_path, 'r', encoding=file_encoding) as f:
+                    lines = f.readlines()
+            except UnicodeDecodeError:
+                with open(abs_path, 'r', encoding='utf-8', errors='ignore') as f:
+                    lines = f.readlines()
+            
+            # 处理行范围
+            start_idx = (start_line - 1) if start_line else 0
+            end_idx = end_line if end_line else len(lines)
+            selected_lines = lines[start_idx:end_idx]
+            
+            # 格式化内容
+            if show_line_numbers:
+                output_lines = []
+                for i, line in enumerate(selected_lines, start=start_idx + 1):
+                    output_lines.append({
+                        "line": i,
+                        "content": line.rstrip('\n\r')
+                    })
+                content = output_lines  # 保持为列表，稍后统一序列化
+            else:
+                content = ''.join(selected_lines)
+            
+            return {
+                "status": "success",
+                "content": content,
+                "total_lines": len(lines)
+            }, None
+            
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e)
+            }, f"{path}: {str(e)}"
 
 class FileWriteTool(BaseTool):
     """文件写入工具"""
@@ -4,18 +4,52 @@
 人类交互工具
 """
 
+from collections import OrderedDict
 from pathlib import Path
 from typing import Dict, Any
 import asyncio
+import time
 from .file_tools import BaseTool
 
-# 全局 HIL 任务状态存储
-HIL_TASKS = {}
+# 全局 HIL 任务状态存储（按注册顺序）
+HIL_TASKS = OrderedDict()
+
+# 已结束（超时/无人等待的回复）的任务保留时长与最大条数，注册新任务时顺带清理
+HIL_FINISHED_TTL = 3600
+MAX_HIL_TASKS = 10000
 
 # 全局工具确认请求存储（与 HIL 分开）
 TOOL_CONFIRMATIONS = {}
 
 
+def _register_hil_task(hil_id: str, task: Dict[str, Any]):
+    """
+    注册 HIL 任务，并清理已结束的旧任务：
+    超过保留时长的全部移除；总数仍超上限时从最早结束的开始移除（等待中的任务不受影响）
+    """
+    now = time.monotonic()
+    finished = [(k, t) for k, t in list(HIL_TASKS.items()) if t["status"] != "waiting"]
+    overflow = len(HIL_TASKS) + 1 - MAX_HIL_TASKS
+    for k, t in finished:
+        if now - t.get("finished_at", now) > HIL_FINISHED_TTL or overflow > 0:
+            HIL_TASKS.pop(k, None)
+            overflow -= 1
+    HIL_TASKS.pop(hil_id, None)  # 同名任务重新注册时排到末尾
+    HIL_TASKS[hil_id] = task
+
+
+def _leave_hil_task(hil_id: str, future) -> None:
+    """等待方异常退出：仍是同一注册条目且已无其他等待方时移除（同名新任务不受影响）"""
+    if future is None:
+        return
+    task = HIL_TASKS.get(hil_id)
+    if task is None or task.get("future") is not future:
+        return
+    task["waiters"] -= 1
+    if task["waiters"] <= 0:
+        del HIL_TASKS[hil_id]
+
+
 class HumanInLoopTool(BaseTool):
     """人类交互工具 - 挂起等待人类完成任务（异步，不阻塞服务器）"""
     
@@ -28,6 +62,7 @@ class HumanInLoopTool(BaseTool):
             instruction (str): 给人类的指令
             timeout (int, optional): 超时时间（秒），默认 None（无限等待）
         """
+        hil_id = future = None
         try:
             hil_id = parameters.get("hil_id")
             instruction = parameters.get("instruction")
@@ -47,49 +82,58 @@ class HumanInLoopTool(BaseTool):
                     "error": "instruction is required"
                 }
             
-            # 注册 HIL 任务
-            HIL_TASKS[hil_id] = {
-                "status": "waiting",
-                "instruction": instruction,
-                "task_id": task_id,
-                "result": None
-            }
-            
-            # 异步轮询等待完成
-            start_time = asyncio.get_event_loop().time()
-            check_interval = 2  # 每2秒检查一次
+            # 注册 HIL 任务（每个任务一个 Future，由 respond_hil_task 写入用户回复，无需轮询）
+            existing = HIL_TASKS.get(hil_id)
+            if existing is not None and existing["status"] == "waiting":
+                # 同名任务仍在等待（如中断恢复后重新调用）：共用同一个 Future，回复时所有等待方都返回
+                future = existing["future"]
+                existing["waiters"] += 1
+            else:
+                loop = asyncio.get_running_loop()
+                future = loop.create_future()
+                _register_hil_task(hil_id, {
+                    "status": "waiting",
+                    "instruction": instruction,
+                    "task_id": task_id,
+                    "result": None,
+                    "future": future,
+                    "loop": loop,
+                    "waiters": 1
+                })
             
-            while True:
-                # 检查是否超时
-                if timeout is not None:
-                    elapsed = asyncio.get_event_loop().time() - start_time
-                    if elapsed > timeout:
-                        HIL_TASKS[hil_id]["status"] = "timeout"
-                        return {
-                            "status": "error",
-                            "output": "",
-                            "error": f"Human task timeout ({timeout}s)"
-                        }
-                
-                # 检查任务状态
+            # 异步等待完成（不阻塞服务器，timeout 为 None 时无限等待）
+            # shield：单个等待方超时不会取消其他等待方共用的 Future
+            try:
+                result = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+            except asyncio.TimeoutError:
                 task = HIL_TASKS.get(hil_id)
-                if task and task["status"] == "completed":
-                    result = task.get("result", "任务已完成")
-                    # 清理任务
-                    del HIL_TASKS[hil_id]
-                    return {
-                        "status": "success",
-                        "output": f": 用户回复：{result}",
-                        "error": ""
-                    }
-                
-                # 异步等待（不阻塞服务器）
-                await asyncio.sleep(check_interval)
+                if task is not None and task["future"] is future:
+                    task["waiters"] -= 1
+                    if task["waiters"] <= 0:
+                        task["status"] = "timeout"
+                        task["finished_at"] = time.monotonic()
+                return {
+                    "status": "error",
+                    "output": "",
+                    "error": f"Human task timeout ({timeout}s)"
+                }
+            
+            # 清理任务（仅移除本次注册的条目，同名新任务不受影响）
+            if HIL_TASKS.get(hil_id, {}).get("future") is future:
+                del HIL_TASKS[hil_id]
+            return {
+                "status": "success",
+                "output": f": 用户回复：{result}",
+                "error": ""
+            }
                 
+        except asyncio.CancelledError:
+            # 等待方被取消（如请求断开）：最后一个等待方离开时移除本次注册的任务，避免残留
+            _leave_hil_task(hil_id, future)
+            raise
         except Exception as e:
-            # 清理任务
-            if hil_id in HIL_TASKS:
-                del HIL_TASKS[hil_id]
+            # 清理任务（同上，只处理本次注册的条目）
+            _leave_hil_task(hil_id, future)
             return {
                 "status": "error",
                 "output": "",
@@ -97,6 +141,24 @@ class HumanInLoopTool(BaseTool):
             }
 
 
+def _resolve_hil_future(future: asyncio.Future, response: str):
+    """在事件循环线程中写入用户回复（已超时取消或已回复过的 Future 忽略）"""
+    if not future.done():
+        future.set_result(response)
+
+
+def _wake_hil_waiter(task: Dict[str, Any], response: str):
+    """唤醒等待中的 execute_async（可能从其他线程调用，经事件循环线程安全地完成 Future）"""
+    future = task.get("future")
+    loop = task.get("loop")
+    if future is None or loop is None:
+        return
+    try:
+        loop.call_soon_threadsafe(_resolve_hil_future, future, response)
+    except RuntimeError:
+        pass  # 事件循环已关闭，等待方已不存在
+
+
 def get_hil_status(hil_id: str) -> Dict[str, Any]:
     """获取 HIL 任务状态"""
     task = HIL_TASKS.get(hil_id)
@@ -125,8 +187,10 @@ def respond_hil_task(hil_id: str, response: str) -> Dict[str, Any]:
         }
     
     # 标记为完成，并保存用户响应
-    HIL_TASKS[hil_id]["status"] = "completed"
-    HIL_TASKS[hil_id]["result"] = response
+    task["status"] = "completed"
+    task["result"] = response
+    task["finished_at"] = time.monotonic()
+    _wake_hil_waiter(task, response)
     
     return {
         "success": True,
@@ -137,7 +201,8 @@ def respond_hil_task(hil_id: str, response: str) -> Dict[str, Any]:
 def list_hil_tasks() -> Dict[str, Any]:
     """列出所有 HIL 任务"""
     tasks = []
-    for hil_id, task in HIL_TASKS.items():
+    # 先取快照，避免遍历期间其他协程/线程增删任务
+    for hil_id, task in list(HIL_TASKS.items()):
         tasks.append({
             "hil_id": hil_id,
             "status": task["status"],
@@ -153,7 +218,7 @@ def list_hil_tasks() -> Dict[str, Any]:
 
 def get_hil_task_for_workspace(task_id: str) -> Dict[str, Any]:
     """获取指定 workspace 的 HIL 任务（如果有）"""
-    for hil_id, task in HIL_TASKS.items():
+    for hil_id, task in list(HIL_TASKS.items()):
         if task["task_id"] == task_id and task["status"] == "waiting":
             return {
                 "found": True,
@@ -226,7 +291,7 @@ def respond_tool_confirmation(confirm_id: str, approved: bool) -> Dict[str, Any]
 
 def get_tool_confirmation_for_workspace(task_id: str) -> Dict[str, Any]:
     """获取指定 workspace 的工具确认请求（如果有）"""
-    for confirm_id, confirmation in TOOL_CONFIRMATIONS.items():
+    for confirm_id, confirmation in list(TOOL_CONFIRMATIONS.items()):
         if confirmation["task_id"] == task_id and confirmation["status"] == "waiting":
             return {
                 "found": True,
@@ -244,7 +309,7 @@ def get_tool_confirmation_for_workspace(task_id: str) -> Dict[str, Any]:
 def list_tool_confirmations() -> Dict[str, Any]:
     """列出所有工具确认请求"""
     confirmations = []
-    for confirm_id, confirmation in TOOL_CONFIRMATIONS.items():
+    for confirm_id, confirmation in list(TOOL_CONFIRMATIONS.items()):
         confirmations.append({
             "confirm_id": confirm_id,
             "status": confirmation["status"],
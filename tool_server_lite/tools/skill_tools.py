@@ -4,13 +4,84 @@
 Skill 部署工具 - 将 skill 从全局仓库复制到 workspace
 """
 
+import os
+import re
 import shutil
+import threading
+import uuid
 from pathlib import Path
-from typing import Dict, Any
+from typing import Dict, Any, List
 
 from .file_tools import BaseTool, get_abs_path
 
 
+def _list_available_skills(skills_library: Path) -> List[str]:
+    """列出包含 SKILL.md 的 skill 文件夹名称（与 load_skill 接受的 skill 一致；仅在未找到 skill 时调用，不缓存）"""
+    try:
+        with os.scandir(skills_library) as entries:
+            return sorted(
+                entry.name for entry in entries
+                if entry.is_dir() and os.path.exists(os.path.join(entry.path, "SKILL.md"))
+            )
+    except OSError:
+        return []
+
+
+# _discard_dir 改名后待删除的目录名（.{skill_name}.old-{8 位 hex}）
+_TRASH_DIR_RE = re.compile(r"\..+\.old-[0-9a-f]{8}")
+
+
+def _rmtree_all(paths: List[str]):
+    """逐个删除目录（忽略错误，可能已被其他清理线程删除）"""
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _discard_dir(path: Path):
+    """
+    移除旧的部署目录：先改名让出原路径，再在后台线程删除（删除耗时不计入本次调用）；
+    改名失败（如 Windows 上文件被占用）时同步删除。
+    同时清理同级目录中之前遗留的改名目录（进程在后台删除完成前退出时会残留）
+    """
+    if path.exists():
+        trash = path.with_name(f".{path.name}.old-{uuid.uuid4().hex[:8]}")
+        try:
+            path.rename(trash)
+        except OSError:
+            shutil.rmtree(path)
+    
+    try:
+        with os.scandir(path.parent) as entries:
+            trash_dirs = [
+                entry.path for entry in entries
+                if _TRASH_DIR_RE.fullmatch(entry.name) and entry.is_dir(follow_symlinks=False)
+            ]
+    except OSError:
+        return
+    if trash_dirs:
+        threading.Thread(target=_rmtree_all, args=(trash_dirs,), daemon=True).start()
+
+
+def _scan_skill_tree(root: str, parts: List[str], prefix: str = "") -> int:
+    """
+    一次 scandir 遍历 skill 目录，结构行直接追加到 parts（子目录共用同一列表，不做合并复制），返回文件数
+    （顺序与 sorted(rglob("*")) 一致：目录在前、其内容紧随其后）
+    """
+    file_count = 0
+    with os.scandir(root) as it:
+        entries = sorted(it, key=lambda e: e.name)
+    append = parts.append
+    for entry in entries:
+        rel = f"{prefix}{entry.name}"
+        if entry.is_dir():
+            append(f"  [dir] {rel}/")
+            file_count += _scan_skill_tree(entry.path, parts, f"{rel}/")
+        else:
+            append(f"  [file] {rel} ({entry.stat().st_size / 1024:.1f}KB)")
+            file_count += 1
+    return file_count
+
+
 class LoadSkillTool(BaseTool):
     """
     Skill 部署工具 - 将指定 skill 从 ~/.mla_v3/skills_library/ 复制到 workspace/.skills/
@@ -50,11 +121,7 @@ class LoadSkillTool(BaseTool):
             
             if not source_dir.is_dir() or not source_skill_md.exists():
                 # 列出可用的 skills
-                available = []
-                if self.skills_library.exists():
-                    for d in sorted(self.skills_library.iterdir()):
-                        if d.is_dir() and (d / "SKILL.md").exists():
-                            available.append(d.name)
+                available = _list_available_skills(self.skills_library)
                 
                 available_str = ", ".join(available) if available else "（无可用 skill）"
                 return {
@@ -66,25 +133,15 @@ class LoadSkillTool(BaseTool):
             # 目标路径：workspace/.skills/{skill_name}/
             target_dir = get_abs_path(task_id, f".skills/{skill_name}")
             
-            # 如果已存在，先删除（更新部署）
-            if target_dir.exists():
-                shutil.rmtree(target_dir)
+            # 如果已存在，先删除（更新部署），并清理之前遗留的待删除目录
+            _discard_dir(target_dir)
             
             # 复制整个 skill 文件夹
             shutil.copytree(source_dir, target_dir)
             
-            # 统计复制的文件
-            file_count = sum(1 for _ in target_dir.rglob("*") if _.is_file())
-            
-            # 列出 skill 内容结构
+            # 统计文件并列出 skill 内容结构（单次遍历，复制后的目录与源目录一致）
             structure_parts = []
-            for item in sorted(target_dir.rglob("*")):
-                rel = item.relative_to(target_dir)
-                if item.is_dir():
-                    structure_parts.append(f"  [dir] {rel}/")
-                else:
-                    size_kb = item.stat().st_size / 1024
-                    structure_parts.append(f"  [file] {rel} ({size_kb:.1f}KB)")
+            file_count = _scan_skill_tree(str(source_dir), structure_parts)
             
             structure_str = "\n".join(structure_parts) if structure_parts else "  (空)"
             
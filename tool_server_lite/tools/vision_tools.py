@@ -5,10 +5,34 @@ Vision分析工具 - 图片内容分析 & 图片读取（多模态支持）
 """
 
 import base64
+import binascii
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, Any
 
 from .file_tools import BaseTool, get_abs_path
+from .web_tools import _SESSION, DOWNLOAD_CHUNK_SIZE
+
+try:
+    import pybase64  # SIMD 加速的 base64（可选，缺失时使用标准库）
+    HAS_PYBASE64 = True
+except ImportError:
+    HAS_PYBASE64 = False
+
+
+def _b64encode_str(data) -> str:
+    """base64 编码为 str（接受 bytes 或 memoryview）"""
+    if HAS_PYBASE64:
+        return pybase64.b64encode_as_string(data)  # 直接得到 str，省去 bytes→str 的解码拷贝
+    return binascii.b2a_base64(data, newline=False).decode('ascii')
+
+
+def _b64decode(data: str) -> bytes:
+    """base64 解码"""
+    if HAS_PYBASE64:
+        return pybase64.b64decode(data)
+    return base64.b64decode(data)
+
 
 # 导入llm_client_lite
 import sys
@@ -20,6 +44,36 @@ if parent_dir not in sys.path:
 from llm_client_lite import get_llm_client
 
 
+def _download_image(url: str, save_path: Path) -> str:
+    """流式下载生成的图片到 save_path，成功返回空字符串，失败返回错误信息"""
+    # 流式写入，不在内存中缓存整张图片
+    with _SESSION.get(url, timeout=30, stream=True) as response:
+        if response.status_code != 200:
+            return f"下载生成的图片失败: HTTP {response.status_code}"
+        with open(save_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                f.write(chunk)
+    return ""
+
+
+# 图片扩展名 → MIME 类型（PIL 不可用时直接发送原图）
+_MIME_TYPES = {
+    '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+    '.png': 'image/png', '.gif': 'image/gif',
+    '.webp': 'image/webp', '.bmp': 'image/bmp'
+}
+
+# 多图片压缩共享线程池
+_IMAGE_POOL = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 4), thread_name_prefix="image-compress")
+
+# text-only 模式多图片 Vision LLM 并发请求线程池（并发数较小，避免触发 API 限流）
+_VISION_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vision-query")
+
+# llm_config.yaml 中 multimodal 配置的缓存（文件 mtime/大小变化时重新解析）
+_LLM_CONFIG_PATH = Path(__file__).parent.parent.parent / "config" / "run_env_config" / "llm_config.yaml"
+_MULTIMODAL_CACHE = {"signature": None, "value": False}
+
+
 class ImageReadTool(BaseTool):
     """
     图片读取工具 - 支持双模式：
@@ -35,17 +89,25 @@ class ImageReadTool(BaseTool):
     
     @property
     def multimodal(self) -> bool:
-        """从 llm_config.yaml 读取 multimodal 配置（每次读取，不缓存，确保配置修改后即时生效）"""
+        """从 llm_config.yaml 读取 multimodal 配置（按文件 mtime/大小缓存，配置修改后即时生效）"""
         try:
-            import yaml
-            config_path = Path(__file__).parent.parent.parent / "config" / "run_env_config" / "llm_config.yaml"
-            if config_path.exists():
-                with open(config_path, 'r', encoding='utf-8') as f:
-                    config = yaml.safe_load(f)
-                return config.get("multimodal", False)
-        except Exception:
-            pass
-        return False
+            stat = _LLM_CONFIG_PATH.stat()
+        except OSError:
+            return False
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if _MULTIMODAL_CACHE["signature"] != signature:
+            value = False
+            try:
+                import yaml
+                # 优先使用 LibYAML 的 C 解析器（未编译 LibYAML 时回退到纯 Python 的 SafeLoader）
+                loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+                with open(_LLM_CONFIG_PATH, 'r', encoding='utf-8') as f:
+                    config = yaml.load(f, Loader=loader)
+                value = config.get("multimodal", False)
+            except Exception:
+                pass
+            _MULTIMODAL_CACHE.update(signature=signature, value=value)
+        return _MULTIMODAL_CACHE["value"]
     
     def execute(self, task_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -94,14 +156,31 @@ class ImageReadTool(BaseTool):
             if self.multimodal:
                 return self._execute_multimodal_batch(abs_paths, query)
             else:
-                # text-only 模式：逐张分析（每张都调用 Vision LLM）
+                # text-only 模式：每张都调用 Vision LLM
+                if len(abs_paths) == 1:
+                    abs_p, rel_p = abs_paths[0]
+                    results = [self._execute_text_only(abs_p, rel_p, query, task_id, save_path)]
+                else:
+                    # 多张图片并发请求（各请求相互独立）；结果按顺序在当前线程保存，与逐张执行时一致
+                    results = list(_VISION_POOL.map(
+                        lambda item: self._execute_text_only(item[0], item[1], query, task_id),
+                        abs_paths
+                    ))
+                
                 all_results = []
-                for abs_p, rel_p in abs_paths:
-                    result = self._execute_text_only(abs_p, rel_p, query, task_id, save_path)
+                for (abs_p, rel_p), result in zip(abs_paths, results):
                     if result["status"] == "error":
                         return result
                     all_results.append(f"[{rel_p}]\n{result['output']}")
                 
+                if save_path and len(abs_paths) > 1:
+                    # 逐张执行时每张都写入 save_path，最终保留的是最后一张的结果
+                    abs_save_path = get_abs_path(task_id, save_path)
+                    abs_save_path.parent.mkdir(parents=True, exist_ok=True)
+                    with open(abs_save_path, 'w', encoding='utf-8') as f:
+                        f.write(results[-1]["output"])
+                    all_results = [f"[{rel_p}]\n结果保存在 {save_path}" for _, rel_p in abs_paths]
+                
                 return {
                     "status": "success",
                     "output": "\n\n".join(all_results),
@@ -131,14 +210,24 @@ class ImageReadTool(BaseTool):
             img = Image.open(abs_image_path)
             original_size = img.size
             
-            # 转换色彩模式
-            if img.mode in ('RGBA', 'P', 'LA'):
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                img = background
-            elif img.mode != 'RGB':
+            # 已满足尺寸与体积限制的 JPEG 直接使用原始字节（Image.open 只解析文件头，跳过解码与重新编码）
+            if (img.format == 'JPEG' and img.mode in ('RGB', 'L')
+                    and max(original_size) <= self.MAX_IMAGE_DIMENSION
+                    and abs_image_path.stat().st_size <= self.MAX_IMAGE_BYTES):
+                with open(abs_image_path, 'rb') as f:
+                    image_data = f.read()
+                data_uri = f"data:image/jpeg;base64,{_b64encode_str(image_data)}"
+                info = f"{original_size[0]}x{original_size[1]}, {len(image_data) / 1024:.0f}KB"
+                return data_uri, info
+            
+            # JPEG 在解码阶段按 1/2、1/4、1/8 缩小（结果仍不小于目标尺寸，其他格式无操作），减少解码与缩放的像素量
+            img.draft('RGB', (self.MAX_IMAGE_DIMENSION, self.MAX_IMAGE_DIMENSION))
+            
+            # 转换色彩模式（带透明通道的图片保留 alpha，缩放后再铺白底，减少合成的像素量；
+            # 调色板图需先转 RGBA，否则缩放只能用最近邻）
+            if img.mode == 'P':
+                img = img.convert('RGBA')
+            elif img.mode not in ('RGB', 'RGBA', 'LA'):
                 img = img.convert('RGB')
             
             # 缩放
@@ -152,28 +241,39 @@ class ImageReadTool(BaseTool):
                 else:
                     new_height = max_dim
                     new_width = int(width * max_dim / height)
-                img = img.resize((new_width, new_height), Image.LANCZOS)
+                # BICUBIC 缩小时同样做抗锯齿，文字清晰度与 LANCZOS 接近，耗时约少 30%
+                img = img.resize((new_width, new_height), Image.BICUBIC)
                 resized = True
             
+            # 透明部分铺白底
+            if img.mode in ('RGBA', 'LA'):
+                background = Image.new('RGB', img.size, (255, 255, 255))
+                background.paste(img, mask=img.getchannel('A') if img.mode == 'RGBA' else None)
+                img = background
+            
             # 编码为 JPEG
+            # 不启用 optimize（额外一遍 Huffman 优化约使编码耗时翻 3 倍，体积仅减小约 5%）
             buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=self.JPEG_QUALITY, optimize=True)
-            image_data = buffer.getvalue()
+            img.save(buffer, format='JPEG', quality=self.JPEG_QUALITY)
+            image_bytes = buffer.tell()  # 写入位置即编码后的字节数
             
-            # 二次压缩
-            if len(image_data) > self.MAX_IMAGE_BYTES:
+            # 二次压缩（复用同一缓冲区）
+            if image_bytes > self.MAX_IMAGE_BYTES:
                 for quality in [70, 55, 40]:
-                    buffer = io.BytesIO()
-                    img.save(buffer, format='JPEG', quality=quality, optimize=True)
-                    image_data = buffer.getvalue()
-                    if len(image_data) <= self.MAX_IMAGE_BYTES:
+                    buffer.seek(0)
+                    buffer.truncate()
+                    img.save(buffer, format='JPEG', quality=quality)
+                    image_bytes = buffer.tell()
+                    if image_bytes <= self.MAX_IMAGE_BYTES:
                         break
             
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
+            # 直接从缓冲区视图编码 base64（不经 getvalue 复制整段 JPEG 数据）
+            with buffer.getbuffer() as view:
+                image_base64 = _b64encode_str(view)
             data_uri = f"data:image/jpeg;base64,{image_base64}"
             
             final_size = img.size
-            size_kb = len(image_data) / 1024
+            size_kb = image_bytes / 1024
             resize_info = f", resized from {original_size} to {final_size}" if resized else ""
             info = f"{final_size[0]}x{final_size[1]}, {size_kb:.0f}KB{resize_info}"
             
@@ -183,14 +283,8 @@ class ImageReadTool(BaseTool):
             # PIL 不可用，直接读取
             with open(abs_image_path, 'rb') as f:
                 image_data = f.read()
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
-            suffix = abs_image_path.suffix.lower()
-            mime_types = {
-                '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-                '.png': 'image/png', '.gif': 'image/gif',
-                '.webp': 'image/webp', '.bmp': 'image/bmp'
-            }
-            mime_type = mime_types.get(suffix, 'image/jpeg')
+            image_base64 = _b64encode_str(image_data)
+            mime_type = _MIME_TYPES.get(abs_image_path.suffix.lower(), 'image/jpeg')
             data_uri = f"data:{mime_type};base64,{image_base64}"
             size_kb = len(image_data) / 1024
             return data_uri, f"{size_kb:.0f}KB, no compression"
@@ -204,13 +298,15 @@ class ImageReadTool(BaseTool):
             query: 用户查询
         """
         try:
-            data_uri_list = []
-            output_parts = []
+            # 各图片的解码/缩放/编码互相独立（PIL 在 C 层释放 GIL），多张时并发压缩，结果保持原顺序
+            image_paths = [abs_p for abs_p, _ in abs_paths]
+            if len(image_paths) > 1:
+                compressed = list(_IMAGE_POOL.map(self._compress_single_image, image_paths))
+            else:
+                compressed = [self._compress_single_image(p) for p in image_paths]
             
-            for abs_p, rel_p in abs_paths:
-                data_uri, info = self._compress_single_image(abs_p)
-                data_uri_list.append(data_uri)
-                output_parts.append(f"{rel_p} ({info})")
+            data_uri_list = [data_uri for data_uri, _ in compressed]
+            output_parts = [f"{rel_p} ({info})" for (_, rel_p), (_, info) in zip(abs_paths, compressed)]
             
             output_msg = f"Loaded {len(data_uri_list)} image(s) in multimodal mode: {'; '.join(output_parts)}. Images are embedded in the conversation."
             
@@ -411,12 +507,12 @@ class CreateImageTool(BaseTool):
                     n=n
                 )
                 
-                import requests
-                import base64
-                
                 # 处理返回结果（URL 或 Base64）
                 results_to_save = [result_data] if isinstance(result_data, str) else result_data
                 
+                # 先确定每个结果的保存路径，并区分 URL / Base64
+                url_jobs = []
+                b64_jobs = []
                 for idx, result in enumerate(results_to_save):
                     # 确定保存路径
                     if idx == 0:
@@ -428,26 +524,34 @@ class CreateImageTool(BaseTool):
                         save_path = abs_save_path.parent / f"{stem}_{idx}{suffix}"
                     
                     if result.startswith('http'):
-                        # 下载图片
-                        response = requests.get(result, timeout=30)
-                        if response.status_code == 200:
-                            with open(save_path, 'wb') as f:
-                                f.write(response.content)
-                        else:
-                            return {
-                                "status": "error",
-                                "output": "",
-                                "error": f"下载生成的图片失败: HTTP {response.status_code}"
-                            }
+                        url_jobs.append((result, save_path))
                     else:
-                        # Base64 数据
-                        # 有可能带 data:image/png;base64, 前缀，需要处理
-                        if "," in result:
-                            result = result.split(",")[1]
-                        
-                        image_content = base64.b64decode(result)
-                        with open(save_path, 'wb') as f:
-                            f.write(image_content)
+                        b64_jobs.append((result, save_path))
+                
+                # URL 结果并发下载（I/O 密集）
+                if len(url_jobs) > 1:
+                    with ThreadPoolExecutor(max_workers=min(len(url_jobs), 8)) as executor:
+                        download_errors = list(executor.map(lambda job: _download_image(*job), url_jobs))
+                else:
+                    download_errors = [_download_image(*job) for job in url_jobs]
+                
+                for error in download_errors:
+                    if error:
+                        return {
+                            "status": "error",
+                            "output": "",
+                            "error": error
+                        }
+                
+                # Base64 结果在当前线程解码写入
+                for result, save_path in b64_jobs:
+                    # 有可能带 data:image/png;base64, 前缀，需要处理
+                    if "," in result:
+                        result = result.split(",")[1]
+                    
+                    image_content = _b64decode(result)
+                    with open(save_path, 'wb') as f:
+                        f.write(image_content)
                 
                 # 构建输出消息
                 if len(results_to_save) == 1:
@@ -8,7 +8,10 @@ from pathlib import Path
 from typing import Dict, Any
 import asyncio
 import re
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from urllib.parse import urlencode
 from .file_tools import BaseTool, get_abs_path
 
@@ -30,6 +33,143 @@ except ImportError:
     except ImportError:
         DDGS_AVAILABLE = False
 
+# 每个线程复用一个 DDGS 客户端（搜索引擎实例及其 HTTP 会话缓存在 DDGS 实例内）
+_DDGS_LOCAL = threading.local()
+
+
+def _get_ddgs():
+    """获取当前线程复用的 DDGS 客户端"""
+    client = getattr(_DDGS_LOCAL, "client", None)
+    if client is None:
+        client = _DDGS_LOCAL.client = DDGS()
+    return client
+
+
+# Markdown 图片标记（网页内容不可信，优先用 RE2 保证线性时间匹配，避免回溯退化）
+_IMG_MD_PATTERN = r"!\[[^\]]*\]\([^)]+\)"
+try:
+    import re2
+    _IMG_MD_RE = re2.compile(_IMG_MD_PATTERN)
+except ImportError:
+    _IMG_MD_RE = re.compile(_IMG_MD_PATTERN)
+
+# 保存文件名中查询词的清理规则
+_QUERY_UNSAFE_RE = re.compile(r'[^\w\s-]')
+_QUERY_SEPARATOR_RE = re.compile(r'[-\s]+')
+# ASCII 查询词的删除表（与 [^\w\s-] 在 ASCII 范围内等价，str.translate 单次 C 层过滤）
+_QUERY_ASCII_DELETE = str.maketrans('', '', ''.join(
+    ch for ch in map(chr, range(128))
+    if not (ch.isalnum() or ch.isspace() or ch in '_-')
+))
+
+
+def _safe_query_name(query: str) -> str:
+    """将搜索关键词转换为可用于文件名的片段（最长 50 个字符）"""
+    if query.isascii():
+        safe_query = query.translate(_QUERY_ASCII_DELETE).strip()
+    else:
+        # 非 ASCII（如中文）保留 Unicode 单词字符
+        safe_query = _QUERY_UNSAFE_RE.sub('', query).strip()
+    return _QUERY_SEPARATOR_RE.sub('_', safe_query)[:50]
+
+# 文件下载时每次读取/写入的块大小（网络到磁盘，较大的块可减少系统调用次数）
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 下载共用的 HTTP 会话（连接池 + keep-alive，避免每次下载重新握手 TCP/TLS）
+_SESSION = requests.Session()
+_HTTP_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+)
+_SESSION.mount("http://", _HTTP_ADAPTER)
+_SESSION.mount("https://", _HTTP_ADAPTER)
+
+# 谷歌学术多页搜索时同时在途的最大页数
+SCHOLAR_MAX_CONCURRENT_PAGES = 3
+
+
+def _write_text_file(path: Path, text: str) -> None:
+    """创建父目录并写入文本文件（供异步工具在线程中调用）"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+# 跨调用复用的 crawl4ai 爬虫（首次使用时启动浏览器，服务关闭时释放）
+_CRAWLER_SINGLETON = None
+_CRAWLER_LOCK = None  # asyncio.Lock，在事件循环内惰性创建（Python 3.9 下 Lock 创建时即绑定事件循环）
+
+
+def _crawler_lock() -> asyncio.Lock:
+    """获取保护共享爬虫初始化/关闭的锁"""
+    global _CRAWLER_LOCK
+    if _CRAWLER_LOCK is None:
+        _CRAWLER_LOCK = asyncio.Lock()
+    return _CRAWLER_LOCK
+
+
+async def _get_crawler():
+    """获取共享的 AsyncWebCrawler，首次调用时启动浏览器"""
+    global _CRAWLER_SINGLETON
+    if _CRAWLER_SINGLETON is not None:
+        return _CRAWLER_SINGLETON
+    
+    async with _crawler_lock():
+        # 并发初始化时只启动一次
+        if _CRAWLER_SINGLETON is None:
+            crawler = AsyncWebCrawler(config=BrowserConfig(headless=True, verbose=False))
+            await crawler.__aenter__()
+            _CRAWLER_SINGLETON = crawler
+    return _CRAWLER_SINGLETON
+
+
+async def close_crawler():
+    """关闭共享的 AsyncWebCrawler（服务关闭时调用，下次使用会重新启动）"""
+    global _CRAWLER_SINGLETON
+    async with _crawler_lock():
+        crawler, _CRAWLER_SINGLETON = _CRAWLER_SINGLETON, None
+        if crawler is not None:
+            try:
+                await crawler.__aexit__(None, None, None)
+            except Exception:
+                pass
+
+
+def _crawler_is_alive(crawler) -> bool:
+    """判断爬虫的浏览器是否仍可用（无法判断时视为可用）"""
+    manager = getattr(getattr(crawler, "crawler_strategy", None), "browser_manager", None)
+    if manager is None:
+        return True
+    browser = getattr(manager, "browser", None)
+    if browser is None:
+        # persistent context 模式没有单独的 Browser；两者都为空说明已关闭
+        return getattr(manager, "default_context", None) is not None
+    try:
+        return browser.is_connected()
+    except Exception:
+        return True
+
+
+async def _recycle_crawler_if_dead(crawler):
+    """
+    爬取出错后调用：仅当浏览器确实已失效时才丢弃该共享实例（下次调用重新启动）
+    
+    单个 URL 失败不会关闭仍在使用中的浏览器（其他并发爬取共享同一实例）；
+    只关闭出错的那个实例，不影响其他调用已重新启动的新实例。
+    """
+    global _CRAWLER_SINGLETON
+    if _crawler_is_alive(crawler):
+        return
+    async with _crawler_lock():
+        if _CRAWLER_SINGLETON is not crawler:
+            return
+        _CRAWLER_SINGLETON = None
+        try:
+            await crawler.__aexit__(None, None, None)
+        except Exception:
+            pass
+
 
 class CrawlPageTool(BaseTool):
     """网页爬取工具 - 使用 crawl4ai"""
@@ -68,15 +208,13 @@ class CrawlPageTool(BaseTool):
             # 处理图片
             if not download_images:
                 # 移除图片标记
-                markdown_text = re.sub(r"!\[[^\]]*\]\([^\)]+\)", "", markdown_text)
+                markdown_text = _IMG_MD_RE.sub("", markdown_text)
             
             # 保存到文件
             if save_path:
                 abs_save_path = get_abs_path(task_id, save_path)
-                abs_save_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(abs_save_path, 'w', encoding='utf-8') as f:
-                    f.write(markdown_text)
+                # 在线程中写入，避免大文本写盘阻塞事件循环
+                await asyncio.to_thread(_write_text_file, abs_save_path, markdown_text)
                 
                 output = f"结果保存在 {save_path}"
             else:
@@ -97,18 +235,21 @@ class CrawlPageTool(BaseTool):
     
     async def _crawl_page(self, url: str) -> str:
         """使用 crawl4ai 爬取页面"""
-        browser_conf = BrowserConfig(headless=True, verbose=False)
         run_conf = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
         
-        async with AsyncWebCrawler(config=browser_conf) as crawler:
+        crawler = await _get_crawler()
+        try:
             result = await crawler.arun(url, config=run_conf)
-            
-            markdown_attr = getattr(result, "markdown", None)
-            if markdown_attr is None:
-                raise Exception("Unable to extract markdown from crawl result")
-            
-            markdown_text = getattr(markdown_attr, "raw_markdown", None) or str(markdown_attr)
-            return markdown_text
+        except Exception:
+            await _recycle_crawler_if_dead(crawler)
+            raise
+        
+        markdown_attr = getattr(result, "markdown", None)
+        if markdown_attr is None:
+            raise Exception("Unable to extract markdown from crawl result")
+        
+        markdown_text = getattr(markdown_attr, "raw_markdown", None) or str(markdown_attr)
+        return markdown_text
 
 
 class GoogleScholarSearchTool(BaseTool):
@@ -154,8 +295,7 @@ class GoogleScholarSearchTool(BaseTool):
                 # 生成包含搜索参数的文件名
                 from pathlib import Path
                 save_path_obj = Path(save_path)
-                safe_query = re.sub(r'[^\w\s-]', '', query).strip()
-                safe_query = re.sub(r'[-\s]+', '_', safe_query)[:50]
+                safe_query = _safe_query_name(query)
                 
                 year_suffix = ""
                 if year_low or year_high:
@@ -165,10 +305,8 @@ class GoogleScholarSearchTool(BaseTool):
                 final_save_path = str(save_path_obj.parent / new_filename)
                 
                 abs_save_path = get_abs_path(task_id, final_save_path)
-                abs_save_path.parent.mkdir(parents=True, exist_ok=True)
-                
-                with open(abs_save_path, 'w', encoding='utf-8') as f:
-                    f.write(all_content)
+                # 在线程中写入，避免大文本写盘阻塞事件循环
+                await asyncio.to_thread(_write_text_file, abs_save_path, all_content)
                 
                 output = f"结果保存在 {final_save_path}"
             else:
@@ -192,34 +330,44 @@ class GoogleScholarSearchTool(BaseTool):
         base_url = "https://scholar.google.com/scholar"
         all_content = []
         
-        browser_conf = BrowserConfig(headless=True, verbose=False)
         run_conf = CrawlerRunConfig(cache_mode=CacheMode.BYPASS)
         
-        async with AsyncWebCrawler(config=browser_conf) as crawler:
-            for page in range(pages):
-                start = page * 10
-                
-                params = {
-                    "start": str(start),
-                    "q": query,
-                    "as_sdt": "0,5"
-                }
-                
-                if year_low:
-                    params["as_ylo"] = str(year_low)
-                if year_high:
-                    params["as_yhi"] = str(year_high)
-                
-                url = f"{base_url}?{urlencode(params)}"
-                
-                result = await crawler.arun(url, config=run_conf)
-                
-                markdown_attr = getattr(result, "markdown", None)
-                if markdown_attr:
-                    markdown_text = getattr(markdown_attr, "raw_markdown", None) or str(markdown_attr)
-                    # 移除图片
-                    markdown_text = re.sub(r"!\[[^\]]*\]\([^\)]+\)", "", markdown_text)
-                    all_content.append(f"--- Page {page + 1} ---\n{markdown_text}\n")
+        base_params = {
+            "q": query,
+            "as_sdt": "0,5"
+        }
+        if year_low:
+            base_params["as_ylo"] = str(year_low)
+        if year_high:
+            base_params["as_yhi"] = str(year_high)
+        
+        urls = [
+            f"{base_url}?{urlencode({'start': str(page * 10), **base_params})}"
+            for page in range(pages)
+        ]
+        
+        # 各页并发抓取，限制同时在途的请求数以降低被限流的风险
+        semaphore = asyncio.Semaphore(SCHOLAR_MAX_CONCURRENT_PAGES)
+        
+        async def crawl_one(url: str):
+            async with semaphore:
+                return await crawler.arun(url, config=run_conf)
+        
+        crawler = await _get_crawler()
+        try:
+            results = await asyncio.gather(*(crawl_one(url) for url in urls))
+        except Exception:
+            await _recycle_crawler_if_dead(crawler)
+            raise
+        
+        # 按页序组装结果
+        for page, result in enumerate(results):
+            markdown_attr = getattr(result, "markdown", None)
+            if markdown_attr:
+                markdown_text = getattr(markdown_attr, "raw_markdown", None) or str(markdown_attr)
+                # 移除图片
+                markdown_text = _IMG_MD_RE.sub("", markdown_text)
+                all_content.append(f"--- Page {page + 1} ---\n{markdown_text}\n")
         
         return '\n'.join(all_content)
 
@@ -256,7 +404,7 @@ class WebSearchTool(BaseTool):
                 }
             
             # 使用 DuckDuckGo 搜索
-            results = DDGS().text(query, max_results=max_results)
+            results = _get_ddgs().text(query, max_results=max_results)
             
             # 格式化为 Markdown
             results_md = []
@@ -279,8 +427,7 @@ class WebSearchTool(BaseTool):
                 # 生成包含搜索参数的文件名
                 from pathlib import Path
                 save_path_obj = Path(save_path)
-                safe_query = re.sub(r'[^\w\s-]', '', query).strip()
-                safe_query = re.sub(r'[-\s]+', '_', safe_query)[:50]  # 限制长度
+                safe_query = _safe_query_name(query)
                 
                 new_filename = f"{save_path_obj.stem}_{safe_query}_n{max_results}{save_path_obj.suffix}"
                 final_save_path = str(save_path_obj.parent / new_filename)
@@ -327,14 +474,14 @@ class FileDownloadTool(BaseTool):
             abs_save_path = get_abs_path(task_id, save_path)
             abs_save_path.parent.mkdir(parents=True, exist_ok=True)
             
-            # 下载文件
-            response = requests.get(url, stream=True, timeout=60)
-            response.raise_for_status()
-            
-            # 写入文件
-            with open(abs_save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
+            # 下载文件（流式写入）
+            with _SESSION.get(url, stream=True, timeout=60) as response:
+                response.raise_for_status()
+                
+                # 写入文件
+                with open(abs_save_path, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
             
             file_size = abs_save_path.stat().st_size
             size_mb = file_size / (1024 * 1024)
@@ -34,6 +34,7 @@ class ConfigLoader:
         # 加载所有配置
         self.general_prompts = self._load_general_prompts()
         self.all_tools = self._load_all_tools()
+        self._tool_config_cache: Dict[str, Dict] = {}  # 已处理 available_tool_level 的工具配置
         
     def _find_config_root(self) -> str:
         """查找配置根目录"""
@@ -87,6 +88,11 @@ class ConfigLoader:
         Returns:
             工具配置字典
         """
+        cached = self._tool_config_cache.get(tool_name)
+        if cached is not None:
+            # 返回浅拷贝，调用方修改不影响缓存
+            return cached.copy()
+        
         if tool_name not in self.all_tools:
             raise KeyError(f"工具 {tool_name} 不存在于配置中")
         
@@ -100,7 +106,8 @@ class ConfigLoader:
             config["available_tools"] = level_tools
             print(f"✅ 为{tool_name}自动生成工具列表（Level {tool_level}）: {len(level_tools)}个工具")
         
-        return config
+        self._tool_config_cache[tool_name] = config
+        return config.copy()
     
     def build_agent_system_prompt(self, agent_config: Dict) -> str:
         """
@@ -4,17 +4,59 @@
 配置管理工具
 """
 
+import os
+import re
+import stat
 import yaml
 import json
+from functools import lru_cache
 from pathlib import Path
 
+try:
+    from yaml import CSafeLoader as _YamlLoader, CDumper as _YamlDumper  # LibYAML C 解析/输出
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader, Dumper as _YamlDumper
 
+
+# 包内运行环境配置目录
+_CONFIG_ROOT = Path(__file__).parent.parent / "config" / "run_env_config"
+
+# set_config 值类型识别（整串匹配）
+_BOOL_RE = re.compile(r'(?i)true|false')
+_INT_RE = re.compile(r'\d+')
+_FLOAT_RE = re.compile(r'\d+\.\d*|\.\d+')
+
+
+@lru_cache(maxsize=16)
 def get_config_path(config_name: str = "llm_config") -> Path:
     """获取配置文件路径（包内）"""
-    # 找到包的位置
-    module_path = Path(__file__).parent.parent
-    config_file = module_path / "config" / "run_env_config" / f"{config_name}.yaml"
-    return config_file
+    return _CONFIG_ROOT / f"{config_name}.yaml"
+
+
+@lru_cache(maxsize=256)
+def _coerce_scalar(value: str):
+    """命令行字符串 → bool / int / float；都不是时原样返回"""
+    if _BOOL_RE.fullmatch(value):
+        return value.lower() == 'true'
+    if _INT_RE.fullmatch(value):
+        return int(value)
+    if _FLOAT_RE.fullmatch(value):
+        return float(value)
+    return value
+
+
+def _coerce(value: str):
+    """尝试智能转换类型（列表每次新建，不进缓存，避免多次设置共享同一对象）"""
+    if value.startswith('[') and value.endswith(']'):
+        # 列表格式：尝试作为 JSON 解析
+        try:
+            # 首先尝试作为标准 JSON 数组解析
+            return json.loads(value)
+        except json.JSONDecodeError:
+            # 如果失败，按简单逗号分割处理
+            items = value[1:-1].split(',')
+            return [item.strip().strip('"').strip("'") for item in items if item.strip()]
+    return _coerce_scalar(value)
 
 
 def show_config(config_name: str = "llm_config"):
@@ -26,15 +68,15 @@ def show_config(config_name: str = "llm_config"):
         return
     
     with open(config_file, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f)
+        config = yaml.load(f, Loader=_YamlLoader)
     
     print(f"\n📋 配置文件: {config_file}")
     print(f"{'='*80}")
-    print(yaml.dump(config, allow_unicode=True, default_flow_style=False))
+    print(yaml.dump(config, Dumper=_YamlDumper, allow_unicode=True, default_flow_style=False))
     print(f"{'='*80}\n")
 
 
-def set_config(key: str, value: str, config_name: str = "llm_config"):
+def set_config(key: str, value: str, config_name: str = "llm_config", force: bool = False):
     """
     设置配置项
     
@@ -42,6 +84,7 @@ def set_config(key: str, value: str, config_name: str = "llm_config"):
         key: 配置键，支持点号分隔（如 llm.api_key）
         value: 配置值
         config_name: 配置文件名
+        force: 值未变化时也重写配置文件
     """
     config_file = get_config_path(config_name)
     
@@ -51,7 +94,7 @@ def set_config(key: str, value: str, config_name: str = "llm_config"):
     
     # 读取配置
     with open(config_file, 'r', encoding='utf-8') as f:
-        config = yaml.safe_load(f) or {}
+        config = yaml.load(f, Loader=_YamlLoader) or {}
     
     # 解析键路径
     keys = key.split('.')
@@ -64,29 +107,25 @@ def set_config(key: str, value: str, config_name: str = "llm_config"):
     
     # 设置值（尝试智能转换类型）
     final_key = keys[-1]
+    new_value = _coerce(value)
     
-    # 尝试转换类型
-    if value.lower() in ['true', 'false']:
-        current[final_key] = value.lower() == 'true'
-    elif value.isdigit():
-        current[final_key] = int(value)
-    elif value.replace('.', '', 1).isdigit():
-        current[final_key] = float(value)
-    elif value.startswith('[') and value.endswith(']'):
-        # 列表格式：尝试作为 JSON 解析
-        try:
-            # 首先尝试作为标准 JSON 数组解析
-            current[final_key] = json.loads(value)
-        except json.JSONDecodeError:
-            # 如果失败，按简单逗号分割处理
-            items = value[1:-1].split(',')
-            current[final_key] = [item.strip().strip('"').strip("'") for item in items if item.strip()]
-    else:
-        current[final_key] = value
+    # 值未变化时不重写文件（类型也需一致，如 1 与 True）
+    if not force and final_key in current:
+        old_value = current[final_key]
+        if type(old_value) is type(new_value) and old_value == new_value:
+            print(f"✓ 配置无变化: {key} = {new_value}")
+            print(f"   配置文件: {config_file}")
+            return
+    
+    current[final_key] = new_value
     
-    # 写回配置
-    with open(config_file, 'w', encoding='utf-8') as f:
-        yaml.dump(config, f, allow_unicode=True, default_flow_style=False, sort_keys=False)
+    # 写回配置（一次性生成 UTF-8 字节，写入临时文件后原子替换，避免中途失败留下残缺配置）
+    data = yaml.dump(config, Dumper=_YamlDumper, encoding='utf-8',
+                     allow_unicode=True, default_flow_style=False, sort_keys=False)
+    tmp_file = config_file.with_name(config_file.name + ".tmp")
+    tmp_file.write_bytes(data)
+    os.chmod(tmp_file, stat.S_IMODE(config_file.stat().st_mode))  # 保留原文件权限（配置中可能含 API key）
+    os.replace(tmp_file, config_file)
     
     print(f"✅ 配置已更新: {key} = {current[final_key]}")
     print(f"   配置文件: {config_file}")
@@ -5,12 +5,67 @@
 只保存action_history，不保存传统的user/assistant对话
 """
 
+import os
 import json
 import hashlib
 from pathlib import Path
 from typing import Dict, List
 from datetime import datetime
 
+from utils.json_fast import dumps_bytes
+
+
+def _dump_json_line(obj) -> bytes:
+    """序列化为一行 JSON（UTF-8 字节）"""
+    return dumps_bytes(obj) + b"\n"
+
+
+def load_action_history_fact(data: Dict, filepath: str) -> List[Dict]:
+    """
+    读取完整轨迹 action_history_fact
+    
+    新格式存放在追加写的 JSONL 文件中（只取前 action_history_fact_len 行，忽略崩溃时多写的行），
+    旧格式直接内嵌在主文件中
+    
+    Args:
+        data: 主文件内容
+        filepath: 主文件路径（JSONL 文件与其位于同一目录）
+    """
+    if "action_history_fact" in data:
+        return data.get("action_history_fact") or []
+    fact_file = data.get("action_history_fact_file")
+    if not fact_file:
+        return []
+    fact_len = data.get("action_history_fact_len", 0)
+    fact = []
+    with open(Path(filepath).with_name(fact_file), 'r', encoding='utf-8') as f:
+        for line in f:
+            if len(fact) >= fact_len:
+                break
+            fact.append(json.loads(line))
+    return fact
+
+
+def expand_action_history(data: Dict, filepath: str) -> List[Dict]:
+    """
+    还原文件中的 action_history
+    
+    与 action_history_fact 共享的条目在保存时写为 {"_fact_ref": 下标}，此处替换回
+    fact 中的同一对象（兼容不含引用的旧文件）
+    
+    Args:
+        data: 主文件内容
+        filepath: 主文件路径
+    """
+    action_history = data.get("action_history", [])
+    if not any(isinstance(action, dict) and "_fact_ref" in action for action in action_history):
+        return action_history
+    fact = load_action_history_fact(data, filepath)
+    return [
+        fact[action["_fact_ref"]] if isinstance(action, dict) and "_fact_ref" in action else action
+        for action in action_history
+    ]
+
 
 class ConversationStorage:
     """对话历史存储器"""
@@ -20,27 +75,38 @@ class ConversationStorage:
         self.conversations_dir = Path.home() / "mla_v3" / "conversations"
         self.conversations_dir.mkdir(parents=True, exist_ok=True)
         self.task_id = task_id
+        # 完整轨迹 JSONL 文件 -> 已写入的条目数（本进程内）
+        self._fact_persisted: Dict[str, int] = {}
     
     def _generate_filename(self, task_id: str, agent_id: str) -> str:
         """生成对话文件名：hash + 最后文件夹名 + agent_id"""
-        from pathlib import Path
-        import hashlib
-        
         task_hash = hashlib.md5(task_id.encode()).hexdigest()[:8]
         # 跨平台路径处理：检查是否是路径（包含/或\）
-        import os
         task_folder = Path(task_id).name if (os.sep in task_id or '/' in task_id or '\\' in task_id) else task_id
         task_name = f"{task_hash}_{task_folder}"
         
         return str(self.conversations_dir / f"{task_name}_{agent_id}_actions.json")
     
+    def get_fact_persisted(self, task_id: str, agent_id: str) -> int:
+        """
+        获取本进程内已写入完整轨迹 JSONL 的条目数
+        
+        Args:
+            task_id: 任务ID
+            agent_id: Agent ID
+        """
+        filepath = self._generate_filename(task_id, agent_id)
+        return self._fact_persisted.get(filepath[:-len(".json")] + "_fact.jsonl", 0)
+    
     def save_actions(self, task_id: str, agent_id: str, agent_name: str, 
                     task_input: str, action_history: List[Dict], current_turn: int,
                     latest_thinking: str = "", first_thinking_done: bool = False,
                     tool_call_counter: int = 0, system_prompt: str = "",
                     action_history_fact: List[Dict] = None,
                     pending_tools: List[Dict] = None,
-                    llm_turn_counter: int = 0):
+                    llm_turn_counter: int = 0,
+                    action_history_fact_offset: int = 0,
+                    knowledge_block: str = ""):
         """
         保存动作历史和完整状态
         
@@ -59,29 +125,65 @@ class ConversationStorage:
             action_history_fact: 完整动作轨迹（不含 base64 图片数据）
             pending_tools: 待执行的工具列表
             llm_turn_counter: LLM 调用轮次计数器（用于消息分组）
+            action_history_fact_offset: action_history_fact 之前已移出内存的条目数
+                                        （这些条目已写入 JSONL，传入的列表从该下标开始）
+            knowledge_block: compress_context 保留的关键信息（不随历史压缩丢失）
         """
         try:
             filepath = self._generate_filename(task_id, agent_id)
             
+            # 完整轨迹只来自 action_history_fact（为空时即为空轨迹）：action_history 中有不进入完整轨迹的条目
+            # （如 _no_tool_call），写入只追加的 JSONL 后会占用后续真实动作的位置
+            fact = action_history_fact or []
+            offset = action_history_fact_offset
+            fact_len = offset + len(fact)
+            
+            # 与完整轨迹共享的条目只写引用（下标为完整轨迹中的绝对位置），避免同一内容序列化两次
+            if fact:
+                fact_index = {id(action): offset + i for i, action in enumerate(fact)}
+                action_history = [
+                    {"_fact_ref": fact_index[id(action)]} if id(action) in fact_index else action
+                    for action in action_history
+                ]
+            
+            # 完整轨迹只增不改：追加写入 JSONL，每次只序列化新增条目
+            fact_filepath = filepath[:-len(".json")] + "_fact.jsonl"
+            persisted = self._fact_persisted.get(fact_filepath)
+            if persisted is None or persisted > fact_len or persisted < offset:
+                # 本进程首次写入或轨迹被重置：整体重写（前面的条目已不在内存中时无法重写）
+                if offset:
+                    raise ValueError(f"完整轨迹前 {offset} 条已移出内存，无法重写 {fact_filepath}")
+                with open(fact_filepath, 'wb') as f:
+                    f.writelines(_dump_json_line(action) for action in fact)
+            elif persisted < fact_len:
+                with open(fact_filepath, 'ab') as f:
+                    f.writelines(_dump_json_line(action) for action in fact[persisted - offset:])
+            self._fact_persisted[fact_filepath] = fact_len
+            
             data = {
                 "task_id": task_id,
                 "agent_id": agent_id,
                 "agent_name": agent_name,
                 "task_input": task_input,
                 "current_turn": current_turn,
-                "action_history": action_history,  # 含 base64 图片数据（用于 messages 重建）
-                "action_history_fact": action_history_fact if action_history_fact else action_history,  # 完整轨迹（不含 base64）
+                "action_history": action_history,  # 含 base64 图片数据（用于 messages 重建），共享条目为 _fact_ref 引用
+                "action_history_fact_file": Path(fact_filepath).name,  # 完整轨迹（不含 base64），追加写的 JSONL
+                "action_history_fact_len": fact_len,
                 "pending_tools": pending_tools if pending_tools else [],
                 "latest_thinking": latest_thinking,
                 "first_thinking_done": first_thinking_done,
                 "tool_call_counter": tool_call_counter,
                 "llm_turn_counter": llm_turn_counter,
+                "knowledge_block": knowledge_block,
                 "system_prompt": system_prompt,
                 "last_updated": datetime.now().isoformat()
             }
             
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # 先写临时文件再原子替换，避免并发读取到写了一半的文件
+            tmp_filepath = filepath + ".tmp"
+            with open(tmp_filepath, 'wb') as f:
+                f.write(dumps_bytes(data, indent=True))
+            os.replace(tmp_filepath, filepath)
         
         except Exception as e:
             print(f"⚠️ 保存对话历史失败: {e}")
@@ -105,6 +207,8 @@ class ConversationStorage:
             
             with open(filepath, 'r', encoding='utf-8') as f:
                 data = json.load(f)
+            data["action_history_fact"] = load_action_history_fact(data, filepath)
+            data["action_history"] = expand_action_history(data, filepath)
             
             print(f"📂 已加载动作历史: 第{data.get('current_turn', 0)}轮, {len(data.get('action_history', []))}个动作")
             return data
@@ -5,10 +5,16 @@ JSONL 事件输出工具 - 用于 VS Code 插件集成
 """
 
 import sys
-import json
 import time
 from typing import Dict, Any, Optional, List
 
+from utils.json_fast import dumps as json_dumps
+
+
+def _dump_event_line(event: Dict[str, Any]) -> str:
+    """序列化为一行 JSON"""
+    return json_dumps(event) + "\n"
+
 
 class EventEmitter:
     """JSONL 事件发射器"""
@@ -28,12 +34,9 @@ class EventEmitter:
             return
         
         # 直接写到原始 stdout（不受重定向影响）
-        if hasattr(sys, 'stdout_orig'):
-            sys.stdout_orig.write(json.dumps(event, ensure_ascii=False) + "\n")
-            sys.stdout_orig.flush()
-        else:
-            sys.stdout.write(json.dumps(event, ensure_ascii=False) + "\n")
-            sys.stdout.flush()
+        out = sys.stdout_orig if hasattr(sys, 'stdout_orig') else sys.stdout
+        out.write(_dump_event_line(event))
+        out.flush()
     
     def start(self, call_id: str, project: str, agent: str, task: str):
         """任务开始"""
@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 序列化工具 - 安装了 orjson 时优先使用，否则回退到标准库
+
+输出格式与 orjson 一致：非 ASCII 字符原样输出（等价于 ensure_ascii=False），
+不缩进时为紧凑格式，缩进时为 2 空格
+"""
+
+import json
+
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+
+
+def dumps_bytes(obj, indent: bool = False) -> bytes:
+    """序列化为 UTF-8 字节（适合直接写入二进制文件）"""
+    if HAS_ORJSON:
+        try:
+            option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0)
+            return orjson.dumps(obj, option=option)
+        except TypeError:
+            pass  # orjson 不支持的类型（如超出 64 位的整数）交给标准库处理
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+
+
+def dumps(obj, indent: bool = False) -> str:
+    """序列化为字符串"""
+    return dumps_bytes(obj, indent).decode("utf-8")
+
+
+def loads(text):
+    """反序列化（接受 str 或 bytes）"""
+    return orjson.loads(text) if HAS_ORJSON else json.loads(text)
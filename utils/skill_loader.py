@@ -9,14 +9,81 @@ Skill 加载器 - 遵循 Agent Skills 开放标准 (agentskills.io)
 3. 生成 <available_skills> XML 片段注入 system prompt
 """
 
-import yaml
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Union
+
+
+# skills_library 中不会是 skill 的目录名（隐藏目录另按 "." 前缀排除）
+_NON_SKILL_DIRS = frozenset({"__pycache__", "node_modules"})
+
+
+# frontmatter 快速解析：每行都是 `key: 单行纯字符串` 时逐行提取，无需 YAML 解析
+_SIMPLE_FIELD_RE = re.compile(r'([A-Za-z_][\w-]*): +(\S.*?) *')
+# YAML 会解析为布尔值 / null 的单词（这类值交给 YAML 解析器）
+_YAML_NON_STRING_WORDS = frozenset({"yes", "no", "true", "false", "on", "off", "null"})
+
+
+def _parse_simple_frontmatter(frontmatter_str: str) -> Optional[Dict]:
+    """
+    逐行解析只含单行纯字符串字段的 frontmatter
+    
+    Returns:
+        字段字典；含其他 YAML 语法（引号、多行、列表、注释、非字符串值等）时返回 None
+    """
+    fields = {}
+    for line in frontmatter_str.split('\n'):
+        if not line.strip(' '):
+            continue
+        match = _SIMPLE_FIELD_RE.fullmatch(line)
+        if not match:
+            return None
+        key, value = match.groups()
+        # 以字母开头可排除引号/列表/块标量/锚点/标签及数字、日期；冒号和 # 可能构成映射或注释
+        if (not value[0].isalpha() or ':' in value or '#' in value
+                or not value.isprintable() or value.lower() in _YAML_NON_STRING_WORDS):
+            return None
+        fields[key] = value
+    return fields
+
+
+# <available_skills> 片段模板（name / description 原样填入，与逐行拼接的输出一致）
+_SKILLS_XML_HEADER = "<available_skills>\n"
+# location 用相对于 workspace 的 .skills/ 路径（部署后的位置）
+_SKILL_XML_TEMPLATE = (
+    "  <skill>\n"
+    "    <name>{name}</name>\n"
+    "    <description>{description}</description>\n"
+    "    <location>.skills/{name}/SKILL.md</location>\n"
+    "  </skill>\n"
+)
+_SKILLS_XML_FOOTER = (
+    "</available_skills>\n"
+    "\n"
+    "提示：需要使用某个 skill 时，先调用 load_skill 工具将其部署到 workspace，然后使用 file_read 读取 SKILL.md 获取详细指令。"
+)
 
 
 class SkillLoader:
     """Skill 加载器"""
     
+    # 解析结果清单（位于 skills_library 根目录，按各 SKILL.md 的 mtime/大小校验）
+    MANIFEST_NAME = ".skills_manifest.json"
+    MANIFEST_VERSION = 2
+    
+    # frontmatter 分块读取大小与上限（字节数）
+    FRONTMATTER_READ_CHUNK = 4096
+    FRONTMATTER_MAX_BYTES = 32 * 1024
+    # 小于该大小的 SKILL.md 不可能包含有效 frontmatter，不打开直接跳过
+    SKILL_MD_MIN_BYTES = 8
+    
+    # 待解析的 SKILL.md 数量达到该值时并发解析
+    PARALLEL_PARSE_MIN = 4
+    
     def __init__(self, skills_library_path: str = None):
         """
         初始化
@@ -34,6 +101,10 @@ class SkillLoader:
         
         # 缓存已解析的 skill 元数据
         self._metadata_cache: Optional[List[Dict]] = None
+        # 缓存生成的 <available_skills> XML
+        self._xml_cache: Optional[str] = None
+        # 保护元数据扫描与缓存赋值（后台预热与首次构建 prompt 可能并发）
+        self._lock = threading.Lock()
     
     def discover_skills(self) -> List[Dict]:
         """
@@ -45,52 +116,185 @@ class SkillLoader:
         if self._metadata_cache is not None:
             return self._metadata_cache
         
-        skills = []
+        with self._lock:
+            # 预热线程可能已完成扫描
+            if self._metadata_cache is not None:
+                return self._metadata_cache
+            
+            if not self.skills_library.exists():
+                self._metadata_cache = []
+            else:
+                self._metadata_cache = self._scan_skills(use_manifest=True)
+            return self._metadata_cache
+    
+    def warm_up(self) -> threading.Thread:
+        """在后台线程中提前扫描 skills（与启动阶段的其他初始化重叠），返回该线程"""
+        thread = threading.Thread(target=self._warm_up, name="skills-warm-up", daemon=True)
+        thread.start()
+        return thread
+    
+    def _warm_up(self):
+        """后台预热：扫描失败时静默忽略（首次使用时会再次扫描）"""
+        try:
+            self.discover_skills()
+        except Exception:
+            pass
+    
+    def rebuild_manifest(self) -> List[Dict]:
+        """
+        忽略已有清单，重新解析所有 SKILL.md 并重写清单
         
-        if not self.skills_library.exists():
-            self._metadata_cache = skills
-            return skills
+        Returns:
+            重新解析后的 skill 元数据列表
+        """
+        with self._lock:
+            self._xml_cache = None
+            self._metadata_cache = self._scan_skills(use_manifest=False)
+            return self._metadata_cache
+    
+    def invalidate(self):
+        """清空内存中的元数据与 XML 缓存（下次访问时重新扫描）"""
+        with self._lock:
+            self._metadata_cache = None
+            self._xml_cache = None
+    
+    def _scan_skills(self, use_manifest: bool) -> List[Dict]:
+        """扫描一级子目录；SKILL.md 未变化的 skill 直接使用清单中的解析结果"""
+        # scandir 的 DirEntry 自带文件类型，is_dir 通常无需额外 stat；路径全程使用字符串
+        # 先按名称排除隐藏目录（如 .git）及常见非 skill 目录，再判断是否为目录
+        with os.scandir(self.skills_library) as it:
+            skill_dirs = sorted(
+                (entry.name, entry.path, os.path.join(entry.path, "SKILL.md"))
+                for entry in it
+                if not entry.name.startswith('.') and entry.name not in _NON_SKILL_DIRS and entry.is_dir()
+            )
         
-        # 扫描一级子目录
-        for skill_dir in sorted(self.skills_library.iterdir()):
-            if not skill_dir.is_dir():
-                continue
-            
-            skill_md = skill_dir / "SKILL.md"
-            if not skill_md.exists():
+        # 每个子目录 SKILL.md 的 [mtime_ns, size]（不存在为 None）
+        signatures = {}
+        for name, _, skill_md in skill_dirs:
+            try:
+                st = os.stat(skill_md)
+                signatures[name] = [st.st_mtime_ns, st.st_size]
+            except OSError:
+                signatures[name] = None
+        
+        # 签名与清单一致的 skill 直接复用解析结果，其余重新解析
+        manifest = (self._load_manifest() if use_manifest else None) or {}
+        old_signatures = manifest.get("signatures", {})
+        old_parsed = manifest.get("skills", {})
+        parsed = {}
+        to_parse = []
+        for name, _, skill_md in skill_dirs:
+            signature = signatures[name]
+            if signature is None:
                 continue
-            
-            metadata = self._parse_frontmatter(skill_md)
+            if old_signatures.get(name) == signature and name in old_parsed:
+                parsed[name] = old_parsed[name]
+            else:
+                to_parse.append((name, skill_md, signature[1]))
+        
+        # 待解析的 SKILL.md 较多时用线程池并发读取（冷缓存下磁盘读取可重叠）
+        # 文件大小复用上面 stat 的结果，避免解析时再 stat 一次
+        skill_md_paths = [skill_md for _, skill_md, _ in to_parse]
+        sizes = [size for _, _, size in to_parse]
+        if len(to_parse) >= self.PARALLEL_PARSE_MIN:
+            with ThreadPoolExecutor(max_workers=min(8, len(to_parse))) as executor:
+                results = list(executor.map(self._parse_frontmatter, skill_md_paths, sizes))
+        else:
+            results = [self._parse_frontmatter(path, size) for path, size in zip(skill_md_paths, sizes)]
+        for (name, _, _), metadata in zip(to_parse, results):
+            parsed[name] = metadata
+        
+        if old_signatures != signatures or not manifest:
+            self._write_manifest(signatures, parsed)
+        
+        skills = []
+        for name, path, skill_md in skill_dirs:
+            metadata = parsed.get(name)
             if metadata:
-                metadata["path"] = str(skill_dir)
-                metadata["skill_md_path"] = str(skill_md)
+                metadata = dict(metadata)
+                metadata["path"] = path
+                metadata["skill_md_path"] = skill_md
                 skills.append(metadata)
-        
-        self._metadata_cache = skills
         return skills
     
-    def _parse_frontmatter(self, skill_md_path: Path) -> Optional[Dict]:
+    def _load_manifest(self) -> Optional[Dict]:
+        """读取清单，不存在或格式不符时返回 None"""
+        try:
+            with open(self.skills_library / self.MANIFEST_NAME, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("version") != self.MANIFEST_VERSION:
+            return None
+        return manifest
+    
+    def _write_manifest(self, signatures: Dict, parsed: Dict):
+        """原子写入清单（先写临时文件再 os.replace）；写入失败（如只读目录）时忽略"""
+        manifest_path = self.skills_library / self.MANIFEST_NAME
+        tmp_path = manifest_path.with_name(f"{self.MANIFEST_NAME}.{os.getpid()}.tmp")
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({
+                    "version": self.MANIFEST_VERSION,
+                    "signatures": signatures,
+                    "skills": parsed
+                }, f, ensure_ascii=False)
+            os.replace(tmp_path, manifest_path)
+        except (OSError, TypeError, ValueError):
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+    
+    def _parse_frontmatter(self, skill_md_path: Union[str, Path], st_size: Optional[int] = None) -> Optional[Dict]:
         """
         解析 SKILL.md 的 YAML frontmatter
         
         Args:
             skill_md_path: SKILL.md 文件路径
+            st_size: 已知的文件大小（调用方已 stat 时传入，过小的文件直接跳过）
             
         Returns:
             {name, description, ...} 或 None（解析失败时）
         """
+        if st_size is not None and st_size < self.SKILL_MD_MIN_BYTES:
+            return None
+        
         try:
-            content = skill_md_path.read_text(encoding='utf-8')
+            # 只读取到 frontmatter 结束为止（直接 os.read 原始字节，只解码 frontmatter 部分）
+            fd = os.open(skill_md_path, os.O_RDONLY)
+            try:
+                content = os.read(fd, self.FRONTMATTER_READ_CHUNK)
+                
+                # 提取 YAML frontmatter（--- 包裹）
+                if not content.startswith(b'---'):
+                    return None
+                
+                # 找到第二个 ---（未找到则继续分块读取，最多 FRONTMATTER_MAX_BYTES）
+                end_idx = content.find(b'---', 3)
+                while end_idx < 0 and len(content) < self.FRONTMATTER_MAX_BYTES:
+                    chunk = os.read(fd, self.FRONTMATTER_READ_CHUNK)
+                    if not chunk:
+                        break
+                    start = max(3, len(content) - 2)  # 分隔符可能跨块
+                    content += chunk
+                    end_idx = content.find(b'---', start)
+                if end_idx < 0:
+                    return None
+            finally:
+                os.close(fd)
             
-            # 提取 YAML frontmatter（--- 包裹）
-            if not content.startswith('---'):
-                return None
-            
-            # 找到第二个 ---
-            end_idx = content.index('---', 3)
-            frontmatter_str = content[3:end_idx].strip()
+            # 换行符统一为 \n（与文本模式读取一致）
+            frontmatter_str = content[3:end_idx].decode('utf-8')
+            frontmatter_str = frontmatter_str.replace('\r\n', '\n').replace('\r', '\n').strip()
             
-            frontmatter = yaml.safe_load(frontmatter_str)
+            frontmatter = _parse_simple_frontmatter(frontmatter_str)
+            if frontmatter is None:
+                # 复杂 frontmatter 才需要 YAML 解析器（按需导入，优先使用 LibYAML 的 C 解析器）
+                import yaml
+                loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+                frontmatter = yaml.load(frontmatter_str, Loader=loader)
             if not isinstance(frontmatter, dict):
                 return None
             
@@ -126,24 +330,24 @@ class SkillLoader:
         Returns:
             XML 字符串，如果没有 skills 则返回空字符串
         """
+        if self._xml_cache is not None:
+            return self._xml_cache
+        
         skills = self.discover_skills()
         
         if not skills:
+            self._xml_cache = ""
             return ""
         
-        xml_parts = ["<available_skills>"]
-        for skill in skills:
-            xml_parts.append(f'  <skill>')
-            xml_parts.append(f'    <name>{skill["name"]}</name>')
-            xml_parts.append(f'    <description>{skill["description"]}</description>')
-            # location 用相对于 workspace 的 .skills/ 路径（部署后的位置）
-            xml_parts.append(f'    <location>.skills/{skill["name"]}/SKILL.md</location>')
-            xml_parts.append(f'  </skill>')
-        xml_parts.append("</available_skills>")
-        xml_parts.append("")
-        xml_parts.append("提示：需要使用某个 skill 时，先调用 load_skill 工具将其部署到 workspace，然后使用 file_read 读取 SKILL.md 获取详细指令。")
-        
-        return "\n".join(xml_parts)
+        self._xml_cache = (
+            _SKILLS_XML_HEADER
+            + "".join(
+                _SKILL_XML_TEMPLATE.format(name=skill["name"], description=skill["description"])
+                for skill in skills
+            )
+            + _SKILLS_XML_FOOTER
+        )
+        return self._xml_cache
     
     def get_skill_source_path(self, skill_name: str) -> Optional[Path]:
         """